@@ -0,0 +1,43 @@
+"""Validation memoization: geometry hash and project revision on validation_event.
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Geometries are validated before the parcel exists
+    op.alter_column('validation_event', 'parcel_id', nullable=True)
+    
+    op.add_column('validation_event', sa.Column('geom_hash', sa.String(64), nullable=True))
+    op.add_column('validation_event', sa.Column('project_revision', sa.String(32), nullable=True))
+    op.add_column('validation_event', sa.Column('response', postgresql.JSON, nullable=True))
+    op.create_index(
+        'ix_validation_event_memo',
+        'validation_event',
+        ['project_id', 'geom_hash', 'project_revision', 'checked_at'],
+    )
+    
+    # MAX(updated_at) is part of the project revision
+    op.create_index('ix_sigef_updated_at', 'sigef_certified', ['updated_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sigef_updated_at', table_name='sigef_certified')
+    op.drop_index('ix_validation_event_memo', table_name='validation_event')
+    op.drop_column('validation_event', 'response')
+    op.drop_column('validation_event', 'project_revision')
+    op.drop_column('validation_event', 'geom_hash')
+    op.execute('DELETE FROM validation_event WHERE parcel_id IS NULL')
+    op.alter_column('validation_event', 'parcel_id', nullable=False)
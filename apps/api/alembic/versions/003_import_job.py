@@ -0,0 +1,48 @@
+"""Background import jobs (import_job).
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'import_job',
+        sa.Column('id', postgresql.UUID(as_uuid=True), server_default=sa.text('uuid_generate_v4()'), primary_key=True),
+        sa.Column('kind', sa.Enum('kml', 'shapefile', 'gpx', name='import_kind'), nullable=False),
+        sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'DONE', 'FAILED', 'CANCELLED', name='import_job_status'), server_default='QUEUED', nullable=False),
+        sa.Column('filename', sa.String(255), nullable=True),
+        sa.Column('output', sa.String(16), server_default='geojson', nullable=False),
+        sa.Column('options', postgresql.JSON, nullable=True),
+        sa.Column('src_path', sa.Text, nullable=False),
+        sa.Column('result_path', sa.Text, nullable=False),
+        sa.Column('bytes_total', sa.BigInteger, nullable=False),
+        sa.Column('bytes_read', sa.BigInteger, server_default='0'),
+        sa.Column('features', sa.Integer, server_default='0'),
+        sa.Column('error', sa.Text, nullable=True),
+        sa.Column('error_status', sa.Integer, nullable=True),
+        sa.Column('created_at', sa.DateTime, server_default=sa.func.now()),
+        sa.Column('started_at', sa.DateTime, nullable=True),
+        sa.Column('finished_at', sa.DateTime, nullable=True),
+        sa.Column('updated_at', sa.DateTime, server_default=sa.func.now(), onupdate=sa.func.now()),
+    )
+    # Dispatcher: oldest QUEUED job first; cleanup of expired jobs
+    op.create_index('ix_import_job_status', 'import_job', ['status', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_import_job_status', table_name='import_job')
+    op.drop_table('import_job')
+    op.execute('DROP TYPE IF EXISTS import_job_status CASCADE')
+    op.execute('DROP TYPE IF EXISTS import_kind CASCADE')
@@ -0,0 +1,61 @@
+"""Project geometry revision: counter bumped by parcel geometry writes.
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Part of the validation memo revision (services.validation_log): read in
+    # O(1) instead of fingerprinting every parcel of the project
+    op.add_column('project', sa.Column('geom_revision', sa.BigInteger, server_default='0', nullable=False))
+    
+    op.execute("""
+        CREATE OR REPLACE FUNCTION parcel_geom_revision()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                UPDATE project SET geom_revision = geom_revision + 1 WHERE id = OLD.project_id;
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.project_id IS DISTINCT FROM OLD.project_id) THEN
+                UPDATE project SET geom_revision = geom_revision + 1 WHERE id = NEW.project_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trigger_parcel_geom_revision
+        AFTER INSERT OR DELETE ON parcel
+        FOR EACH ROW EXECUTE FUNCTION parcel_geom_revision()
+    """)
+    # Status/review writes do not change what a validation sees
+    op.execute("""
+        CREATE TRIGGER trigger_parcel_geom_revision_update
+        AFTER UPDATE OF geom_official, geom_client_sketch, name, project_id ON parcel
+        FOR EACH ROW
+        WHEN (
+            OLD.geom_official IS DISTINCT FROM NEW.geom_official
+            OR OLD.geom_client_sketch IS DISTINCT FROM NEW.geom_client_sketch
+            OR OLD.name IS DISTINCT FROM NEW.name
+            OR OLD.project_id IS DISTINCT FROM NEW.project_id
+        )
+        EXECUTE FUNCTION parcel_geom_revision()
+    """)
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER IF EXISTS trigger_parcel_geom_revision_update ON parcel')
+    op.execute('DROP TRIGGER IF EXISTS trigger_parcel_geom_revision ON parcel')
+    op.execute('DROP FUNCTION IF EXISTS parcel_geom_revision()')
+    op.drop_column('project', 'geom_revision')
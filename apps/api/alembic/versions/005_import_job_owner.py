@@ -0,0 +1,24 @@
+"""Import job owner (import_job.user_id).
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # JWT sub of the uploader: the job endpoints only serve the owner's jobs
+    op.add_column('import_job', sa.Column('user_id', sa.String(64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('import_job', 'user_id')
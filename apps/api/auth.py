@@ -1,17 +1,208 @@
 """RBAC e Multitenant: validação JWT e filtros por tenant."""
 
+from collections import OrderedDict
 from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from typing import Optional
+from typing import Any, Dict, Optional
+import base64
+import hashlib
+import hmac
+import json
 import os
+import threading
+import time
 
 JWT_SECRET = os.getenv("JWT_SECRET") or os.getenv("SUPABASE_JWT_SECRET")
 ALGORITHM = "HS256"
 
+# Claim com o role do app (ex.: "app_metadata.role" via custom access token
+# hook do Supabase). Quando presente no token, dispensa a consulta a perfis.
+JWT_ROLE_CLAIM = os.getenv("JWT_ROLE_CLAIM", "")
+PERFIL_CACHE_TTL_SECONDS = float(os.getenv("PERFIL_CACHE_TTL_SECONDS", "60"))
+PERFIL_CACHE_MAX_SIZE = int(os.getenv("PERFIL_CACHE_MAX_SIZE", "10000"))
+
+# Claims já verificados, por digest do token. A entrada vale até o exp do
+# token, limitada a JWT_CACHE_TTL_SECONDS (0 desliga o cache).
+JWT_CACHE_TTL_SECONDS = float(os.getenv("JWT_CACHE_TTL_SECONDS", "300"))
+JWT_CACHE_MAX_SIZE = int(os.getenv("JWT_CACHE_MAX_SIZE", "10000"))
+# Verificador HS256 com hmac/json da stdlib no lugar do python-jose
+JWT_FAST_VERIFY = os.getenv("JWT_FAST_VERIFY", "false").lower() == "true"
+
+ROLES = ("topografo", "proprietario")
+
 security = HTTPBearer(auto_error=False)
 
 
+class TTLCache:
+    """Cache TTL + LRU por processo (roles por user_id, claims por token).
+
+    set_role invalida a entrada local do perfil; em outros workers a mudança
+    aparece em até PERFIL_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() < entry[1]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Any, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Guarda value por ttl_seconds (no máximo o TTL do cache)."""
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Any = None) -> None:
+        """Remove uma entrada (ou todas) do cache."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+perfil_cache = TTLCache(PERFIL_CACHE_MAX_SIZE, PERFIL_CACHE_TTL_SECONDS)
+token_cache = TTLCache(JWT_CACHE_MAX_SIZE, JWT_CACHE_TTL_SECONDS)
+
+
+def _b64url(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _int_claim(claims: Dict[str, Any], name: str) -> Optional[int]:
+    if name not in claims:
+        return None
+    try:
+        return int(claims[name])
+    except (TypeError, ValueError):
+        raise JWTError(f"Claim {name} deve ser inteiro")
+
+
+def decode_hs256(token: str, secret: str) -> Dict[str, Any]:
+    """Verifica um JWT HS256 só com hmac/json (mesmas regras do jwt.decode).
+
+    Assinatura comparada em tempo constante; exp/nbf sem leeway; como no
+    python-jose sem audience, um token com aud é rejeitado. Levanta
+    JWTError em qualquer falha.
+    """
+    try:
+        signing_input, _, signature = token.rpartition(".")
+        header_b64, _, payload_b64 = signing_input.partition(".")
+        header = json.loads(_b64url(header_b64))
+        if not isinstance(header, dict) or header.get("alg") != ALGORITHM:
+            raise JWTError("Algoritmo não permitido")
+        expected = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64url(signature)):
+            raise JWTError("Assinatura inválida")
+        claims = json.loads(_b64url(payload_b64))
+    except JWTError:
+        raise
+    except (ValueError, TypeError, UnicodeError):
+        raise JWTError("Token malformado")
+    if not isinstance(claims, dict):
+        raise JWTError("Claims devem ser um objeto JSON")
+
+    now = int(time.time())
+    _int_claim(claims, "iat")
+    nbf = _int_claim(claims, "nbf")
+    if nbf is not None and nbf > now:
+        raise JWTError("Token ainda não é válido (nbf)")
+    exp = _int_claim(claims, "exp")
+    if exp is not None and exp < now:
+        raise JWTError("Token expirado")
+    if "aud" in claims:
+        raise JWTError("Audience inválida")
+    for name in ("sub", "jti"):
+        if name in claims and not isinstance(claims[name], str):
+            raise JWTError(f"Claim {name} deve ser string")
+    return claims
+
+
+def _decode(token: str) -> Dict[str, Any]:
+    if JWT_FAST_VERIFY:
+        return decode_hs256(token, JWT_SECRET)
+    return jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
+
+
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+def _claim(payload: Dict[str, Any], path: str) -> Any:
+    """Valor de um claim por caminho pontuado (ex.: app_metadata.role)."""
+    value: Any = payload
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+async def _role_do_usuario(user: dict) -> str:
+    """Role do usuário: claim do JWT, cache ou tabela perfis (nessa ordem).
+
+    A consulta usa o cliente assíncrono: o cliente síncrono bloquearia o
+    event loop dentro das dependências async def.
+    """
+    if user.get("role") in ROLES:
+        return user["role"]
+
+    role = perfil_cache.get(user["user_id"])
+    if role is not None:
+        return role
+
+    from db import get_async_supabase
+
+    sb = await get_async_supabase()
+    r = await (
+        sb.table("perfis")
+        .select("role")
+        .eq("user_id", user["user_id"])
+        .execute()
+    )
+    role = r.data[0].get("role", "proprietario") if r.data else "proprietario"
+    perfil_cache.set(user["user_id"], role)
+    return role
+
+
+def _perfil(user: dict, role: str) -> dict:
+    return {
+        **user,
+        "role": role,
+        "tenant_id": user["user_id"] if role == "topografo" else None,
+    }
+
+
 async def get_token(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
 ) -> Optional[str]:
@@ -22,20 +213,35 @@ async def get_token(
 
 
 async def get_current_user(token: Optional[str] = Depends(get_token)):
-    """Decodifica o JWT e retorna user_id e email. Retorna None se não autenticado."""
+    """Decodifica o JWT e retorna user_id e email. Retorna None se não autenticado.
+
+    Tokens já verificados vêm do token_cache (chave: sha256 do token) até o
+    exp; tokens inválidos não são guardados.
+    """
     if not token:
         return None
     if not JWT_SECRET:
         return None  # Sem secret configurado, ignora auth (dev)
+    key = _token_key(token)
+    cached = token_cache.get(key)
+    if cached is not None:
+        return dict(cached)
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        email = payload.get("email")
-        if not user_id:
-            return None
-        return {"user_id": user_id, "email": email}
+        payload = _decode(token)
     except JWTError:
         return None
+    user_id = payload.get("sub")
+    email = payload.get("email")
+    if not user_id:
+        return None
+    user = {"user_id": user_id, "email": email}
+    if JWT_ROLE_CLAIM:
+        role = _claim(payload, JWT_ROLE_CLAIM)
+        if role in ROLES:
+            user["role"] = role
+    exp = payload.get("exp")
+    token_cache.set(key, user, int(exp) - time.time() if exp is not None else None)
+    return dict(user)
 
 
 async def get_current_user_required(user: Optional[dict] = Depends(get_current_user)):
@@ -48,25 +254,9 @@ async def get_current_user_required(user: Optional[dict] = Depends(get_current_u
 async def get_perfil(
     user: dict = Depends(get_current_user_required), request: Request = None
 ):
-    """Obtém perfil (role) do usuário no banco. Requer auth."""
-    from db import supabase
-
+    """Obtém perfil (role) do usuário (claim do JWT, cache ou banco). Requer auth."""
     try:
-        r = (
-            supabase.table("perfis")
-            .select("role")
-            .eq("user_id", user["user_id"])
-            .execute()
-        )
-        if r.data and len(r.data) > 0:
-            role = r.data[0].get("role", "proprietario")
-        else:
-            role = "proprietario"
-        return {
-            **user,
-            "role": role,
-            "tenant_id": user["user_id"] if role == "topografo" else None,
-        }
+        return _perfil(user, await _role_do_usuario(user))
     except Exception:
         raise HTTPException(status_code=500, detail="Erro ao obter perfil")
 
@@ -83,19 +273,6 @@ async def get_perfil_optional(user: Optional[dict] = Depends(get_current_user)):
     if not user:
         return None
     try:
-        from db import supabase
-
-        r = (
-            supabase.table("perfis")
-            .select("role")
-            .eq("user_id", user["user_id"])
-            .execute()
-        )
-        role = r.data[0].get("role", "proprietario") if r.data else "proprietario"
-        return {
-            **user,
-            "role": role,
-            "tenant_id": user["user_id"] if role == "topografo" else None,
-        }
+        return _perfil(user, await _role_do_usuario(user))
     except Exception:
         return {**user, "role": "proprietario", "tenant_id": None}
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark: verificação de JWT HS256 em auth.get_current_user.
+
+Compara, por token:
+  - jose      python-jose jwt.decode (caminho padrão)
+  - hs256     auth.decode_hs256 (hmac/json da stdlib, JWT_FAST_VERIFY=true)
+  - cache     get_current_user com o token já no token_cache
+
+Uso (a partir de apps/api):
+    python bench_jwt.py [--runs 20000]
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("JWT_SECRET", "bench-secret-" + "x" * 32)
+
+from jose import jwt  # noqa: E402
+
+import auth  # noqa: E402
+
+
+def make_token() -> str:
+    now = int(time.time())
+    return jwt.encode(
+        {
+            "sub": "00000000-0000-0000-0000-000000000001",
+            "email": "bench@example.com",
+            "iat": now,
+            "exp": now + 3600,
+            "role": "authenticated",
+            "app_metadata": {"role": "topografo"},
+        },
+        auth.JWT_SECRET,
+        algorithm=auth.ALGORITHM,
+    )
+
+
+def run_sync(coro):
+    """Executa uma corrotina sem await internos (evita o custo do event loop)."""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("corrotina suspensa")
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = make_token()
+    assert auth.decode_hs256(token, auth.JWT_SECRET) == jwt.decode(
+        token, auth.JWT_SECRET, algorithms=[auth.ALGORITHM]
+    )
+
+    run_sync(auth.get_current_user(token))  # aquece o cache
+
+    cases = (
+        ("jose", lambda: jwt.decode(token, auth.JWT_SECRET, algorithms=[auth.ALGORITHM])),
+        ("hs256", lambda: auth.decode_hs256(token, auth.JWT_SECRET)),
+        ("cache", lambda: run_sync(auth.get_current_user(token))),
+    )
+    print(f"Execuções: {args.runs}")
+    for label, fn in cases:
+        samples = timed(fn, args.runs)
+        print(
+            f"{label:<8} mediana={statistics.median(samples):8.1f} µs  "
+            f"p95={sorted(samples)[int(len(samples) * 0.95) - 1]:8.1f} µs"
+        )
+
+
+if __name__ == "__main__":
+    main()
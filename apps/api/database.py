@@ -1,24 +1,160 @@
 """Database session management."""
-from sqlalchemy import create_engine, event
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Type, TypeVar
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, Pool, QueuePool
 from config import settings
 import logging
+import threading
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
-# Create engine with connection pooling
-engine = create_engine(
-    settings.DATABASE_URL,
-    poolclass=NullPool if settings.ENV == "test" else None,
-    echo=settings.SQL_ECHO,
-    connect_args={
+T = TypeVar("T")
+
+PGBOUNCER_PORT = 6543  # Supabase pooler, transaction mode
+
+
+def uses_pgbouncer(url: str) -> bool:
+    """DB_PGBOUNCER=true/false, or auto: transaction pooler port in the URL."""
+    if settings.DB_PGBOUNCER in ("true", "false"):
+        return settings.DB_PGBOUNCER == "true"
+    try:
+        return urlsplit(url).port == PGBOUNCER_PORT
+    except ValueError:
+        return False
+
+
+class PoolMetrics:
+    """Checkout counters for one engine's pool (thread-safe)."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+    
+    def record(self, waited_s: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total_s += waited_s
+            self.wait_max_s = max(self.wait_max_s, waited_s)
+    
+    def snapshot(self, pool: Pool) -> Dict[str, Any]:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "pool": pool.status(),
+                "size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total_s / attempts * 1000, 3) if attempts else 0.0,
+                "wait_max_ms": round(self.wait_max_s * 1000, 3),
+            }
+
+
+def _instrumented_pool(base: Type[QueuePool]) -> Type[QueuePool]:
+    """Subclass of a queue pool that times every checkout.
+    
+    Metrics live on the class so they survive pool.recreate() (engine.dispose()).
+    """
+    class InstrumentedPool(base):
+        metrics = PoolMetrics()
+        
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except exc.TimeoutError:
+                self.metrics.record(time.perf_counter() - started, timed_out=True)
+                raise
+            self.metrics.record(time.perf_counter() - started)
+            return conn
+    
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+
+def _pool_options(base: Type[QueuePool]) -> Dict[str, Any]:
+    """create_engine pool arguments from settings (NullPool under test)."""
+    if settings.ENV == "test":
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": _instrumented_pool(base),
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _set_local_statement_timeout(target: Engine) -> None:
+    """Per-transaction statement_timeout.
+    
+    PgBouncer in transaction mode rejects startup options and would leak a
+    session-level SET to other clients, so the timeout is set with SET LOCAL
+    at the start of every transaction instead.
+    """
+    @event.listens_for(target, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(settings.DB_STATEMENT_TIMEOUT_MS)}")
+
+
+def sync_database_url(url: str) -> str:
+    """postgres[ql]://... → postgresql+psycopg://... (psycopg 3).
+
+    A bare postgresql:// resolves to psycopg2 on SQLAlchemy 2.0 and to
+    psycopg 3 on 2.1; the driver is pinned so requirements.txt (psycopg)
+    always matches. URLs that name a driver are unchanged.
+    """
+    scheme, sep, rest = url.partition("://")
+    if scheme in ("postgres", "postgresql"):
+        return f"postgresql+psycopg{sep}{rest}"
+    return url
+
+
+IS_POSTGRES = "postgres" in settings.DATABASE_URL
+PGBOUNCER = IS_POSTGRES and uses_pgbouncer(settings.DATABASE_URL)
+
+_connect_args: Dict[str, Any] = {}
+if IS_POSTGRES:
+    _connect_args = {
         "connect_timeout": 10,
         "keepalives": 1,
         "keepalives_idle": 30,
-    } if "postgresql" in settings.DATABASE_URL else {},
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS and not PGBOUNCER:
+        _connect_args["options"] = f"-c statement_timeout={int(settings.DB_STATEMENT_TIMEOUT_MS)}"
+    if PGBOUNCER and sync_database_url(settings.DATABASE_URL).startswith("postgresql+psycopg:"):
+        # Transaction pooling: psycopg 3 prepares a statement server-side after
+        # 5 executions, and the next transaction may run on another server
+        # connection (same reason as the asyncpg settings below)
+        _connect_args["prepare_threshold"] = None
+
+# Create engine with connection pooling
+engine = create_engine(
+    sync_database_url(settings.DATABASE_URL),
+    echo=settings.SQL_ECHO,
+    connect_args=_connect_args,
+    **_pool_options(QueuePool),
 )
 
+if PGBOUNCER and settings.DB_STATEMENT_TIMEOUT_MS:
+    _set_local_statement_timeout(engine)
+
 # Configure PostGIS for geography queries
 @event.listens_for(engine, "connect")
 def receive_connect(dbapi_conn, connection_record):
@@ -53,6 +189,114 @@ def get_db() -> Session:
         db.close()
 
 
+# ============ Async (asyncpg) ============
+
+def async_database_url(url: str) -> str:
+    """postgresql[+driver]://... → postgresql+asyncpg://...
+
+    asyncpg does not understand libpq's sslmode; it is passed on as ssl.
+    SQLite (dev/test) maps to sqlite+aiosqlite; other URLs are unchanged.
+    """
+    scheme, sep, rest = url.partition("://")
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if not scheme.startswith("postgres"):
+        return url
+    parts = urlsplit(url)
+    query = [
+        ("ssl" if key == "sslmode" else key, value)
+        for key, value in parse_qsl(parts.query)
+    ]
+    return urlunsplit(("postgresql+asyncpg", parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+
+_async_connect_args: Dict[str, Any] = {}
+if IS_POSTGRES:
+    _async_connect_args = {"timeout": 10}
+    if PGBOUNCER:
+        # Transaction pooling: no named/cached prepared statements, since the
+        # next transaction may run on another server connection (the sync
+        # engine sets prepare_threshold=None for the same reason)
+        _async_connect_args.update({
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        })
+    elif settings.DB_STATEMENT_TIMEOUT_MS:
+        _async_connect_args["server_settings"] = {
+            "statement_timeout": str(int(settings.DB_STATEMENT_TIMEOUT_MS)),
+        }
+
+# Same database as engine, for async handlers (no event-loop blocking).
+# GeoAlchemy2 columns work unchanged: geometries come back as WKBElement.
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    echo=settings.SQL_ECHO,
+    connect_args=_async_connect_args,
+    **_pool_options(AsyncAdaptedQueuePool),
+)
+
+if PGBOUNCER and settings.DB_STATEMENT_TIMEOUT_MS:
+    _set_local_statement_timeout(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Async counterpart of get_db.
+    
+    Usage:
+        @router.get("/parcels/{parcel_id}")
+        async def get_parcel(parcel_id: str, db: AsyncSession = Depends(get_async_db)):
+            parcel = await db.get(Parcel, parcel_id)
+    
+    CPU-heavy sync service code (services/geo.py) goes through
+    run_in_sync_session instead: AsyncSession.run_sync would run it on the
+    event loop thread.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _call_with_session(fn: Callable[[Session], T]) -> T:
+    db = SessionLocal()
+    try:
+        result = fn(db)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def run_in_sync_session(fn: Callable[[Session], T]) -> T:
+    """Run fn(session) in the threadpool on its own sync session.
+    
+    The session is committed when fn returns (validation_event rows) and
+    rolled back if it raises. Usage:
+        result = await run_in_sync_session(lambda session: validate_geometry_complete(..., session))
+    """
+    return await run_in_threadpool(_call_with_session, fn)
+
+
+def pool_metrics() -> Dict[str, Optional[Dict[str, Any]]]:
+    """Checkout wait time and in-use connections for both engines.
+    
+    None for an engine without an instrumented pool (NullPool under test).
+    """
+    result: Dict[str, Optional[Dict[str, Any]]] = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        metrics = getattr(pool, "metrics", None)
+        result[name] = metrics.snapshot(pool) if metrics else None
+    return result
+
+
 def init_db():
     """Initialize database tables (for development).
     
@@ -67,3 +311,9 @@ def close_db():
     """Close database engine (for shutdown hooks)."""
     engine.dispose()
     logger.info("Database engine closed")
+
+
+async def close_async_db():
+    """Close async database engine (for shutdown hooks)."""
+    await async_engine.dispose()
+    logger.info("Async database engine closed")
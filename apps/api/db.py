@@ -1,11 +1,98 @@
-"""Cliente Supabase compartilhado."""
+"""Cliente Supabase compartilhado.
 
+- supabase: cliente síncrono (handlers def do main.py, que o FastAPI roda
+  no threadpool).
+- get_async_supabase: cliente assíncrono para rotas async def. Um único
+  httpx.AsyncClient HTTP/2 com pool de conexões keep-alive atende PostgREST
+  e Storage; é criado e fechado no lifespan da app (main.lifespan).
+"""
+
+import asyncio
 import os
-from supabase import create_client, Client
+from typing import Any, List, Optional
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions, Client, acreate_client, create_client
 from dotenv import load_dotenv
 
 load_dotenv()
 
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL", ""), os.getenv("SUPABASE_SERVICE_KEY", "")
-)
+SUPABASE_URL = os.getenv("SUPABASE_URL", "")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY", "")
+
+# Pool HTTP do cliente assíncrono (por worker)
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "true").lower() == "true"
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "100"))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "20"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "30"))
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+_http: Optional[httpx.AsyncClient] = None
+_async_supabase: Optional[AsyncClient] = None
+_init_lock = asyncio.Lock()
+
+
+async def init_async_supabase() -> AsyncClient:
+    """Cria o pool HTTP e o cliente assíncrono (idempotente)."""
+    global _http, _async_supabase
+    if _async_supabase is not None:
+        return _async_supabase
+    async with _init_lock:
+        if _async_supabase is not None:
+            return _async_supabase
+        _http = httpx.AsyncClient(
+            http2=SUPABASE_HTTP2,
+            timeout=SUPABASE_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+                keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _async_supabase = await acreate_client(
+            SUPABASE_URL,
+            SUPABASE_SERVICE_KEY,
+            options=AsyncClientOptions(httpx_client=_http),
+        )
+        return _async_supabase
+
+
+async def close_async_supabase() -> None:
+    """Fecha as conexões do pool (shutdown)."""
+    global _http, _async_supabase
+    if _http is not None:
+        await _http.aclose()
+    _http = None
+    _async_supabase = None
+
+
+async def get_async_supabase() -> AsyncClient:
+    """Dependência FastAPI com o cliente assíncrono.
+
+    Uso:
+        @router.get("/api/lotes/{lote_id}/documentos")
+        async def list_documents(lote_id: int, sb: AsyncClient = Depends(get_async_supabase)):
+            docs = await sb.table("documentos").select("*").eq("lote_id", lote_id).execute()
+
+    Sem lifespan (ex.: scripts), o cliente é criado na primeira chamada.
+    """
+    return await init_async_supabase()
+
+
+async def fetch_all(*queries: Any) -> List[Any]:
+    """Executa consultas independentes em paralelo (na ordem recebida).
+
+    Recebe builders do cliente assíncrono ainda sem .execute(); a latência
+    total é a da consulta mais lenta, não a soma. A primeira exceção é
+    propagada.
+
+    Uso:
+        docs, vizinhos = await fetch_all(
+            sb.table("documentos").select("id,tipo").eq("lote_id", lote_id),
+            sb.table("vizinhos").select("id").eq("lote_id", lote_id),
+        )
+    """
+    return list(await asyncio.gather(*(query.execute() for query in queries)))
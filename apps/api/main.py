@@ -1,23 +1,50 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import uuid
 
-from db import supabase
-from auth import get_perfil, require_topografo, get_current_user_required
+from db import supabase, init_async_supabase, close_async_supabase
+from config import settings
+from services.pagination import (
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    keyset,
+    page,
+    select_columns,
+)
+from auth import get_perfil, require_topografo, get_current_user_required, perfil_cache, token_cache
 from routers.contracts import router as contracts_router
 from routers.ai import router as ai_router
 from routers.documents import router as documents_router
 from routers.intake import router as intake_router
 from routers.sigef import router as sigef_router
 from routers.import_export import router as import_export_router
+from services.import_pool import import_pool
+from services.import_jobs import import_job_runner
 
 load_dotenv()
 
-app = FastAPI(title="Ativo Real API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pool HTTP/2 do cliente Supabase assíncrono (rotas async dos routers)
+    await init_async_supabase()
+    # Importações em segundo plano (tabela import_job)
+    import_job_runner.start()
+    try:
+        yield
+    finally:
+        await import_job_runner.stop()
+        await close_async_supabase()
+        # Processos de parsing de importação (criados sob demanda)
+        import_pool.shutdown()
+
+
+app = FastAPI(title="Ativo Real API", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -26,6 +53,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 
@@ -112,6 +140,26 @@ def health_check():
     return {"status": "online", "service": "Ativo Real API"}
 
 
+@app.get("/health/db-pool")
+def health_db_pool():
+    """Pool do SQLAlchemy: conexões em uso e tempo de espera no checkout."""
+    from database import pool_metrics
+
+    return pool_metrics()
+
+
+@app.get("/health/perfil-cache")
+def health_perfil_cache():
+    """Caches de auth: perfis (get_perfil) e claims de JWT (get_current_user)."""
+    return {**perfil_cache.stats(), "token_cache": token_cache.stats()}
+
+
+@app.get("/health/import-pool")
+def health_import_pool():
+    """Pool de processos de importação: fila, espera na fila e tempo de parsing."""
+    return import_pool.stats()
+
+
 # Perfil (RBAC)
 @app.get("/api/perfis/me")
 def perfil_me(perfil: dict = Depends(get_perfil)):
@@ -143,22 +191,62 @@ def set_role(body: PerfilSetInput, perfil: dict = Depends(get_current_user_requi
             supabase.table("perfis").insert(
                 {"user_id": perfil["user_id"], "role": role}
             ).execute()
+        perfil_cache.invalidate(perfil["user_id"])
         return {"role": role}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Escopo por tenant/proprietário via embed !inner do PostgREST: o filtro no
+# recurso embutido vira um JOIN no servidor e o embed vazio "()" não traz
+# colunas extras na resposta (PostgREST >= 11).
+EMBED_PROJETO = "projetos!inner()"
+EMBED_LOTE = "lotes!inner()"
+EMBED_LOTE_PROJETO = "lotes!inner(projetos!inner())"
+
+
+# Listagens: ordenação no servidor, paginação por cursor (keyset) e projeção
+# de colunas. Sem limit a lista vem inteira; com limit, o cursor da próxima
+# página vai no header X-Next-Cursor (o corpo continua sendo a lista).
+def _selecionar(tabela: str, fields: Optional[str], ordem: str, embed: str = ""):
+    try:
+        return supabase.table(tabela).select(select_columns(fields, ordem, embed))
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="fields deve ser uma lista de colunas separadas por vírgula",
+        )
+
+
+def _pagina(query, ordem: str, cursor: Optional[str], limit: Optional[int], response: Response) -> list:
+    try:
+        query = keyset(query, ordem, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    data, proximo = page(query.execute().data or [], ordem, limit)
+    if proximo:
+        response.headers[NEXT_CURSOR_HEADER] = proximo
+    return data
+
+
 # Projetos (Multitenant: só do tenant do topógrafo)
 @app.get("/api/projetos")
-def listar_projetos(perfil: dict = Depends(get_perfil)):
+def listar_projetos(
+    response: Response,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    perfil: dict = Depends(get_perfil),
+):
     try:
-        query = supabase.table("projetos").select("*")
+        query = _selecionar("projetos", fields, "criado_em")
         if perfil and perfil.get("role") == "topografo" and perfil.get("tenant_id"):
             query = query.eq("tenant_id", perfil["tenant_id"])
         elif perfil and perfil.get("role") == "proprietario":
             return []  # Proprietário não vê lista de projetos
-        response = query.execute()
-        return response.data
+        return _pagina(query, "criado_em", cursor, limit, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -233,32 +321,36 @@ def deletar_projeto(projeto_id: int, perfil: dict = Depends(require_topografo)):
 
 # Lotes (Multitenant + RBAC)
 @app.get("/api/lotes")
-def listar_lotes(projeto_id: Optional[int] = None, perfil: dict = Depends(get_perfil)):
+def listar_lotes(
+    response: Response,
+    projeto_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    perfil: dict = Depends(get_perfil),
+):
+    """Lista lotes. Use fields= (ex.: id,nome_cliente,status) para não trazer geom."""
     try:
         if perfil.get("role") == "proprietario":
             query = (
-                supabase.table("lotes")
-                .select("*")
+                _selecionar("lotes", fields, "criado_em")
                 .eq("email_cliente", perfil.get("email", ""))
             )
+        elif perfil.get("role") == "topografo" and perfil.get("tenant_id"):
+            # Join com projetos no PostgREST: uma requisição, sem lista de ids na URL
+            query = (
+                _selecionar("lotes", fields, "criado_em", EMBED_PROJETO)
+                .eq("projetos.tenant_id", perfil["tenant_id"])
+            )
+            if projeto_id:
+                query = query.eq("projeto_id", projeto_id)
         else:
-            query = supabase.table("lotes").select("*")
+            query = _selecionar("lotes", fields, "criado_em")
             if projeto_id:
                 query = query.eq("projeto_id", projeto_id)
-            if perfil.get("role") == "topografo" and perfil.get("tenant_id"):
-                projs = (
-                    supabase.table("projetos")
-                    .select("id")
-                    .eq("tenant_id", perfil["tenant_id"])
-                    .execute()
-                )
-                ids = [p["id"] for p in (projs.data or [])]
-                if ids:
-                    query = query.in_("projeto_id", ids)
-                else:
-                    return []
-        response = query.execute()
-        return response.data
+        return _pagina(query, "criado_em", cursor, limit, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -451,26 +543,93 @@ def _projeto_autorizado(projeto_id: int, perfil: dict) -> None:
 
 
 @app.get("/api/projetos/{projeto_id}/sobreposicoes")
-def sobreposicoes_projeto(projeto_id: int, perfil: dict = Depends(get_perfil)):
+def sobreposicoes_projeto(
+    projeto_id: int,
+    area_min_m2: Optional[float] = Query(None, ge=0),
+    perfil: dict = Depends(get_perfil),
+):
+    try:
+        _projeto_autorizado(projeto_id, perfil)
+        # lote_overlaps (06_lote_overlaps.sql): um registro "principal" por par
+        response = (
+            supabase.table("lote_overlaps")
+            .select(
+                "lote_id, vizinho_id, area_m2, "
+                "lote:lotes!lote_id(nome_cliente), vizinho:lotes!vizinho_id(nome_cliente)"
+            )
+            .eq("projeto_id", projeto_id)
+            .eq("principal", True)
+            .gt("area_m2", settings.LOTE_OVERLAP_MIN_AREA_M2 if area_min_m2 is None else area_min_m2)
+            .order("area_m2", desc=True)
+            .execute()
+        )
+        return [
+            {
+                "lote1_id": o["lote_id"],
+                "lote2_id": o["vizinho_id"],
+                "nome_cliente1": (o.get("lote") or {}).get("nome_cliente"),
+                "nome_cliente2": (o.get("vizinho") or {}).get("nome_cliente"),
+                "area_sobreposta_ha": o["area_m2"] / 10000.0,
+            }
+            for o in (response.data or [])
+        ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/projetos/{projeto_id}/sobreposicoes/geojson")
+def sobreposicoes_projeto_geojson(
+    projeto_id: int,
+    area_min_m2: Optional[float] = Query(None, ge=0),
+    perfil: dict = Depends(get_perfil),
+):
+    """Polígonos de sobreposição entre lotes do projeto (FeatureCollection).
+
+    Lidos de lote_overlaps pela função lote_overlaps_geojson (06_lote_overlaps.sql),
+    única definição do formato.
+    """
     try:
         _projeto_autorizado(projeto_id, perfil)
         response = supabase.rpc(
-            "detectar_sobreposicoes_projeto", {"p_projeto_id": projeto_id}
+            "lote_overlaps_geojson",
+            {
+                "p_projeto_id": projeto_id,
+                "p_area_min_m2": settings.LOTE_OVERLAP_MIN_AREA_M2 if area_min_m2 is None else area_min_m2,
+            },
         ).execute()
-        return response.data or []
+        return response.data or {"type": "FeatureCollection", "features": []}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# Detecção de Sobreposição por lote (PostGIS)
+# Detecção de Sobreposição por lote (lote_overlaps, mantida por trigger)
 @app.get("/api/lotes/{lote_id}/sobreposicoes")
 def detectar_sobreposicoes(lote_id: int, perfil: dict = Depends(get_perfil)):
+    """Lotes do projeto cujo interior cruza o deste (toque na divisa não conta)."""
     try:
         _lote_autorizado(lote_id, perfil, escrita=False)
-        response = supabase.rpc(
-            "detectar_sobreposicoes", {"p_lote_id": lote_id}
-        ).execute()
-        return response.data or []
+        response = (
+            supabase.table("lote_overlaps")
+            .select("vizinho_id, area_m2, percentual, vizinho:lotes!vizinho_id(nome_cliente)")
+            .eq("lote_id", lote_id)
+            .order("area_m2", desc=True)
+            .execute()
+        )
+        return [
+            {
+                "id": o["vizinho_id"],
+                "nome_cliente": (o.get("vizinho") or {}).get("nome_cliente"),
+                "area_sobreposta_ha": o["area_m2"] / 10000.0,
+                "percentual": o["percentual"],
+            }
+            for o in (response.data or [])
+        ]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -522,13 +681,17 @@ def atualizar_status(
 # ==================== ORÇAMENTOS ====================
 @app.get("/api/orcamentos")
 def listar_orcamentos(
+    response: Response,
     projeto_id: Optional[int] = None,
     lote_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
     perfil: dict = Depends(get_perfil),
 ):
     """Lista orçamentos. Topógrafo vê do seu tenant. Proprietário vê dos seus lotes."""
     try:
-        query = supabase.table("orcamentos").select("*")
+        query = _selecionar("orcamentos", fields, "criado_em")
 
         if perfil.get("role") == "topografo" and perfil.get("tenant_id"):
             # Topógrafo: filtrar por projetos do tenant
@@ -539,41 +702,26 @@ def listar_orcamentos(
                 _lote_autorizado(lote_id, perfil, escrita=False)
                 query = query.eq("lote_id", lote_id)
             else:
-                # Listar todos os orçamentos dos projetos do tenant
-                projs = (
-                    supabase.table("projetos")
-                    .select("id")
-                    .eq("tenant_id", perfil["tenant_id"])
-                    .execute()
+                # Listar todos os orçamentos dos projetos do tenant (join no servidor)
+                query = (
+                    _selecionar("orcamentos", fields, "criado_em", EMBED_PROJETO)
+                    .eq("projetos.tenant_id", perfil["tenant_id"])
                 )
-                ids = [p["id"] for p in (projs.data or [])]
-                if ids:
-                    query = query.in_("projeto_id", ids)
-                else:
-                    return []
         elif perfil.get("role") == "proprietario":
             # Proprietário: apenas dos seus lotes
             if lote_id:
                 _lote_autorizado(lote_id, perfil, escrita=False)
                 query = query.eq("lote_id", lote_id)
             else:
-                # Listar orçamentos de todos os lotes do proprietário
-                lotes = (
-                    supabase.table("lotes")
-                    .select("id")
-                    .eq("email_cliente", perfil.get("email", ""))
-                    .execute()
+                # Listar orçamentos de todos os lotes do proprietário (join no servidor)
+                query = (
+                    _selecionar("orcamentos", fields, "criado_em", EMBED_LOTE)
+                    .eq("lotes.email_cliente", perfil.get("email", ""))
                 )
-                ids = [lote["id"] for lote in (lotes.data or [])]
-                if ids:
-                    query = query.in_("lote_id", ids)
-                else:
-                    return []
         else:
             return []
 
-        response = query.execute()
-        return response.data
+        return _pagina(query, "criado_em", cursor, limit, response)
     except HTTPException:
         raise
     except Exception as e:
@@ -718,40 +866,29 @@ def deletar_orcamento(orcamento_id: int, perfil: dict = Depends(require_topograf
 # ==================== DESPESAS ====================
 @app.get("/api/despesas")
 def listar_despesas(
-    projeto_id: Optional[int] = None, perfil: dict = Depends(get_perfil)
+    response: Response,
+    projeto_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    perfil: dict = Depends(get_perfil),
 ):
-    """Lista despesas. Apenas topógrafo."""
+    """Lista despesas (mais recente primeiro). Apenas topógrafo."""
     try:
         if perfil.get("role") != "topografo":
             raise HTTPException(status_code=403, detail="Acesso restrito a Topógrafo")
 
-        query = supabase.table("despesas").select("*")
-
         if projeto_id:
             _projeto_autorizado(projeto_id, perfil)
-            query = query.eq("projeto_id", projeto_id)
+            query = _selecionar("despesas", fields, "data").eq("projeto_id", projeto_id)
         else:
-            # Listar todas as despesas dos projetos do tenant
-            projs = (
-                supabase.table("projetos")
-                .select("id")
-                .eq("tenant_id", perfil["tenant_id"])
-                .execute()
+            # Listar todas as despesas dos projetos do tenant (join no servidor)
+            query = (
+                _selecionar("despesas", fields, "data", EMBED_PROJETO)
+                .eq("projetos.tenant_id", perfil["tenant_id"])
             )
-            ids = [p["id"] for p in (projs.data or [])]
-            if ids:
-                query = query.in_("projeto_id", ids)
-            else:
-                return []
 
-        response = query.execute()
-        # Ordenar manualmente: mais recente primeiro
-        data = sorted(
-            response.data or [],
-            key=lambda x: (x.get("data", ""), x.get("criado_em", "")),
-            reverse=True,
-        )
-        return data
+        return _pagina(query, "data", cursor, limit, response)
     except HTTPException:
         raise
     except Exception as e:
@@ -877,85 +1014,55 @@ def deletar_despesa(despesa_id: int, perfil: dict = Depends(require_topografo)):
 # ==================== PAGAMENTOS (Listagem) ====================
 @app.get("/api/pagamentos")
 def listar_pagamentos(
+    response: Response,
     projeto_id: Optional[int] = None,
     lote_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
     perfil: dict = Depends(get_perfil),
 ):
-    """Lista pagamentos recebidos. Topógrafo vê do seu tenant. Proprietário vê dos seus lotes."""
+    """Lista pagamentos recebidos. Topógrafo vê do seu tenant. Proprietário vê dos seus lotes.
+
+    Ordem: sem data_pagamento (pendentes) primeiro, depois o mais recente.
+    """
     try:
-        query = supabase.table("pagamentos").select("*")
+        query = _selecionar("pagamentos", fields, "data_pagamento")
 
         if perfil.get("role") == "topografo" and perfil.get("tenant_id"):
             # Topógrafo: filtrar por projetos do tenant
             if projeto_id:
                 _projeto_autorizado(projeto_id, perfil)
-                # Buscar lotes do projeto e filtrar pagamentos
-                lotes = (
-                    supabase.table("lotes")
-                    .select("id")
-                    .eq("projeto_id", projeto_id)
-                    .execute()
+                # Pagamentos dos lotes do projeto (join com lotes no servidor)
+                query = (
+                    _selecionar("pagamentos", fields, "data_pagamento", EMBED_LOTE)
+                    .eq("lotes.projeto_id", projeto_id)
                 )
-                ids = [lote["id"] for lote in (lotes.data or [])]
-                if ids:
-                    query = query.in_("lote_id", ids)
-                else:
-                    return []
             elif lote_id:
                 _lote_autorizado(lote_id, perfil, escrita=False)
                 query = query.eq("lote_id", lote_id)
             else:
-                # Listar todos os pagamentos dos projetos do tenant
-                projs = (
-                    supabase.table("projetos")
-                    .select("id")
-                    .eq("tenant_id", perfil["tenant_id"])
-                    .execute()
+                # Listar todos os pagamentos dos projetos do tenant:
+                # pagamentos -> lotes -> projetos numa única requisição
+                query = (
+                    _selecionar("pagamentos", fields, "data_pagamento", EMBED_LOTE_PROJETO)
+                    .eq("lotes.projetos.tenant_id", perfil["tenant_id"])
                 )
-                ids = [p["id"] for p in (projs.data or [])]
-                if ids:
-                    lotes = (
-                        supabase.table("lotes")
-                        .select("id")
-                        .in_("projeto_id", ids)
-                        .execute()
-                    )
-                    lote_ids = [lote["id"] for lote in (lotes.data or [])]
-                    if lote_ids:
-                        query = query.in_("lote_id", lote_ids)
-                    else:
-                        return []
-                else:
-                    return []
         elif perfil.get("role") == "proprietario":
             # Proprietário: apenas dos seus lotes
             if lote_id:
                 _lote_autorizado(lote_id, perfil, escrita=False)
                 query = query.eq("lote_id", lote_id)
             else:
-                # Listar pagamentos de todos os lotes do proprietário
-                lotes = (
-                    supabase.table("lotes")
-                    .select("id")
-                    .eq("email_cliente", perfil.get("email", ""))
-                    .execute()
+                # Listar pagamentos de todos os lotes do proprietário (join no servidor)
+                query = (
+                    _selecionar("pagamentos", fields, "data_pagamento", EMBED_LOTE)
+                    .eq("lotes.email_cliente", perfil.get("email", ""))
                 )
-                ids = [lote["id"] for lote in (lotes.data or [])]
-                if ids:
-                    query = query.in_("lote_id", ids)
-                else:
-                    return []
         else:
             return []
 
-        response = query.execute()
-        # Ordenar manualmente: mais recente primeiro
-        data = sorted(
-            response.data or [],
-            key=lambda x: (x.get("data_pagamento", ""), x.get("criado_em", "")),
-            reverse=True,
-        )
-        return data
+        return _pagina(query, "data_pagamento", cursor, limit, response)
     except HTTPException:
         raise
     except Exception as e:
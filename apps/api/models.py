@@ -1,5 +1,5 @@
 """SQLAlchemy models for Bem Real API (when migrating from Supabase to PostgreSQL)."""
-from sqlalchemy import create_engine, Column, String, Integer, Float, Text, DateTime, Boolean, ForeignKey, Enum, Index, UniqueConstraint
+from sqlalchemy import create_engine, Column, String, Integer, BigInteger, Float, Text, DateTime, Boolean, ForeignKey, Enum, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.dialects.postgresql import UUID, JSON, INET
@@ -51,6 +51,7 @@ class Project(Base):
     name = Column(String(255), nullable=False)
     description = Column(Text)
     status = Column(Enum('DRAFT', 'ACTIVE', 'COMPLETED', 'ARCHIVED', name='project_status'), default='DRAFT')
+    geom_revision = Column(BigInteger, nullable=False, default=0, server_default='0')  # Bumped by a trigger on parcel geometry/name writes
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -203,13 +204,16 @@ class SigefCertified(Base):
     __tablename__ = 'sigef_certified'
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    geom = Column(Geometry('MultiPolygon', srid=4326), nullable=False)
+    geom = Column(Geometry('MultiPolygon', srid=4326, spatial_index=False), nullable=False)
     owner = Column(String(255), nullable=True)
     cert_id = Column(String(255), unique=True, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     __table_args__ = (
         Index('ix_sigef_cert_id', 'cert_id'),
+        Index('ix_sigef_updated_at', 'updated_at'),  # MAX(updated_at) = SIGEF revision
+        # Dropped/rebuilt by services.sigef_loader around bulk loads
+        Index('idx_sigef_certified_geom', 'geom', postgresql_using='gist'),
     )
 
 
@@ -218,15 +222,19 @@ class ValidationEvent(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     project_id = Column(UUID(as_uuid=True), ForeignKey('project.id', ondelete='CASCADE'), nullable=False)
-    parcel_id = Column(UUID(as_uuid=True), ForeignKey('parcel.id', ondelete='CASCADE'), nullable=False)
+    parcel_id = Column(UUID(as_uuid=True), ForeignKey('parcel.id', ondelete='CASCADE'), nullable=True)  # NULL = geometry not saved yet
     type = Column(Enum('SIGEF_OVERLAP', 'NEIGHBOR_OVERLAP', 'GAP_DETECTED', 'GEOM_INVALID', name='validation_type'), nullable=False)
     result = Column(Enum('OK', 'WARN', 'FAIL', name='validation_result'), nullable=False)
     severity = Column(Enum('INFO', 'WARN', 'ERROR', name='validation_severity'), default='INFO')
     details = Column(JSON, nullable=True)
+    geom_hash = Column(String(64), nullable=True)  # Canonical geometry + options (services/validation_log.py)
+    project_revision = Column(String(32), nullable=True)
+    response = Column(JSON, nullable=True)  # Full GeometryResponse, on one row per run
     checked_at = Column(DateTime, default=datetime.utcnow)
     
     __table_args__ = (
         Index('ix_validation_event_parcel', 'parcel_id', 'checked_at'),
+        Index('ix_validation_event_memo', 'project_id', 'geom_hash', 'project_revision', 'checked_at'),
     )
 
 
@@ -264,3 +272,30 @@ class Document(Base):
         Index('ix_document_parcel', 'parcel_id'),
         Index('ix_document_type', 'type'),
     )
+
+
+class ImportJob(Base):
+    __tablename__ = 'import_job'
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(String(64), nullable=True)  # JWT sub of the uploader; only they can read/cancel the job
+    kind = Column(Enum('kml', 'shapefile', 'gpx', name='import_kind'), nullable=False)
+    status = Column(Enum('QUEUED', 'RUNNING', 'DONE', 'FAILED', 'CANCELLED', name='import_job_status'), default='QUEUED', nullable=False)
+    filename = Column(String(255), nullable=True)
+    output = Column(String(16), default='geojson', nullable=False)  # geojson or ndjson
+    options = Column(JSON, nullable=True)  # max_features, parser options (GPX simplification)
+    src_path = Column(Text, nullable=False)  # Spooled upload (removed when the job ends)
+    result_path = Column(Text, nullable=False)
+    bytes_total = Column(BigInteger, nullable=False)
+    bytes_read = Column(BigInteger, default=0)
+    features = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    error_status = Column(Integer, nullable=True)  # HTTP status for the error (400, 413, 504...)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Progress heartbeat
+    
+    __table_args__ = (
+        Index('ix_import_job_status', 'status', 'created_at'),
+    )
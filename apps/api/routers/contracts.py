@@ -4,12 +4,14 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from datetime import datetime
+from datetime import datetime, timedelta
 import uuid
 import hashlib
 from typing import Optional
 
-from db import supabase
+from supabase import AsyncClient
+
+from db import fetch_all, get_async_supabase
 from auth import get_current_user_required, require_topografo
 from models import ContractTemplate, ContractAcceptance
 from schemas import (
@@ -86,6 +88,7 @@ async def generate_contract(
     lote_id: Optional[int] = None,
     valor: Optional[float] = None,
     current_user = Depends(get_current_user_required),
+    sb: AsyncClient = Depends(get_async_supabase),
 ) -> JSONResponse:
     """
     Generate contract from template using data from orcamento/projeto/lote
@@ -103,22 +106,24 @@ async def generate_contract(
         tenant_id = current_user.get("tenant_id")
         user_id = current_user.get("sub")
         
-        # Fetch projeto data
-        projeto_response = supabase.table("projeto").select("*").eq("id", projeto_id).single().execute()
+        # Fetch projeto, orcamento and lote (if provided) concurrently
+        queries = [
+            sb.table("projeto").select("*").eq("id", projeto_id).single(),
+            sb.table("orcamento").select("*").eq("id", orcamento_id).single(),
+        ]
+        if lote_id:
+            queries.append(sb.table("lote").select("*").eq("id", lote_id).single())
+        projeto_response, orcamento_response, *lote_responses = await fetch_all(*queries)
+        
         if not projeto_response.data:
             raise HTTPException(status_code=404, detail="Projeto not found")
         
         projeto = projeto_response.data
         
-        # Fetch lote data if provided
         lote = None
-        if lote_id:
-            lote_response = supabase.table("lote").select("*").eq("id", lote_id).single().execute()
-            if lote_response.data:
-                lote = lote_response.data
+        if lote_responses and lote_responses[0].data:
+            lote = lote_responses[0].data
         
-        # Fetch orcamento data
-        orcamento_response = supabase.table("orcamento").select("*").eq("id", orcamento_id).single().execute()
         if not orcamento_response.data:
             raise HTTPException(status_code=404, detail="Orcamento not found")
         
@@ -180,7 +185,7 @@ async def generate_contract(
         contract_id = uuid.uuid4()
         
         # Insert into supabase contract_template table
-        contract_insert = supabase.table("contract_template").insert({
+        contract_insert = await sb.table("contract_template").insert({
             "id": str(contract_id),
             "tenant_id": tenant_id,
             "version": "1.0",
@@ -193,7 +198,7 @@ async def generate_contract(
             raise HTTPException(status_code=500, detail="Failed to save contract")
         
         # Update orcamento to link contract
-        supabase.table("orcamento").update({
+        await sb.table("orcamento").update({
             "contract_id": str(contract_id),
             "status": "CONTRATO_GERADO"
         }).eq("id", orcamento_id).execute()
@@ -219,6 +224,7 @@ async def generate_contract(
 async def sign_contract(
     request: ContractAcceptRequest,
     current_user = Depends(get_current_user_required),
+    sb: AsyncClient = Depends(get_async_supabase),
 ) -> JSONResponse:
     """
     Sign a contract - record acceptance evidence
@@ -237,21 +243,19 @@ async def sign_contract(
     """
     
     try:
-        # Validate contract exists
-        contract_response = supabase.table("contract_template").select("*").eq(
-            "id", request.contract_id
-        ).single().execute()
+        # Fetch contract and orcamento concurrently
+        contract_response, orcamento_response = await fetch_all(
+            sb.table("contract_template").select("*").eq("id", request.contract_id).single(),
+            sb.table("orcamento").select("*").eq("id", request.orcamento_id).single(),
+        )
         
+        # Validate contract exists
         if not contract_response.data:
             raise HTTPException(status_code=404, detail="Contract not found")
         
         contract = contract_response.data
         
         # Get projeto from orcamento
-        orcamento_response = supabase.table("orcamento").select("*").eq(
-            "id", request.orcamento_id
-        ).single().execute()
-        
         if not orcamento_response.data:
             raise HTTPException(status_code=404, detail="Orcamento not found")
         
@@ -263,7 +267,7 @@ async def sign_contract(
         now = datetime.utcnow()
         acceptance_id = uuid.uuid4()
         
-        acceptance_insert = supabase.table("contract_acceptance").insert({
+        acceptance_insert = await sb.table("contract_acceptance").insert({
             "id": str(acceptance_id),
             "project_id": str(projeto_id),
             "parcel_id": str(lote_id) if lote_id else str(projeto_id),
@@ -278,7 +282,7 @@ async def sign_contract(
             raise HTTPException(status_code=500, detail="Failed to record acceptance")
         
         # Update orcamento status
-        supabase.table("orcamento").update({
+        await sb.table("orcamento").update({
             "status": "CONTRATO_ASSINADO",
             "contract_id": request.contract_id,
         }).eq("id", request.orcamento_id).execute()
@@ -303,11 +307,12 @@ async def sign_contract(
 async def get_contract(
     contract_id: str,
     current_user = Depends(get_current_user_required),
+    sb: AsyncClient = Depends(get_async_supabase),
 ) -> ContractTemplateResponse:
     """Get contract details"""
     
     try:
-        contract_response = supabase.table("contract_template").select("*").eq(
+        contract_response = await sb.table("contract_template").select("*").eq(
             "id", contract_id
         ).single().execute()
         
@@ -317,9 +322,9 @@ async def get_contract(
         contract = contract_response.data
         
         # Get acceptance records
-        acceptances = supabase.table("contract_acceptance").select("*").eq(
+        acceptances = (await sb.table("contract_acceptance").select("*").eq(
             "id", contract_id
-        ).execute().data or []
+        ).execute()).data or []
         
         return ContractTemplateResponse(
             id=contract.get("id"),
@@ -340,12 +345,13 @@ async def get_contract(
 async def get_contract_by_orcamento(
     orcamento_id: int,
     current_user = Depends(get_current_user_required),
+    sb: AsyncClient = Depends(get_async_supabase),
 ) -> JSONResponse:
     """Get contract associated with an orcamento"""
     
     try:
         # Fetch orcamento
-        orcamento_response = supabase.table("orcamento").select("*").eq(
+        orcamento_response = await sb.table("orcamento").select("*").eq(
             "id", orcamento_id
         ).single().execute()
         
@@ -359,7 +365,7 @@ async def get_contract_by_orcamento(
             raise HTTPException(status_code=404, detail="No contract associated with this orcamento")
         
         # Fetch contract
-        contract_response = supabase.table("contract_template").select("*").eq(
+        contract_response = await sb.table("contract_template").select("*").eq(
             "id", contract_id
         ).single().execute()
         
@@ -369,9 +375,9 @@ async def get_contract_by_orcamento(
         contract = contract_response.data
         
         # Fetch acceptances
-        acceptances = supabase.table("contract_acceptance").select("*").eq(
+        acceptances = (await sb.table("contract_acceptance").select("*").eq(
             "parcel_id", orcamento.get("lote_id") or orcamento.get("projeto_id")
-        ).execute().data or []
+        ).execute()).data or []
         
         return JSONResponse({
             "contract_id": contract.get("id"),
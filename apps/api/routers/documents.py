@@ -2,7 +2,9 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 import hashlib
 
-from db import supabase
+from supabase import AsyncClient
+
+from db import get_async_supabase
 from auth import get_perfil, get_perfil_optional
 
 router = APIRouter(tags=["documents"])
@@ -18,6 +20,7 @@ async def upload_document(
     tipo: str = Form(...),
     file: UploadFile = File(...),
     perfil: dict = Depends(get_perfil_optional),
+    sb: AsyncClient = Depends(get_async_supabase),
 ):
     """Upload a document to Supabase Storage and record metadata."""
     if file.content_type not in ALLOWED_TYPES:
@@ -28,7 +31,7 @@ async def upload_document(
         raise HTTPException(400, "Arquivo excede 10MB.")
 
     # Verify lote exists
-    lote = supabase.table("lotes").select("id,projeto_id").eq("id", lote_id).execute()
+    lote = await sb.table("lotes").select("id,projeto_id").eq("id", lote_id).execute()
     if not lote.data:
         raise HTTPException(404, "Lote nao encontrado")
 
@@ -39,7 +42,7 @@ async def upload_document(
 
     # Upload to Supabase Storage
     try:
-        supabase.storage.from_(STORAGE_BUCKET).upload(
+        await sb.storage.from_(STORAGE_BUCKET).upload(
             storage_path,
             content,
             {"content-type": file.content_type},
@@ -50,7 +53,7 @@ async def upload_document(
             raise HTTPException(500, f"Erro ao enviar arquivo: {str(e)}")
 
     # Get public URL
-    public_url = supabase.storage.from_(STORAGE_BUCKET).get_public_url(storage_path)
+    public_url = await sb.storage.from_(STORAGE_BUCKET).get_public_url(storage_path)
 
     # Save document record
     doc_data = {
@@ -65,7 +68,7 @@ async def upload_document(
     if perfil:
         doc_data["uploaded_by"] = perfil.get("user_id")
 
-    doc = supabase.table("documentos").insert(doc_data).execute()
+    doc = await sb.table("documentos").insert(doc_data).execute()
     return doc.data[0] if doc.data else doc_data
 
 
@@ -73,10 +76,11 @@ async def upload_document(
 async def list_documents(
     lote_id: int,
     perfil: dict = Depends(get_perfil_optional),
+    sb: AsyncClient = Depends(get_async_supabase),
 ):
     """List all documents for a lote."""
-    docs = (
-        supabase.table("documentos")
+    docs = await (
+        sb.table("documentos")
         .select("*")
         .eq("lote_id", lote_id)
         .order("criado_em", desc=True)
@@ -89,9 +93,10 @@ async def list_documents(
 async def delete_document(
     documento_id: int,
     perfil: dict = Depends(get_perfil),
+    sb: AsyncClient = Depends(get_async_supabase),
 ):
     """Delete a document."""
-    doc = supabase.table("documentos").select("*").eq("id", documento_id).execute()
+    doc = await sb.table("documentos").select("*").eq("id", documento_id).execute()
     if not doc.data:
         raise HTTPException(404, "Documento nao encontrado")
 
@@ -101,9 +106,9 @@ async def delete_document(
         if STORAGE_BUCKET in url:
             storage_path = url.split(STORAGE_BUCKET + "/")[-1]
             if storage_path:
-                supabase.storage.from_(STORAGE_BUCKET).remove([storage_path])
+                await sb.storage.from_(STORAGE_BUCKET).remove([storage_path])
     except Exception:
         pass  # Continue even if storage delete fails
 
-    supabase.table("documentos").delete().eq("id", documento_id).execute()
+    await sb.table("documentos").delete().eq("id", documento_id).execute()
     return {"ok": True}
@@ -1,17 +1,41 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, List, Any
+from typing import AsyncIterator, BinaryIO, Dict, List, Any, Optional
+from uuid import UUID
+import asyncio
 import io
 import json
-
-from services.kml_service import parse_kml_to_geojson
-from services.shapefile_service import parse_shapefile_to_geojson
-from services.gpx_service import parse_gpx_to_geojson
+import os
+import tempfile
+
+from auth import get_current_user_required
+from config import settings
+from services.import_pool import (
+    ImportCancelled,
+    ImportQueueFull,
+    ImportTimeout,
+    import_pool,
+)
+from services.import_jobs import (
+    ACTIVE_STATUSES,
+    cancel_job,
+    check_capacity,
+    create_job,
+    delete_job,
+    get_job,
+    job_status,
+)
+from services.import_stream import ImportLimitExceeded
 from services.dxf_service import generate_dxf
 
 router = APIRouter(prefix="/api/import-export", tags=["Import/Export"])
 
+SPOOL_CHUNK_SIZE = 1024 * 1024  # Upload copy block; smaller spools stay in memory
+RELAY_CHUNK_SIZE = 256 * 1024  # Response block read from the worker's output file
+OUTPUT_POLL_S = 0.05  # Wait for more output from the worker
+
 
 class GeoJSONExportRequest(BaseModel):
     geometry: Dict[str, Any]  # GeoJSON geometry object
@@ -21,8 +45,170 @@ class DXFExportRequest(BaseModel):
     geometries: List[Dict[str, Any]]  # List of GeoJSON geometry objects
 
 
+def _max_bytes() -> int:
+    return settings.IMPORT_MAX_SIZE_MB * 1024 * 1024
+
+
+def _max_features(requested: Optional[int]) -> int:
+    if requested is None:
+        return settings.IMPORT_MAX_FEATURES
+    return min(requested, settings.IMPORT_MAX_FEATURES)
+
+
+async def _spool_upload(file: UploadFile, directory: Optional[str] = None) -> str:
+    """
+    Copy the upload, block by block, to a temp file and return its path.
+
+    The parser runs in another process (services.import_pool), which opens
+    the file by path. The caller removes it (_remove_files).
+    """
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    spool = tempfile.NamedTemporaryFile(prefix="import-", dir=directory, delete=False)
+    size = 0
+    try:
+        with spool:
+            while True:
+                chunk = await file.read(SPOOL_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > _max_bytes():
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Arquivo excede o limite de {settings.IMPORT_MAX_SIZE_MB} MB"
+                    )
+                await run_in_threadpool(spool.write, chunk)
+        if not size:
+            raise HTTPException(status_code=400, detail="Arquivo vazio")
+    except BaseException:
+        _remove_files(spool.name)
+        raise
+    return spool.name
+
+
+def _remove_files(*paths: str) -> None:
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+async def _run_import(
+    request: Request,
+    kind: str,
+    file: UploadFile,
+    output: str,
+    max_features: Optional[int],
+    options: Optional[Dict[str, Any]] = None,
+) -> StreamingResponse:
+    """
+    Parse the upload in the import process pool and stream the result.
+
+    The worker writes the GeoJSON FeatureCollection (or NDJSON) body to a
+    temp file; the response starts once the first feature is written and
+    relays the file as it grows, so the client gets bytes while the parse
+    is still running and the event loop never parses. A file that fails
+    before its first feature gets a 400/413; a failure after that cuts
+    the body (NDJSON ends with its {"type": "Error"} line). The job is
+    cancelled if the client disconnects; both temp files are removed when
+    the response ends.
+    """
+    src_path = await _spool_upload(file)
+    out_path = src_path + ".out"
+    job = asyncio.ensure_future(import_pool.run(
+        kind,
+        src_path,
+        out_path,
+        is_disconnected=request.is_disconnected,
+        output=output,
+        max_bytes=_max_bytes(),
+        max_features=_max_features(max_features),
+        options=options,
+    ))
+    job.add_done_callback(lambda t: t.cancelled() or t.exception())
+    try:
+        out = await _first_output(job, out_path)
+    except BaseException:
+        job.cancel()
+        _remove_files(src_path, out_path)
+        raise
+
+    media_type = "application/x-ndjson" if output == "ndjson" else "application/json"
+    return StreamingResponse(_relay_output(job, out, src_path, out_path), media_type=media_type)
+
+
+async def _first_output(job: "asyncio.Future", out_path: str) -> BinaryIO:
+    """
+    Open the worker's output once it holds the first bytes (or the job is
+    done). Parse errors raised before that propagate (400/413/504...).
+
+    The file is opened as soon as it exists: the worker unlinks it on a
+    later error, and the open handle still reads what was written.
+    """
+    out = None
+    try:
+        while True:
+            if out is None:
+                try:
+                    out = open(out_path, "rb")
+                except FileNotFoundError:
+                    pass
+            if job.done():
+                job.result()
+                return out if out is not None else open(out_path, "rb")
+            if out is not None and os.fstat(out.fileno()).st_size > 0:
+                return out
+            await asyncio.wait({job}, timeout=OUTPUT_POLL_S)
+    except BaseException:
+        if out is not None:
+            out.close()
+        raise
+
+
+async def _relay_output(
+    job: "asyncio.Future",
+    out: BinaryIO,
+    src_path: str,
+    out_path: str,
+) -> AsyncIterator[bytes]:
+    """Body chunks from the output file while the worker is writing it."""
+    try:
+        while True:
+            finished = job.done()
+            chunk = await run_in_threadpool(out.read, RELAY_CHUNK_SIZE)
+            if chunk:
+                yield chunk
+                continue
+            if finished:
+                # Drained: a parse that failed mid-body aborts the response
+                job.result()
+                return
+            await asyncio.wait({job}, timeout=OUTPUT_POLL_S)
+    finally:
+        out.close()
+        job.cancel()
+        _remove_files(src_path, out_path)
+
+
+def _pool_error(e: Exception) -> HTTPException:
+    """HTTP error for the import pool exceptions."""
+    if isinstance(e, ImportQueueFull):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    if isinstance(e, ImportTimeout):
+        return HTTPException(status_code=504, detail=str(e))
+    # ImportCancelled: the client is gone, the status is only logged
+    return HTTPException(status_code=499, detail=str(e))
+
+
 @router.post("/import/kml")
-async def import_kml(file: UploadFile = File(...)):
+async def import_kml(
+    request: Request,
+    file: UploadFile = File(...),
+    output: str = Query("geojson", alias="format", pattern="^(geojson|ndjson)$"),
+    max_features: Optional[int] = Query(None, ge=1),
+):
     """
     Import KML/KMZ file and convert to GeoJSON.
 
@@ -30,17 +216,21 @@ async def import_kml(file: UploadFile = File(...)):
     - KML (Google Earth)
     - KMZ (compressed KML)
 
-    Returns GeoJSON FeatureCollection.
+    Returns a GeoJSON FeatureCollection, or NDJSON (one Feature per line)
+    with format=ndjson. Limits: IMPORT_MAX_SIZE_MB (upload and KML after
+    decompression) and IMPORT_MAX_FEATURES (max_features can only lower it);
+    413 when exceeded. Parsing runs in the import process pool: 503 when
+    its queue is full, 504 after IMPORT_JOB_TIMEOUT_SECONDS.
     """
     try:
-        content = await file.read()
-
-        if not content:
-            raise HTTPException(status_code=400, detail="Arquivo vazio")
-
-        geojson = parse_kml_to_geojson(content)
-        return geojson
+        return await _run_import(request, "kml", file, output, max_features)
 
+    except HTTPException:
+        raise
+    except (ImportQueueFull, ImportTimeout, ImportCancelled) as e:
+        raise _pool_error(e)
+    except ImportLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -48,7 +238,12 @@ async def import_kml(file: UploadFile = File(...)):
 
 
 @router.post("/import/shapefile")
-async def import_shapefile(file: UploadFile = File(...)):
+async def import_shapefile(
+    request: Request,
+    file: UploadFile = File(...),
+    output: str = Query("geojson", alias="format", pattern="^(geojson|ndjson)$"),
+    max_features: Optional[int] = Query(None, ge=1),
+):
     """
     Import Shapefile (as ZIP) and convert to GeoJSON.
 
@@ -57,23 +252,24 @@ async def import_shapefile(file: UploadFile = File(...)):
     - .shx (index)
     - .dbf (attributes)
 
-    Returns GeoJSON FeatureCollection.
+    Returns a GeoJSON FeatureCollection, or NDJSON with format=ndjson
+    (same limits as /import/kml).
     """
     try:
-        content = await file.read()
-
-        if not content:
-            raise HTTPException(status_code=400, detail="Arquivo vazio")
-
         if not file.filename.endswith('.zip'):
             raise HTTPException(
                 status_code=400,
                 detail="Shapefile deve ser enviado como arquivo ZIP contendo .shp, .shx e .dbf"
             )
 
-        geojson = parse_shapefile_to_geojson(content)
-        return geojson
+        return await _run_import(request, "shapefile", file, output, max_features)
 
+    except HTTPException:
+        raise
+    except (ImportQueueFull, ImportTimeout, ImportCancelled) as e:
+        raise _pool_error(e)
+    except ImportLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -84,31 +280,214 @@ async def import_shapefile(file: UploadFile = File(...)):
 
 
 @router.post("/import/gpx")
-async def import_gpx(file: UploadFile = File(...)):
+async def import_gpx(
+    request: Request,
+    file: UploadFile = File(...),
+    output: str = Query("geojson", alias="format", pattern="^(geojson|ndjson)$"),
+    max_features: Optional[int] = Query(None, ge=1),
+    simplify: Optional[float] = Query(None, gt=0, description="Tolerância de simplificação (m)"),
+    method: str = Query("douglas-peucker", pattern="^(douglas-peucker|visvalingam)$"),
+):
     """
     Import GPX file and convert to GeoJSON.
 
     Extracts:
     - Waypoints (Point)
     - Tracks/Segments (LineString)
+    - Routes (LineString)
 
-    Returns GeoJSON FeatureCollection.
+    simplify= (meters) thins tracks and routes with Douglas-Peucker or,
+    with method=visvalingam, Visvalingam-Whyatt. Returns a GeoJSON
+    FeatureCollection, or NDJSON with format=ndjson (same limits as
+    /import/kml).
     """
     try:
-        content = await file.read()
-
-        if not content:
-            raise HTTPException(status_code=400, detail="Arquivo vazio")
-
-        geojson = parse_gpx_to_geojson(content)
-        return geojson
+        return await _run_import(
+            request, "gpx", file, output, max_features,
+            options={"tolerance_m": simplify, "method": method},
+        )
 
+    except HTTPException:
+        raise
+    except (ImportQueueFull, ImportTimeout, ImportCancelled) as e:
+        raise _pool_error(e)
+    except ImportLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao processar GPX: {str(e)}")
 
 
+# ============ Background import jobs ============
+# Same formats and limits as /import/*, for files that take longer to parse
+# than a proxy lets a request live: the upload is queued (import_job) and
+# parsed in the background; the client polls for progress and downloads
+# the result when the job is DONE. Jobs require authentication and are only
+# visible to their uploader; the queue is bounded by IMPORT_ASYNC_MAX_QUEUED
+# jobs / IMPORT_ASYNC_MAX_QUEUED_MB of uploads (503 beyond that).
+
+def _job_response(job) -> Dict[str, Any]:
+    base = f"{router.prefix}/jobs/{job.id}"
+    body = job_status(job)
+    body["status_url"] = base
+    if job.status == "DONE":
+        body["result_url"] = f"{base}/result"
+    return body
+
+
+def _queue_full(e: ImportQueueFull) -> HTTPException:
+    # Jobs drain in minutes, not seconds (compare _pool_error)
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "60"})
+
+
+async def _queue_import(
+    kind: str,
+    file: UploadFile,
+    output: str,
+    max_features: Optional[int],
+    user: dict,
+    parser_options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    try:
+        await check_capacity()
+        src_path = await _spool_upload(file, settings.IMPORT_ASYNC_DIR)
+        try:
+            await check_capacity(os.path.getsize(src_path))
+            job = await create_job(
+                kind,
+                src_path,
+                file.filename,
+                output,
+                {"max_features": _max_features(max_features), "parser": parser_options or {}},
+                user_id=user["user_id"],
+            )
+        except BaseException:
+            _remove_files(src_path)
+            raise
+    except ImportQueueFull as e:
+        raise _queue_full(e)
+    return _job_response(job)
+
+
+async def _owned_job(job_id: UUID, user: dict):
+    """The job, if it belongs to user (404 otherwise, even if it exists)."""
+    job = await get_job(job_id)
+    if job is None or job.user_id != user["user_id"]:
+        raise HTTPException(status_code=404, detail="Importação não encontrada")
+    return job
+
+
+@router.post("/jobs/kml", status_code=202)
+async def queue_import_kml(
+    file: UploadFile = File(...),
+    output: str = Query("geojson", alias="format", pattern="^(geojson|ndjson)$"),
+    max_features: Optional[int] = Query(None, ge=1),
+    user: dict = Depends(get_current_user_required),
+):
+    """
+    Queue a KML/KMZ import (see /import/kml) and return the job.
+
+    Poll GET /jobs/{id} for progress; GET /jobs/{id}/result once DONE.
+    """
+    try:
+        return await _queue_import("kml", file, output, max_features, user)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao criar importação: {str(e)}")
+
+
+@router.post("/jobs/shapefile", status_code=202)
+async def queue_import_shapefile(
+    file: UploadFile = File(...),
+    output: str = Query("geojson", alias="format", pattern="^(geojson|ndjson)$"),
+    max_features: Optional[int] = Query(None, ge=1),
+    user: dict = Depends(get_current_user_required),
+):
+    """Queue a Shapefile (ZIP) import (see /import/shapefile) and return the job."""
+    try:
+        if not file.filename.endswith('.zip'):
+            raise HTTPException(
+                status_code=400,
+                detail="Shapefile deve ser enviado como arquivo ZIP contendo .shp, .shx e .dbf"
+            )
+        return await _queue_import("shapefile", file, output, max_features, user)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao criar importação: {str(e)}")
+
+
+@router.post("/jobs/gpx", status_code=202)
+async def queue_import_gpx(
+    file: UploadFile = File(...),
+    output: str = Query("geojson", alias="format", pattern="^(geojson|ndjson)$"),
+    max_features: Optional[int] = Query(None, ge=1),
+    simplify: Optional[float] = Query(None, gt=0, description="Tolerância de simplificação (m)"),
+    method: str = Query("douglas-peucker", pattern="^(douglas-peucker|visvalingam)$"),
+    user: dict = Depends(get_current_user_required),
+):
+    """Queue a GPX import (see /import/gpx) and return the job."""
+    try:
+        return await _queue_import(
+            "gpx", file, output, max_features, user,
+            parser_options={"tolerance_m": simplify, "method": method},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao criar importação: {str(e)}")
+
+
+@router.get("/jobs/{job_id}")
+async def import_job_status(job_id: UUID, user: dict = Depends(get_current_user_required)):
+    """
+    Job status and progress: features processed, bytes read of the upload
+    (bytes_total) and progress (0-1); error when FAILED.
+    """
+    job = await _owned_job(job_id, user)
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}/result")
+async def import_job_result(job_id: UUID, user: dict = Depends(get_current_user_required)):
+    """
+    Download the GeoJSON FeatureCollection (or NDJSON) of a DONE job.
+
+    409 while QUEUED/RUNNING; a FAILED job answers with its error status
+    (400, 413, 504...); 410 when cancelled or expired.
+    """
+    job = await _owned_job(job_id, user)
+    if job.status in ACTIVE_STATUSES:
+        raise HTTPException(status_code=409, detail="Importação ainda em andamento")
+    if job.status == "FAILED":
+        raise HTTPException(status_code=job.error_status or 400, detail=job.error)
+    if job.status == "CANCELLED" or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=410, detail="Resultado da importação não está mais disponível")
+
+    extension = "ndjson" if job.output == "ndjson" else "geojson"
+    stem = os.path.splitext(job.filename or "import")[0]
+    return FileResponse(
+        job.result_path,
+        media_type="application/x-ndjson" if job.output == "ndjson" else "application/json",
+        filename=f"{stem}.{extension}",
+    )
+
+
+@router.delete("/jobs/{job_id}")
+async def delete_import_job(job_id: UUID, user: dict = Depends(get_current_user_required)):
+    """
+    Cancel a QUEUED/RUNNING job (returns its status; a running job stops
+    within a second), or remove a finished one and its result.
+    """
+    job = await _owned_job(job_id, user)
+    if job.status in ACTIVE_STATUSES:
+        return _job_response(await cancel_job(job))
+    await delete_job(job)
+    return {"ok": True}
+
+
 @router.post("/export/dxf")
 async def export_dxf(request: DXFExportRequest):
     """
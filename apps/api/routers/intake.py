@@ -4,7 +4,9 @@ from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 
-from db import supabase
+from supabase import AsyncClient
+
+from db import fetch_all, get_async_supabase
 from auth import get_perfil, get_perfil_optional
 
 router = APIRouter(tags=["intake"])
@@ -22,25 +24,15 @@ class IntakeData(BaseModel):
     profissao: Optional[str] = None
 
 
-def _calculate_progress(lote_id: int, lote_data: dict) -> dict:
+async def _calculate_progress(sb: AsyncClient, lote_id: int, lote_data: dict) -> dict:
     """Calculate cadastro progress for a lote."""
-    # Count documents
-    docs = (
-        supabase.table("documentos")
-        .select("id,tipo")
-        .eq("lote_id", lote_id)
-        .execute()
+    # Documents and vizinhos are independent: fetch both concurrently
+    docs, vizinhos = await fetch_all(
+        sb.table("documentos").select("id,tipo").eq("lote_id", lote_id),
+        sb.table("vizinhos").select("id").eq("lote_id", lote_id),
     )
     doc_types = set(d.get("tipo") for d in (docs.data or []))
 
-    # Check vizinhos
-    vizinhos = (
-        supabase.table("vizinhos")
-        .select("id")
-        .eq("lote_id", lote_id)
-        .execute()
-    )
-
     steps = [
         {
             "id": "dados_pessoais",
@@ -86,18 +78,19 @@ async def save_intake(
     lote_id: int,
     body: IntakeData,
     perfil: dict = Depends(get_perfil_optional),
+    sb: AsyncClient = Depends(get_async_supabase),
 ):
     """Save/update client intake form data."""
-    lote = supabase.table("lotes").select("id").eq("id", lote_id).execute()
+    lote = await sb.table("lotes").select("id").eq("id", lote_id).execute()
     if not lote.data:
         raise HTTPException(404, "Lote nao encontrado")
 
     update_data = {k: v for k, v in body.dict().items() if v is not None}
     if update_data:
         update_data["intake_completed_at"] = datetime.utcnow().isoformat()
-        supabase.table("lotes").update(update_data).eq("id", lote_id).execute()
+        await sb.table("lotes").update(update_data).eq("id", lote_id).execute()
 
-    result = supabase.table("lotes").select("*").eq("id", lote_id).execute()
+    result = await sb.table("lotes").select("*").eq("id", lote_id).execute()
     return result.data[0] if result.data else {}
 
 
@@ -105,21 +98,22 @@ async def save_intake(
 async def get_progress(
     lote_id: int,
     perfil: Optional[dict] = Depends(get_perfil_optional),
+    sb: AsyncClient = Depends(get_async_supabase),
 ):
     """Get cadastro progress for a lote."""
-    lote = supabase.table("lotes").select("*").eq("id", lote_id).execute()
+    lote = await sb.table("lotes").select("*").eq("id", lote_id).execute()
     if not lote.data:
         raise HTTPException(404, "Lote nao encontrado")
 
-    return _calculate_progress(lote_id, lote.data[0])
+    return await _calculate_progress(sb, lote_id, lote.data[0])
 
 
 @router.get("/api/acesso-lote/progresso")
-async def get_progress_by_token(token: str):
+async def get_progress_by_token(token: str, sb: AsyncClient = Depends(get_async_supabase)):
     """Get progress for a lote accessed via magic link token."""
-    response = supabase.table("lotes").select("*").eq("token_acesso", token).execute()
+    response = await sb.table("lotes").select("*").eq("token_acesso", token).execute()
     if not response.data:
         raise HTTPException(status_code=404, detail="Link invalido ou expirado")
 
     lote = response.data[0]
-    return _calculate_progress(lote["id"], lote)
+    return await _calculate_progress(sb, lote["id"], lote)
@@ -1,18 +1,29 @@
 """Router for parcel/lote operations including layer management and validation."""
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, select, text
 from geoalchemy2 import shape
 from geoalchemy2.elements import WKBElement
+from shapely.geometry import MultiPolygon, mapping, shape as shape_from_geojson
 from typing import Optional, List, Dict, Any
 from uuid import UUID
 from datetime import datetime
+import json
 import logging
 
-from database import get_db
+from database import get_async_db, run_in_sync_session
 from models import Parcel, Project, User
-from schemas import ParcelStatus, SketchStatus
-from services.geo import validate_geometry_complete
+from config import settings
+from schemas import ParcelStatus, SketchStatus, GeometryRequest, BatchGeometryRequest, BatchGeometryResponse
+from services.geo import (
+    SigefValidationError,
+    clean_geometry,
+    calculate_metrics,
+    validate_geometry_complete,
+    validate_geometries_batch,
+)
+from services.overlap_index import overlap_index, parcel_index_key, load_project_parcels
+from services.validation_log import lock_project_revision, project_revision_async
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/parcels", tags=["parcels"])
@@ -40,6 +51,17 @@ class ValidateTopographyResponse(dict):
 
 
 # ============ Utility Functions ============
+def _parcel_uuid(parcel_id: str) -> UUID:
+    """Parse a parcel id from the path (404 on malformed ids)."""
+    try:
+        return UUID(parcel_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Parcel {parcel_id} not found"
+        )
+
+
 def geometry_to_geojson(geom: WKBElement) -> Optional[Dict[str, Any]]:
     """Convert PostGIS WKBElement to GeoJSON dictionary."""
     if not geom:
@@ -72,73 +94,115 @@ def geometry_to_geojson(geom: WKBElement) -> Optional[Dict[str, Any]]:
         return None
 
 
-def get_neighbor_parcels(db: Session, parcel: Parcel) -> List[Parcel]:
+async def get_neighbor_parcels(db: AsyncSession, parcel: Parcel) -> List[Parcel]:
     """Get neighboring parcels that share boundaries or overlap."""
     if not parcel.geom_official and not parcel.geom_client_sketch:
         return []
     
     # Use geometry from official or client sketch
-    geom = parcel.geom_official or parcel.geom_client_sketch
+    geom = parcel.geom_official if parcel.geom_official is not None else parcel.geom_client_sketch
     
     try:
         # Query for parcels that touch or intersect (ST_Intersects, ST_Touches)
-        neighbors = db.query(Parcel).filter(
+        result = await db.execute(select(Parcel).where(
             and_(
                 Parcel.project_id == parcel.project_id,
                 Parcel.id != parcel.id,
-                func.st_intersects(Parcel.geom_official or Parcel.geom_client_sketch, geom)
+                func.st_intersects(func.coalesce(Parcel.geom_official, Parcel.geom_client_sketch), geom)
             )
-        ).all()
+        ))
         
-        return neighbors
+        return list(result.scalars().all())
     except Exception as e:
         logger.warning(f"Could not query neighbors: {e}")
         return []
 
 
-def detect_overlaps(db: Session, parcel: Parcel) -> List[Dict[str, Any]]:
-    """Detect overlaps with neighboring parcels."""
+# Every neighbor whose interior meets the parcel, with the intersection
+# computed once per pair. The bbox test is split per column so both GiST
+# indexes on parcel can be used (COALESCE would hide them).
+OVERLAPS_QUERY = text("""
+    WITH target AS (
+        SELECT id, project_id, COALESCE(geom_official, geom_client_sketch) AS geom
+        FROM parcel
+        WHERE id = :parcel_id
+    )
+    SELECT
+        n.id,
+        n.name,
+        ST_Area(i.geom::geography) AS overlap_area,
+        CASE WHEN :include_geometry THEN ST_AsGeoJSON(i.geom) END AS overlap_geojson
+    FROM target t
+    JOIN parcel n
+      ON n.project_id = t.project_id
+     AND n.id != t.id
+     AND (
+            n.geom_official && t.geom
+         OR (n.geom_official IS NULL AND n.geom_client_sketch && t.geom)
+     )
+    CROSS JOIN LATERAL (
+        -- OFFSET 0: no inlining, ST_Intersection runs once per pair
+        SELECT ST_CollectionExtract(
+            ST_Intersection(t.geom, COALESCE(n.geom_official, n.geom_client_sketch)), 3
+        ) AS geom
+        OFFSET 0
+    ) i
+    WHERE t.geom IS NOT NULL
+      AND ST_Relate(t.geom, COALESCE(n.geom_official, n.geom_client_sketch), 'T********')
+    ORDER BY overlap_area DESC
+""")
+
+
+async def detect_overlaps(
+    db: AsyncSession,
+    parcel: Parcel,
+    include_geometry: bool = False,
+) -> List[Dict[str, Any]]:
+    """Detect overlaps with neighboring parcels.
+    
+    One set-based query for all neighbors (interior overlaps only, largest
+    first); overlap_geometry is included as GeoJSON when requested.
+    """
     overlaps = []
     
     if not parcel.geom_official and not parcel.geom_client_sketch:
         return overlaps
     
-    geom = parcel.geom_official or parcel.geom_client_sketch
+    geom = parcel.geom_official if parcel.geom_official is not None else parcel.geom_client_sketch
+    
+    if settings.OVERLAP_INDEX_ENABLED and not include_geometry:
+        try:
+            overlaps = await run_in_sync_session(lambda session: overlap_index.get(
+                parcel_index_key(parcel.project_id),
+                lambda: load_project_parcels(session, parcel.project_id),
+            ).overlaps(shape.to_shape(geom), exclude_id=str(parcel.id)))
+            return [
+                {
+                    "parcel_id": o["parcel_id"],
+                    "parcel_name": o["name"],
+                    "overlap_area_m2": round(o["overlap_area_m2"], 2)
+                }
+                for o in overlaps
+            ]
+        except Exception as e:
+            logger.warning(f"Overlap index unavailable, falling back to PostGIS: {e}")
     
     try:
-        # Find neighbors
-        neighbors = get_neighbor_parcels(db, parcel)
+        result = await db.execute(OVERLAPS_QUERY, {
+            "parcel_id": str(parcel.id),
+            "include_geometry": include_geometry,
+        })
+        rows = result.fetchall()
         
-        for neighbor in neighbors:
-            neighbor_geom = neighbor.geom_official or neighbor.geom_client_sketch
-            if not neighbor_geom:
-                continue
-            
-            # Check for overlap (not just touching)
-            overlap_exists = db.query(
-                func.st_intersects(geom, neighbor_geom)
-            ).scalar()
-            
-            if overlap_exists:
-                # Calculate overlap area
-                overlap_geom = db.query(
-                    func.st_intersection(geom, neighbor_geom)
-                ).scalar()
-                
-                overlap_area = 0
-                if overlap_geom:
-                    try:
-                        overlap_area = db.query(
-                            func.st_area(overlap_geom, true)  # Use geography for accurate area
-                        ).scalar() or 0
-                    except:
-                        pass
-                
-                overlaps.append({
-                    "parcel_id": str(neighbor.id),
-                    "parcel_name": neighbor.name,
-                    "overlap_area_m2": round(overlap_area, 2)
-                })
+        for row in rows:
+            overlap = {
+                "parcel_id": str(row.id),
+                "parcel_name": row.name,
+                "overlap_area_m2": round(row.overlap_area or 0, 2)
+            }
+            if include_geometry:
+                overlap["overlap_geometry"] = json.loads(row.overlap_geojson) if row.overlap_geojson else None
+            overlaps.append(overlap)
     except Exception as e:
         logger.warning(f"Error detecting overlaps: {e}")
     
@@ -147,10 +211,41 @@ def detect_overlaps(db: Session, parcel: Parcel) -> List[Dict[str, Any]]:
 
 # ============ Endpoints ============
 
+@router.post("/validate-batch", response_model=BatchGeometryResponse)
+async def validate_parcels_batch(request: BatchGeometryRequest):
+    """
+    Validate many candidate geometries of one project in a single call.
+    
+    Intended for subdivision imports (desmembramento): the SIGEF and
+    neighbor checks run as one set-based query each for the whole batch,
+    the gap check against the cached project coverage.
+    
+    Returns:
+        One GeometryResponse per item, in request order
+    """
+    try:
+        results = await run_in_sync_session(lambda session: validate_geometries_batch(
+            [item.geojson for item in request.items],
+            str(request.project_id),
+            [str(item.parcel_id) if item.parcel_id else None for item in request.items],
+            session,
+            check_sigef=request.check_sigef,
+            check_neighbors=request.check_neighbors,
+            check_gaps=request.check_gaps,
+        ))
+        return BatchGeometryResponse(results=results)
+    except Exception as e:
+        logger.error(f"Error validating parcel batch: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to validate parcel batch"
+        )
+
+
 @router.get("/{parcel_id}/layers", response_model=Dict[str, Any])
 async def get_parcel_layers(
     parcel_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get all 4 validation layers for a parcel.
@@ -184,7 +279,7 @@ async def get_parcel_layers(
     """
     try:
         # Fetch parcel from database
-        parcel = db.query(Parcel).filter_by(id=parcel_id).first()
+        parcel = await db.get(Parcel, _parcel_uuid(parcel_id))
         
         if not parcel:
             raise HTTPException(
@@ -193,7 +288,7 @@ async def get_parcel_layers(
             )
         
         # Get neighbors for overlap/boundary visualization
-        neighbors = get_neighbor_parcels(db, parcel)
+        neighbors = await get_neighbor_parcels(db, parcel)
         
         # Build layers response
         layers = {
@@ -294,11 +389,89 @@ async def get_parcel_layers(
         )
 
 
+@router.put("/{parcel_id}/geometry", response_model=Dict[str, Any])
+async def update_parcel_geometry(
+    parcel_id: str,
+    request: GeometryRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Save the topographer-adjusted (official) geometry of a parcel.
+    
+    Recomputes area/perimeter and applies the change to the in-memory
+    overlap index of the project, so later overlap checks (and memoized
+    validations, at the new project revision) see it without reloading
+    the project.
+    """
+    try:
+        parcel = await db.get(Parcel, _parcel_uuid(parcel_id))
+        
+        if not parcel:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Parcel {parcel_id} not found"
+            )
+        
+        try:
+            geom_obj = shape_from_geojson(clean_geometry(request.geojson))
+        except SigefValidationError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        if geom_obj.geom_type == "Polygon":
+            geom_obj = MultiPolygon([geom_obj])
+        
+        area_m2, perimeter_m = calculate_metrics(mapping(geom_obj))
+        
+        # Project revision before/after the write, so the patched overlap
+        # index stays valid for memoized validations
+        previous_revision = revision = None
+        if settings.VALIDATION_LOG_ENABLED:
+            previous_revision = await lock_project_revision(db, str(parcel.project_id))
+        
+        parcel.geom_official = shape.from_shape(geom_obj, srid=4326)
+        parcel.area_m2 = area_m2
+        parcel.perimeter_m = perimeter_m
+        
+        db.add(parcel)
+        if previous_revision is not None:
+            await db.flush()
+            revision = await project_revision_async(db, str(parcel.project_id))
+        await db.commit()
+        
+        overlap_index.upsert(
+            parcel_index_key(parcel.project_id),
+            str(parcel.id),
+            geom_obj,
+            parcel.name,
+            revision=revision,
+            previous_revision=previous_revision,
+        )
+        
+        return {
+            "status": "success",
+            "parcel_id": str(parcel.id),
+            "area_m2": area_m2,
+            "perimeter_m": perimeter_m,
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating parcel geometry: {e}")
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update parcel geometry"
+        )
+
+
 @router.post("/{parcel_id}/validate-topography", response_model=Dict[str, Any])
 async def validate_parcel_topography(
     parcel_id: str,
     request: Optional[Dict[str, Any]] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Validate parcel topography and mark as validated by topographer.
@@ -318,7 +491,7 @@ async def validate_parcel_topography(
     """
     try:
         # Fetch parcel
-        parcel = db.query(Parcel).filter_by(id=parcel_id).first()
+        parcel = await db.get(Parcel, _parcel_uuid(parcel_id))
         
         if not parcel:
             raise HTTPException(
@@ -326,17 +499,29 @@ async def validate_parcel_topography(
                 detail=f"Parcel {parcel_id} not found"
             )
         
-        # Validate geometry
-        validation_result = validate_geometry_complete(parcel)
+        geom = parcel.geom_official if parcel.geom_official is not None else parcel.geom_client_sketch
+        if geom is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Parcel has no geometry to validate"
+            )
+        
+        # Validate geometry (memoized per geometry + project revision)
+        validation_result = await run_in_sync_session(lambda session: validate_geometry_complete(
+            mapping(shape.to_shape(geom)),
+            str(parcel.project_id),
+            str(parcel.id),
+            session,
+        ))
         
-        if not validation_result.get("valid"):
+        if not validation_result.can_proceed:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Geometry validation failed: {validation_result.get('errors', [])}"
+                detail=f"Geometry validation failed: {validation_result.message}"
             )
         
         # Detect overlaps
-        overlaps = detect_overlaps(db, parcel)
+        overlaps = await detect_overlaps(db, parcel)
         
         # Update parcel status
         parcel.sketch_status = "approved"
@@ -348,16 +533,17 @@ async def validate_parcel_topography(
             parcel.reviewed_notes = request.get("notes", "")
         
         db.add(parcel)
-        db.commit()
-        db.refresh(parcel)
+        await db.commit()
+        await db.refresh(parcel)
         
         return {
             "status": "success",
             "parcel_id": str(parcel.id),
             "validation_status": parcel.sketch_status,
-            "geometry_valid": validation_result.get("valid"),
-            "geometry_area_m2": validation_result.get("area_m2", 0),
-            "geometry_perimeter_m": validation_result.get("perimeter_m", 0),
+            "geometry_valid": validation_result.can_proceed,
+            "geometry_area_m2": validation_result.area_m2 or 0,
+            "geometry_perimeter_m": validation_result.perimeter_m or 0,
+            "warnings": [w.model_dump() for w in validation_result.warnings],
             "overlaps_detected": overlaps,
             "has_overlap_alert": len(overlaps) > 0,
             "validated_at": parcel.reviewed_by_topografo_at.isoformat() if parcel.reviewed_by_topografo_at else None,
@@ -370,7 +556,7 @@ async def validate_parcel_topography(
         raise
     except Exception as e:
         logger.error(f"Error validating parcel topography: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to validate parcel topography"
@@ -380,15 +566,17 @@ async def validate_parcel_topography(
 @router.get("/{parcel_id}/overlaps", response_model=List[Dict[str, Any]])
 async def get_parcel_overlaps(
     parcel_id: str,
-    db: Session = Depends(get_db)
+    include_geometry: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get list of overlapping neighbors for a parcel.
     
-    Returns detailed overlap information for conflict resolution.
+    Returns detailed overlap information for conflict resolution
+    (include_geometry=true adds each overlap polygon as GeoJSON).
     """
     try:
-        parcel = db.query(Parcel).filter_by(id=parcel_id).first()
+        parcel = await db.get(Parcel, _parcel_uuid(parcel_id))
         
         if not parcel:
             raise HTTPException(
@@ -396,7 +584,7 @@ async def get_parcel_overlaps(
                 detail=f"Parcel {parcel_id} not found"
             )
         
-        overlaps = detect_overlaps(db, parcel)
+        overlaps = await detect_overlaps(db, parcel, include_geometry=include_geometry)
         return overlaps
         
     except HTTPException:
@@ -154,6 +154,23 @@ class GeometryResponse(BaseModel):
     code: Optional[str] = None
 
 
+class BatchGeometryItem(BaseModel):
+    geojson: Dict[str, Any] = Field(..., description="GeoJSON Polygon/MultiPolygon")
+    parcel_id: Optional[UUID] = Field(default=None, description="Existing parcel being re-drawn, if any")
+
+
+class BatchGeometryRequest(BaseModel):
+    project_id: UUID
+    items: List[BatchGeometryItem] = Field(..., min_length=1)
+    check_sigef: bool = True
+    check_neighbors: bool = True
+    check_gaps: bool = True
+
+
+class BatchGeometryResponse(BaseModel):
+    results: List[GeometryResponse] = []
+
+
 class ParcelResponse(ParcelBase):
     id: UUID
     project_id: UUID
@@ -0,0 +1,116 @@
+"""Project coverage engine: interior gaps and slivers between parcels.
+
+Works on the cached project union kept by services.overlap_index (patched
+locally when a parcel changes) instead of re-running ST_Union over the
+whole project on every validation.
+
+- gap: hole in the project coverage (area enclosed by parcels, not covered)
+- sliver: uncovered strip narrower than settings.SLIVER_MAX_WIDTH_M,
+  either a thin hole or a channel open to the outside (found by a
+  morphological closing of the coverage)
+"""
+import math
+from typing import Any, Dict, List, Optional
+
+from shapely.geometry import Polygon, mapping
+from shapely.geometry.base import BaseGeometry
+from shapely.ops import unary_union
+
+from config import settings
+from services.geodesic import geodesic_area_perimeter
+from services.overlap_index import ProjectOverlapIndex
+
+METERS_PER_DEGREE = 111320.0
+
+
+def _polygons(geom: BaseGeometry) -> List[Polygon]:
+    if geom.is_empty:
+        return []
+    if geom.geom_type == "Polygon":
+        return [geom]
+    if geom.geom_type == "MultiPolygon":
+        return list(geom.geoms)
+    polygons: List[Polygon] = []
+    for part in getattr(geom, "geoms", []):
+        polygons.extend(_polygons(part))
+    return polygons
+
+
+def _degrees(meters: float, lat: float) -> float:
+    """Meters → degrees, sized on the longitude axis (the shorter one)."""
+    return meters / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+
+
+def find_gaps(
+    index: ProjectOverlapIndex,
+    geom: BaseGeometry,
+    exclude_id: Optional[str] = None,
+    tolerance_m2: float = 1,
+    sliver_width_m: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """Gaps and slivers next to geom once it is placed in the project.
+
+    Args:
+        index: Project index (cached coverage)
+        geom: Candidate geometry (lon/lat)
+        exclude_id: Parcel being re-drawn (its stored geometry is replaced)
+        tolerance_m2: Ignore uncovered pieces up to this area
+        sliver_width_m: Max width of a sliver (default: settings)
+
+    Returns:
+        [{ kind: "gap"|"sliver", area_m2, perimeter_m, geometry }], largest first
+    """
+    if sliver_width_m is None:
+        sliver_width_m = settings.SLIVER_MAX_WIDTH_M
+
+    half_width = _degrees(sliver_width_m / 2, geom.centroid.y)
+    coverage = index.union_with(geom, exclude_id, margin=4 * half_width)
+    window = geom.buffer(half_width)
+
+    # Holes in the coverage that touch the candidate (minus any parcel
+    # lying inside the hole as an island)
+    holes = [
+        hole
+        for polygon in _polygons(coverage)
+        for ring in polygon.interiors
+        if Polygon(ring).intersects(window)
+        for hole in _polygons(Polygon(ring).difference(coverage))
+    ]
+    holes = [h for h in holes if h.intersects(window)]
+
+    # Thin openings: what a closing of half the sliver width fills in,
+    # restricted to the neighbourhood of the candidate
+    local = coverage.intersection(geom.buffer(3 * half_width))
+    closed = local.buffer(half_width).buffer(-half_width)
+    openings = closed.difference(coverage)
+    if holes:
+        openings = openings.difference(unary_union(holes))
+    openings_list = [p for p in _polygons(openings) if p.intersects(window)]
+
+    pieces = [(h, False) for h in holes] + [(p, True) for p in openings_list]
+    if not pieces:
+        return []
+
+    areas, perimeters = geodesic_area_perimeter([p for p, _ in pieces])
+    results = []
+    for (polygon, is_opening), area, perimeter in zip(pieces, areas.tolist(), perimeters.tolist()):
+        if area <= tolerance_m2:
+            continue
+        # A hole is a sliver when an opening of half the width erases it
+        is_sliver = is_opening or polygon.buffer(-half_width).is_empty
+        results.append({
+            "kind": "sliver" if is_sliver else "gap",
+            "area_m2": area,
+            "perimeter_m": perimeter,
+            "geometry": mapping(polygon),
+        })
+    results.sort(key=lambda r: r["area_m2"], reverse=True)
+    return results
+
+
+def gap_details(gaps: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """GAP_DETECTED warning details for a list returned by find_gaps."""
+    return {
+        "gap_area_m2": sum(g["area_m2"] for g in gaps),
+        "gaps": gaps,
+    }
@@ -1,4 +1,5 @@
 """Geospatial validation services using PostGIS."""
+import logging
 from typing import Dict, List, Any, Optional, Tuple
 from sqlalchemy import text
 from sqlalchemy.orm import Session
@@ -9,9 +10,28 @@ from geoalchemy2 import functions as geofunc
 from geoalchemy2.types import Geometry
 from config import settings
 from models import Parcel, SigefCertified, ValidationEvent
+from services.geodesic import geodesic_area_perimeter, geodesic_metrics
+from services.overlap_index import (
+    ProjectOverlapIndex,
+    overlap_index,
+    parcel_index_key,
+    load_project_parcels,
+)
+from services.coverage import find_gaps, gap_details
+from services.validation_log import (
+    geometry_hash,
+    project_revision,
+    find_cached_response,
+    find_cached_responses,
+    record_validation,
+    record_validations,
+)
 from schemas import GeometryResponse, ValidationWarning, ValidationResult
 
 
+logger = logging.getLogger(__name__)
+
+
 class SigefValidationError(Exception):
     """Custom exception for SIGEF validation."""
     pass
@@ -73,61 +93,116 @@ def check_sigef_overlap(
     geom_dict: Dict[str, Any],
     db: Session,
     tolerance_m2: float = 0,
-) -> Tuple[bool, Optional[float], Optional[str]]:
+    max_results: Optional[int] = None,
+) -> Tuple[bool, List[Dict[str, Any]]]:
     """Check overlap with SIGEF/INCRA certified areas.
     
+    The input is bound once as WKB; candidates come from a bbox prefilter
+    on the GiST index of sigef_certified.geom, the intersection is computed
+    on geometry and only its result is cast to geography for the area.
+    
     Args:
         geom_dict: GeoJSON geometry
         db: Database session
         tolerance_m2: Minimum overlap area to trigger alert (default 0 = any overlap)
+        max_results: Cap on certificates returned (default SIGEF_OVERLAP_MAX_RESULTS)
         
     Returns:
-        (has_overlap, overlap_area_m2, certified_owner)
+        (has_overlap, [{ cert_id, certified_owner, overlap_area_m2 }]) ranked
+        by overlap area, largest first
     """
     try:
-        # Convert GeoJSON to WKT for PostGIS query
         geom_obj = shape(geom_dict)
-        wkt = geom_obj.wkt
         
-        # Query PostGIS for overlap
         query = text("""
-            SELECT 
-                ST_Area(ST_Intersection(
-                    ST_GeomFromText(:wkt, 4326)::geography,
-                    s.geom::geography
-                )) as overlap_area,
-                s.owner
-            FROM sigef_certified s
-            WHERE ST_Intersects(
-                ST_GeomFromText(:wkt, 4326),
-                s.geom
+            WITH input AS (
+                SELECT ST_GeomFromWKB(:wkb, 4326) AS geom
+            ),
+            hits AS (
+                SELECT
+                    s.cert_id,
+                    s.owner,
+                    ST_Area(ST_Intersection(i.geom, s.geom)::geography) AS overlap_area
+                FROM input i
+                JOIN sigef_certified s
+                    ON s.geom && i.geom
+                    AND ST_Intersects(i.geom, s.geom)
             )
-            LIMIT 1
+            SELECT cert_id, owner, overlap_area
+            FROM hits
+            WHERE overlap_area > :tolerance
+            ORDER BY overlap_area DESC
+            LIMIT :max_results
         """)
         
-        result = db.execute(query, {"wkt": wkt}).first()
+        rows = db.execute(query, {
+            "wkb": geom_obj.wkb,
+            "tolerance": tolerance_m2,
+            "max_results": max_results or settings.SIGEF_OVERLAP_MAX_RESULTS,
+        }).all()
         
-        if result and result.overlap_area > tolerance_m2:
-            return True, result.overlap_area, result.owner
-        
-        return False, None, None
+        overlaps = [
+            {
+                "cert_id": row.cert_id,
+                "certified_owner": row.owner,
+                "overlap_area_m2": row.overlap_area,
+            }
+            for row in rows
+        ]
+        return bool(overlaps), overlaps
     except Exception as e:
         raise SigefValidationError(f"SIGEF overlap check failed: {str(e)}")
 
 
+def sigef_overlap_warning(overlaps: List[Dict[str, Any]]) -> ValidationWarning:
+    """Build the SIGEF_OVERLAP warning from ranked overlaps (largest first)."""
+    return ValidationWarning(
+        type="SIGEF_OVERLAP",
+        details={
+            "overlap_area_m2": overlaps[0]["overlap_area_m2"],
+            "certified_owner": overlaps[0]["certified_owner"],
+            "certificates": overlaps,
+        },
+    )
+
+
 def check_neighbor_overlap(
     geom_dict: Dict[str, Any],
     project_id: str,
     current_parcel_id: Optional[str],
     db: Session,
+    revision: Optional[str] = None,
 ) -> Tuple[bool, Optional[Dict[str, Any]]]:
     """Check overlap with neighbor parcels in same project.
     
+    revision: project revision the result will be memoized under; the
+    cached index is reloaded unless it was loaded at that revision.
+    
     Returns:
         (has_overlap, { neighbor_parcel_id, overlap_area_m2 })
     """
     try:
         geom_obj = shape(geom_dict)
+
+        if settings.OVERLAP_INDEX_ENABLED:
+            index = overlap_index.get(
+                parcel_index_key(project_id),
+                lambda: load_project_parcels(db, project_id),
+                revision,
+            )
+            overlaps = index.overlaps(
+                geom_obj,
+                exclude_id=str(current_parcel_id) if current_parcel_id else None,
+            )
+            if overlaps:
+                top = overlaps[0]
+                return True, {
+                    "neighbor_parcel_id": top["parcel_id"],
+                    "neighbor_name": top["name"],
+                    "overlap_area_m2": top["overlap_area_m2"],
+                }
+            return False, None
+
         wkt = geom_obj.wkt
         
         query = text("""
@@ -168,62 +243,59 @@ def check_neighbor_overlap(
         raise SigefValidationError(f"Neighbor overlap check failed: {str(e)}")
 
 
+def _project_coverage(
+    db: Session,
+    project_id: str,
+    revision: Optional[str] = None,
+) -> ProjectOverlapIndex:
+    """Parcels of the project for find_gaps.
+    
+    The cached index (and its cached union) only with OVERLAP_INDEX_ENABLED,
+    which accepts OVERLAP_INDEX_TTL_SECONDS of staleness for writes made by
+    other workers; otherwise the parcels are read from the database on
+    every call. With revision the cached index must match it (see
+    OverlapIndexRegistry.get).
+    """
+    if settings.OVERLAP_INDEX_ENABLED:
+        return overlap_index.get(
+            parcel_index_key(project_id),
+            lambda: load_project_parcels(db, project_id),
+            revision,
+        )
+    return ProjectOverlapIndex(load_project_parcels(db, project_id))
+
+
 def check_gaps_in_project(
     geom_dict: Dict[str, Any],
     project_id: str,
     current_parcel_id: Optional[str],
     db: Session,
     tolerance_m2: float = 1,
-) -> Tuple[bool, Optional[float]]:
+    revision: Optional[str] = None,
+) -> Tuple[bool, Optional[Dict[str, Any]]]:
     """Check for gaps in a multi-parcel project (desmembramento).
     
-    Algorithm:
-    1. Get union of all other parcels in project
-    2. Compute symmetric difference with target geometry
-    3. If residual area > tolerance → gap detected
+    Algorithm (services.coverage):
+    1. Take the union of the project (see _project_coverage), with this parcel swapped in
+    2. Holes and thin openings of that coverage next to the parcel
+    3. Pieces above tolerance → gap detected
     
     Returns:
-        (has_gap, gap_area_m2)
+        (has_gap, { gap_area_m2, gaps: [{ kind, area_m2, perimeter_m, geometry }] })
     """
     try:
-        geom_obj = shape(geom_dict)
-        wkt = geom_obj.wkt
-        
-        # Get union of all other parcels
-        query = text("""
-            SELECT ST_AsText(ST_Union(
-                COALESCE(p.geom_official, p.geom_client_sketch)
-            )) as union_wkt
-            FROM parcel p
-            WHERE 
-                p.project_id = :project_id
-                AND (:current_parcel_id IS NULL OR p.id != :current_parcel_id)
-                AND (p.geom_client_sketch IS NOT NULL OR p.geom_official IS NOT NULL)
-        """)
-        
-        result = db.execute(query, {
-            "project_id": project_id,
-            "current_parcel_id": current_parcel_id,
-        }).first()
-        
-        if not result or not result.union_wkt:
-            return False, None  # No other parcels, no gap check needed
-        
-        # Compute symmetric difference
-        query = text("""
-            SELECT ST_Area(ST_SymDifference(
-                ST_GeomFromText(:union_wkt, 4326)::geography,
-                ST_GeomFromText(:wkt, 4326)::geography
-            )) as gap_area
-        """)
-        
-        result = db.execute(query, {
-            "union_wkt": result.union_wkt,
-            "wkt": wkt,
-        }).first()
+        index = _project_coverage(db, project_id, revision)
+        if not len(index):
+            return False, None  # No parcels, no gap check needed
         
-        if result and result.gap_area > tolerance_m2:
-            return True, result.gap_area
+        gaps = find_gaps(
+            index,
+            shape(geom_dict),
+            exclude_id=str(current_parcel_id) if current_parcel_id else None,
+            tolerance_m2=tolerance_m2,
+        )
+        if gaps:
+            return True, gap_details(gaps)
         
         return False, None
     except Exception as e:
@@ -233,22 +305,35 @@ def check_gaps_in_project(
 def calculate_metrics(geom_dict: Dict[str, Any]) -> Tuple[float, float]:
     """Calculate area (m²) and perimeter (m) from geometry.
     
+    Geodesic on the SIRGAS 2000/GRS80 ellipsoid, matching
+    ST_Area/ST_Perimeter on geography (and the calc_area_ha trigger).
+    
     Returns:
         (area_m2, perimeter_m)
     """
     try:
-        geom_obj = shape(geom_dict)
-        
-        # Using geographic coordinates (4326), approximate using Haversine
-        # For production, use PostGIS ST_Area/ST_Perimeter for accuracy
-        area_m2 = geom_obj.area * 111319.5 ** 2  # Rough approximation
-        perimeter_m = geom_obj.length * 111319.5  # Rough approximation
-        
-        return area_m2, perimeter_m
+        return geodesic_metrics(geom_dict)
     except Exception as e:
         raise SigefValidationError(f"Metric calculation failed: {str(e)}")
 
 
+def _validation_options(
+    check_sigef: bool,
+    check_neighbors: bool,
+    check_gaps: bool,
+) -> Tuple[Any, ...]:
+    """Everything besides geometry/project that changes a validation outcome."""
+    return (
+        check_sigef,
+        check_neighbors,
+        check_gaps,
+        settings.SIGEF_OVERLAP_TOLERANCE_M2,
+        settings.SIGEF_OVERLAP_MAX_RESULTS,
+        settings.GAP_TOLERANCE_M2,
+        settings.SLIVER_MAX_WIDTH_M,
+    )
+
+
 def validate_geometry_complete(
     geom_dict: Dict[str, Any],
     project_id: str,
@@ -261,30 +346,66 @@ def validate_geometry_complete(
     """Complete validation pipeline.
     
     1. Clean geometry
-    2. Check constraints (area, vertices)
-    3. Check SIGEF overlap (WARN if yes)
-    4. Check neighbor overlap (WARN if yes)
-    5. Check gaps (optional)
+    2. Return the stored result if this geometry was already validated
+       against the current project revision (validation_event)
+    3. Check constraints (area, vertices)
+    4. Check SIGEF overlap (WARN if yes)
+    5. Check neighbor overlap (WARN if yes)
+    6. Check gaps (optional)
+    7. Write one validation_event row per check
     
     Returns:
         GeometryResponse with status, warnings, metrics
     """
     warnings: List[ValidationWarning] = []
+    checks: List[Tuple[str, ValidationResult, Optional[Dict[str, Any]]]] = []
     has_overlap_alert = False
-    can_proceed = True
     result = ValidationResult.OK
+    geom_hash: Optional[str] = None
+    revision: Optional[str] = None
     
     try:
         # Step 1: Clean
-        cleaned_geom = clean_geometry(geom_dict)
+        try:
+            cleaned_geom = clean_geometry(geom_dict)
+        except SigefValidationError as e:
+            response = GeometryResponse(
+                status=ValidationResult.FAIL,
+                can_proceed=False,
+                code="GEOM_INVALID",
+                message=str(e),
+            )
+            record_validation(
+                db, project_id, parcel_id, None, None,
+                [("GEOM_INVALID", ValidationResult.FAIL, {"message": str(e)})],
+                response,
+            )
+            return response
+        
+        # Step 2: Memoized result
+        if settings.VALIDATION_LOG_ENABLED:
+            try:
+                geom_hash = geometry_hash(
+                    cleaned_geom,
+                    parcel_id,
+                    _validation_options(check_sigef, check_neighbors, check_gaps),
+                )
+                # SAVEPOINT: a failed lookup must not abort the caller's transaction
+                with db.begin_nested():
+                    revision = project_revision(db, project_id)
+                    cached = find_cached_response(db, project_id, geom_hash, revision)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                logger.warning(f"Validation memo unavailable: {e}")
+                geom_hash = revision = None
         
-        # Step 2: Calculate metrics
+        # Step 3: Metrics and constraints
         area_m2, perimeter_m = calculate_metrics(cleaned_geom)
         
-        # Step 3: Check constraints
         is_valid, error_msg = validate_geometry_constraints(area_m2, perimeter_m, cleaned_geom)
         if not is_valid:
-            return GeometryResponse(
+            response = GeometryResponse(
                 status=ValidationResult.FAIL,
                 can_proceed=False,
                 code="GEOM_INVALID",
@@ -292,24 +413,33 @@ def validate_geometry_complete(
                 area_m2=area_m2,
                 perimeter_m=perimeter_m,
             )
+            checks.append(("GEOM_INVALID", ValidationResult.FAIL, {
+                "message": response.message,
+                "area_m2": area_m2,
+                "perimeter_m": perimeter_m,
+            }))
+            record_validation(db, project_id, parcel_id, geom_hash, revision, checks, response)
+            return response
+        checks.append(("GEOM_INVALID", ValidationResult.OK, {
+            "area_m2": area_m2,
+            "perimeter_m": perimeter_m,
+        }))
         
         # Step 4: Check SIGEF
         if check_sigef:
-            has_sigef_overlap, overlap_area, owner = check_sigef_overlap(
+            has_sigef_overlap, sigef_overlaps = check_sigef_overlap(
                 cleaned_geom,
                 db,
                 settings.SIGEF_OVERLAP_TOLERANCE_M2,
             )
             if has_sigef_overlap:
-                warnings.append(ValidationWarning(
-                    type="SIGEF_OVERLAP",
-                    details={
-                        "overlap_area_m2": overlap_area,
-                        "certified_owner": owner,
-                    },
-                ))
+                warning = sigef_overlap_warning(sigef_overlaps)
+                warnings.append(warning)
+                checks.append(("SIGEF_OVERLAP", ValidationResult.WARN, warning.details))
                 has_overlap_alert = True
                 result = ValidationResult.WARN
+            else:
+                checks.append(("SIGEF_OVERLAP", ValidationResult.OK, None))
         
         # Step 5: Check neighbors
         if check_neighbors:
@@ -318,33 +448,41 @@ def validate_geometry_complete(
                 project_id,
                 parcel_id,
                 db,
+                revision=revision,
             )
             if has_neighbor_overlap:
                 warnings.append(ValidationWarning(
                     type="NEIGHBOR_OVERLAP",
                     details=neighbor_info,
                 ))
+                checks.append(("NEIGHBOR_OVERLAP", ValidationResult.WARN, neighbor_info))
                 has_overlap_alert = True
                 result = ValidationResult.WARN
+            else:
+                checks.append(("NEIGHBOR_OVERLAP", ValidationResult.OK, None))
         
         # Step 6: Check gaps (optional)
         if check_gaps:
-            has_gap, gap_area = check_gaps_in_project(
+            has_gap, gap_info = check_gaps_in_project(
                 cleaned_geom,
                 project_id,
                 parcel_id,
                 db,
                 settings.GAP_TOLERANCE_M2,
+                revision=revision,
             )
             if has_gap:
                 warnings.append(ValidationWarning(
                     type="GAP_DETECTED",
-                    details={"gap_area_m2": gap_area},
+                    details=gap_info,
                 ))
+                checks.append(("GAP_DETECTED", ValidationResult.WARN, gap_info))
                 has_overlap_alert = True
                 result = ValidationResult.WARN
+            else:
+                checks.append(("GAP_DETECTED", ValidationResult.OK, None))
         
-        return GeometryResponse(
+        response = GeometryResponse(
             status=result,
             can_proceed=True,  # Alerts don't block progression
             has_overlap_alert=has_overlap_alert,
@@ -353,6 +491,10 @@ def validate_geometry_complete(
             warnings=warnings,
             message="OK" if result == ValidationResult.OK else "Validation passed with warnings",
         )
+        
+        # Step 7: Audit (and memo for the next identical request)
+        record_validation(db, project_id, parcel_id, geom_hash, revision, checks, response)
+        return response
     
     except SigefValidationError as e:
         return GeometryResponse(
@@ -368,3 +510,359 @@ def validate_geometry_complete(
             code="VALIDATION_ERROR",
             message=f"Unexpected error: {str(e)}",
         )
+
+
+def _batch_input_cte() -> str:
+    """CTE that parses every candidate geometry once, keyed by its position."""
+    return """
+        WITH input AS (
+            SELECT
+                t.ord,
+                t.parcel_id,
+                ST_GeomFromText(t.wkt, 4326) AS geom
+            FROM unnest(
+                CAST(:wkts AS text[]),
+                CAST(:parcel_ids AS uuid[])
+            ) WITH ORDINALITY AS t(wkt, parcel_id, ord)
+        )
+    """
+
+
+def check_sigef_overlap_batch(
+    wkts: List[str],
+    db: Session,
+    tolerance_m2: float = 0,
+    max_results: Optional[int] = None,
+) -> Dict[int, List[Dict[str, Any]]]:
+    """Check SIGEF overlap for many geometries in a single statement.
+    
+    Returns:
+        { input_index: [{ cert_id, certified_owner, overlap_area_m2 }] } for
+        inputs with overlaps above the tolerance, each list ranked by area
+    """
+    try:
+        query = text(_batch_input_cte() + """
+            , hits AS (
+                SELECT
+                    i.ord,
+                    s.cert_id,
+                    s.owner,
+                    ST_Area(ST_Intersection(i.geom, s.geom)::geography) AS overlap_area
+                FROM input i
+                JOIN sigef_certified s
+                    ON s.geom && i.geom
+                    AND ST_Intersects(i.geom, s.geom)
+            ),
+            ranked AS (
+                SELECT
+                    h.*,
+                    ROW_NUMBER() OVER (PARTITION BY h.ord ORDER BY h.overlap_area DESC) AS rank
+                FROM hits h
+                WHERE h.overlap_area > :tolerance
+            )
+            SELECT ord, cert_id, owner, overlap_area
+            FROM ranked
+            WHERE rank <= :max_results
+            ORDER BY ord, rank
+        """)
+        
+        rows = db.execute(query, {
+            "wkts": wkts,
+            "parcel_ids": [None] * len(wkts),
+            "tolerance": tolerance_m2,
+            "max_results": max_results or settings.SIGEF_OVERLAP_MAX_RESULTS,
+        }).all()
+        
+        hits: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            hits.setdefault(row.ord - 1, []).append({
+                "cert_id": row.cert_id,
+                "certified_owner": row.owner,
+                "overlap_area_m2": row.overlap_area,
+            })
+        return hits
+    except Exception as e:
+        raise SigefValidationError(f"SIGEF overlap check failed: {str(e)}")
+
+
+def check_neighbor_overlap_batch(
+    wkts: List[str],
+    parcel_ids: List[Optional[str]],
+    project_id: str,
+    db: Session,
+) -> Dict[int, Dict[str, Any]]:
+    """Check neighbor overlap for many geometries in a single statement.
+    
+    Returns:
+        { input_index: { neighbor_parcel_id, neighbor_name, overlap_area_m2 } }
+    """
+    try:
+        query = text(_batch_input_cte() + """
+            SELECT DISTINCT ON (i.ord)
+                i.ord,
+                p.id,
+                p.name,
+                ST_Area(ST_Intersection(
+                    i.geom,
+                    COALESCE(p.geom_official, p.geom_client_sketch)
+                )::geography) AS overlap_area
+            FROM input i
+            JOIN parcel p ON
+                p.project_id = :project_id
+                AND (i.parcel_id IS NULL OR p.id != i.parcel_id)
+                AND (p.geom_client_sketch IS NOT NULL OR p.geom_official IS NOT NULL)
+                AND ST_Intersects(i.geom, COALESCE(p.geom_official, p.geom_client_sketch))
+            ORDER BY i.ord, overlap_area DESC
+        """)
+        
+        rows = db.execute(query, {
+            "wkts": wkts,
+            "parcel_ids": parcel_ids,
+            "project_id": project_id,
+        }).all()
+        
+        return {
+            row.ord - 1: {
+                "neighbor_parcel_id": str(row.id),
+                "neighbor_name": row.name,
+                "overlap_area_m2": row.overlap_area,
+            }
+            for row in rows
+            if row.overlap_area > 0
+        }
+    except Exception as e:
+        raise SigefValidationError(f"Neighbor overlap check failed: {str(e)}")
+
+
+def check_gaps_in_project_batch(
+    geom_dicts: List[Dict[str, Any]],
+    parcel_ids: List[Optional[str]],
+    project_id: str,
+    db: Session,
+    tolerance_m2: float = 1,
+) -> Dict[int, Dict[str, Any]]:
+    """Check gaps for many geometries against the project coverage.
+    
+    The project is loaded once (_project_coverage); each geometry is placed
+    in the coverage on its own (batch items are not checked against each other).
+    
+    Returns:
+        { input_index: gap details } for inputs with gaps above the tolerance
+    """
+    try:
+        index = _project_coverage(db, project_id)
+        if not len(index):
+            return {}
+        
+        hits: Dict[int, Dict[str, Any]] = {}
+        for pos, (geom_dict, parcel_id) in enumerate(zip(geom_dicts, parcel_ids)):
+            gaps = find_gaps(index, shape(geom_dict), parcel_id, tolerance_m2)
+            if gaps:
+                hits[pos] = gap_details(gaps)
+        return hits
+    except Exception as e:
+        raise SigefValidationError(f"Gap check failed: {str(e)}")
+
+
+def validate_geometries_batch(
+    geom_dicts: List[Dict[str, Any]],
+    project_id: str,
+    parcel_ids: Optional[List[Optional[str]]],
+    db: Session,
+    check_sigef: bool = True,
+    check_neighbors: bool = True,
+    check_gaps: bool = True,
+) -> List[GeometryResponse]:
+    """Batch version of validate_geometry_complete.
+    
+    Cleaning, metrics and constraints run in-process (metrics vectorized
+    over the whole batch); the SIGEF and neighbor checks then run as one
+    set-based statement each for every geometry that passed, instead
+    of one round trip per geometry and check.
+    
+    Like the single path, every item is audited in validation_event and
+    memoized; the memo lookup is one query and the audit rows go in one
+    SAVEPOINT for the whole batch. The memo key carries a "batch" marker
+    because neighbor overlaps are reported differently here (largest
+    overlap per geometry), so cached single and batch responses never mix.
+    
+    Returns:
+        One GeometryResponse per input, in input order
+    """
+    if parcel_ids is None:
+        parcel_ids = [None] * len(geom_dicts)
+    if len(parcel_ids) != len(geom_dicts):
+        raise ValueError("parcel_ids must have the same length as geom_dicts")
+    
+    responses: List[Optional[GeometryResponse]] = [None] * len(geom_dicts)
+    cleaned: Dict[int, Dict[str, Any]] = {}
+    metrics: Dict[int, Tuple[float, float]] = {}
+    pending: List[int] = []
+    checks: Dict[int, List[Tuple[str, ValidationResult, Optional[Dict[str, Any]]]]] = {}
+    hashes: Dict[int, str] = {}
+    revision: Optional[str] = None
+    
+    def audit(indexes: List[int]) -> None:
+        record_validations(db, project_id, revision, [
+            (parcel_ids[idx], hashes.get(idx), checks[idx], responses[idx])
+            for idx in indexes
+        ])
+    
+    # Step 1: clean (no database access)
+    for idx, geom_dict in enumerate(geom_dicts):
+        try:
+            cleaned[idx] = clean_geometry(geom_dict)
+        except SigefValidationError as e:
+            responses[idx] = GeometryResponse(
+                status=ValidationResult.FAIL,
+                can_proceed=False,
+                code="GEOM_INVALID",
+                message=str(e),
+            )
+            # Audit-only: no hash, never served from the memo
+            checks[idx] = [("GEOM_INVALID", ValidationResult.FAIL, {"message": str(e)})]
+    
+    # Memoized results, one lookup for the whole batch
+    if settings.VALIDATION_LOG_ENABLED and cleaned:
+        try:
+            options = _validation_options(check_sigef, check_neighbors, check_gaps) + ("batch",)
+            for idx, geom in cleaned.items():
+                hashes[idx] = geometry_hash(geom, parcel_ids[idx], options)
+            # SAVEPOINT: a failed lookup must not abort the caller's transaction
+            with db.begin_nested():
+                revision = project_revision(db, project_id)
+                cached = find_cached_responses(db, project_id, list(hashes.values()), revision)
+            for idx in list(cleaned.keys()):
+                if hashes[idx] in cached:
+                    responses[idx] = cached[hashes[idx]]
+                    del cleaned[idx]
+        except Exception as e:
+            logger.warning(f"Validation memo unavailable: {e}")
+            hashes = {}
+            revision = None
+    
+    # Steps 2-3: metrics for every cleaned geometry in one vectorized call, then constraints
+    cleaned_idx = list(cleaned.keys())
+    if cleaned_idx:
+        areas, perimeters = geodesic_area_perimeter([cleaned[idx] for idx in cleaned_idx])
+        for idx, area_m2, perimeter_m in zip(cleaned_idx, areas.tolist(), perimeters.tolist()):
+            is_valid, error_msg = validate_geometry_constraints(area_m2, perimeter_m, cleaned[idx])
+            if not is_valid:
+                responses[idx] = GeometryResponse(
+                    status=ValidationResult.FAIL,
+                    can_proceed=False,
+                    code="GEOM_INVALID",
+                    message=error_msg or "Geometry is invalid",
+                    area_m2=area_m2,
+                    perimeter_m=perimeter_m,
+                )
+                checks[idx] = [("GEOM_INVALID", ValidationResult.FAIL, {
+                    "message": responses[idx].message,
+                    "area_m2": area_m2,
+                    "perimeter_m": perimeter_m,
+                })]
+                continue
+            metrics[idx] = (area_m2, perimeter_m)
+            checks[idx] = [("GEOM_INVALID", ValidationResult.OK, {
+                "area_m2": area_m2,
+                "perimeter_m": perimeter_m,
+            })]
+            pending.append(idx)
+    
+    if pending:
+        wkts = [shape(cleaned[idx]).wkt for idx in pending]
+        pending_parcel_ids = [
+            str(parcel_ids[idx]) if parcel_ids[idx] else None for idx in pending
+        ]
+        warnings: Dict[int, List[ValidationWarning]] = {idx: [] for idx in pending}
+        
+        try:
+            # Steps 4-6: one statement per check for the whole batch
+            if check_sigef:
+                sigef_hits = check_sigef_overlap_batch(
+                    wkts,
+                    db,
+                    settings.SIGEF_OVERLAP_TOLERANCE_M2,
+                )
+                for pos, idx in enumerate(pending):
+                    if pos in sigef_hits:
+                        warning = sigef_overlap_warning(sigef_hits[pos])
+                        warnings[idx].append(warning)
+                        checks[idx].append(("SIGEF_OVERLAP", ValidationResult.WARN, warning.details))
+                    else:
+                        checks[idx].append(("SIGEF_OVERLAP", ValidationResult.OK, None))
+            
+            if check_neighbors:
+                neighbor_hits = check_neighbor_overlap_batch(
+                    wkts,
+                    pending_parcel_ids,
+                    project_id,
+                    db,
+                )
+                for pos, idx in enumerate(pending):
+                    if pos in neighbor_hits:
+                        warnings[idx].append(ValidationWarning(
+                            type="NEIGHBOR_OVERLAP",
+                            details=neighbor_hits[pos],
+                        ))
+                        checks[idx].append(("NEIGHBOR_OVERLAP", ValidationResult.WARN, neighbor_hits[pos]))
+                    else:
+                        checks[idx].append(("NEIGHBOR_OVERLAP", ValidationResult.OK, None))
+            
+            if check_gaps:
+                gap_hits = check_gaps_in_project_batch(
+                    [cleaned[idx] for idx in pending],
+                    pending_parcel_ids,
+                    project_id,
+                    db,
+                    settings.GAP_TOLERANCE_M2,
+                )
+                for pos, idx in enumerate(pending):
+                    if pos in gap_hits:
+                        warnings[idx].append(ValidationWarning(
+                            type="GAP_DETECTED",
+                            details=gap_hits[pos],
+                        ))
+                        checks[idx].append(("GAP_DETECTED", ValidationResult.WARN, gap_hits[pos]))
+                    else:
+                        checks[idx].append(("GAP_DETECTED", ValidationResult.OK, None))
+        except SigefValidationError as e:
+            for idx in pending:
+                responses[idx] = GeometryResponse(
+                    status=ValidationResult.FAIL,
+                    can_proceed=False,
+                    code="GEOM_INVALID",
+                    message=str(e),
+                )
+            # As in the single path, failed checks are not audited
+            failed = set(pending)
+            audit([idx for idx in checks if idx not in failed])
+            return responses
+        except Exception as e:
+            for idx in pending:
+                responses[idx] = GeometryResponse(
+                    status=ValidationResult.FAIL,
+                    can_proceed=False,
+                    code="VALIDATION_ERROR",
+                    message=f"Unexpected error: {str(e)}",
+                )
+            failed = set(pending)
+            audit([idx for idx in checks if idx not in failed])
+            return responses
+        
+        for idx in pending:
+            area_m2, perimeter_m = metrics[idx]
+            result = ValidationResult.WARN if warnings[idx] else ValidationResult.OK
+            responses[idx] = GeometryResponse(
+                status=result,
+                can_proceed=True,  # Alerts don't block progression
+                has_overlap_alert=bool(warnings[idx]),
+                area_m2=area_m2,
+                perimeter_m=perimeter_m,
+                warnings=warnings[idx],
+                message="OK" if result == ValidationResult.OK else "Validation passed with warnings",
+            )
+    
+    # Audit (and memo for the next identical batch), one SAVEPOINT
+    audit(list(checks.keys()))
+    return responses
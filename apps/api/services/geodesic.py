@@ -0,0 +1,73 @@
+"""Geodesic area/perimeter on the SIRGAS 2000 (GRS80) ellipsoid.
+
+In-process replacement for ST_Area(geom::geography) / ST_Perimeter(geom::geography).
+Each ring goes through pyproj's Geod (GeographicLib, Karney's algorithm),
+the same ellipsoidal computation PostGIS uses for geography, so results
+agree to well under a millimetre (m, m²); the vertex loop runs in C.
+"""
+
+from typing import Any, List, Sequence, Tuple
+
+import numpy as np
+from pyproj import Geod
+from shapely.geometry import shape
+from shapely.geometry.base import BaseGeometry
+
+# GRS80 ellipsoid (SIRGAS 2000, EPSG:4674); WGS84 differs by < 0.1 mm
+GRS80_A = 6378137.0
+GRS80_F = 1 / 298.257222101
+
+GEOD = Geod(a=GRS80_A, f=GRS80_F)
+
+
+def _polygon_rings(geom: BaseGeometry) -> List[Tuple[np.ndarray, bool]]:
+    """Flatten a Polygon/MultiPolygon into (coords, is_hole) rings."""
+    if geom.geom_type == "Polygon":
+        polygons = [geom]
+    elif geom.geom_type == "MultiPolygon":
+        polygons = list(geom.geoms)
+    else:
+        raise ValueError(f"Invalid geometry type: {geom.geom_type}. Expected Polygon or MultiPolygon")
+
+    rings = []
+    for polygon in polygons:
+        if polygon.is_empty:
+            continue
+        rings.append((np.asarray(polygon.exterior.coords)[:, :2], False))
+        for interior in polygon.interiors:
+            rings.append((np.asarray(interior.coords)[:, :2], True))
+    return rings
+
+
+def geodesic_area_perimeter(
+    geoms: Sequence[Any],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Ellipsoidal area (m²) and perimeter (m) for many polygons at once.
+
+    Args:
+        geoms: Shapely geometries or GeoJSON dicts (Polygon/MultiPolygon, lon/lat)
+
+    Returns:
+        (areas_m2, perimeters_m) arrays aligned with geoms. Holes are
+        subtracted from the area and counted in the perimeter, as in
+        ST_Area/ST_Perimeter on geography.
+    """
+    areas = np.zeros(len(geoms))
+    perimeters = np.zeros(len(geoms))
+
+    for gi, geom in enumerate(geoms):
+        geom_obj = geom if isinstance(geom, BaseGeometry) else shape(geom)
+        for ring, is_hole in _polygon_rings(geom_obj):
+            if len(ring) < 2:
+                continue
+            area, perimeter = GEOD.polygon_area_perimeter(ring[:, 0], ring[:, 1])
+            areas[gi] += -abs(area) if is_hole else abs(area)
+            perimeters[gi] += perimeter
+
+    return areas, perimeters
+
+
+def geodesic_metrics(geom: Any) -> Tuple[float, float]:
+    """Ellipsoidal (area_m2, perimeter_m) of a single Polygon/MultiPolygon."""
+    areas, perimeters = geodesic_area_perimeter([geom])
+    return float(areas[0]), float(perimeters[0])
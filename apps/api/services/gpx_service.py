@@ -1,12 +1,29 @@
 """
 GPX Parser - Parse GPX (GPS Exchange Format) to GeoJSON.
 
-Uses gpxpy library to parse GPX files.
+Streams the file with xml.etree iterparse: trkpt/rtept coordinates go
+straight into flat float buffers and are turned into NumPy arrays once per
+segment, so a 1 Hz GNSS log (80k+ points per track) never becomes a tree of
+point objects. Tracks and routes can be simplified (Douglas-Peucker or
+Visvalingam-Whyatt, tolerance in meters) before being written out.
 """
 
-import gpxpy
-import gpxpy.gpx
-from typing import Dict, Any
+import heapq
+import math
+import xml.etree.ElementTree as ET
+from array import array
+from typing import Dict, Any, BinaryIO, Iterator, List, Optional, Union
+
+import numpy as np
+
+from services.import_stream import CountingReader, Feature, as_binary_file, local_name
+
+SIMPLIFY_METHODS = ("douglas-peucker", "visvalingam")
+COORD_PRECISION = 7  # ~1 cm in lon/lat
+ELEVATION_PRECISION = 2
+EARTH_RADIUS_M = 6371008.8
+
+_POINT_TAGS = ("wpt", "trkpt", "rtept")
 
 
 def parse_gpx_to_geojson(gpx_content: bytes) -> Dict[str, Any]:
@@ -15,8 +32,8 @@ def parse_gpx_to_geojson(gpx_content: bytes) -> Dict[str, Any]:
 
     Extracts:
     - Waypoints as Point features
-    - Tracks as LineString features
     - Track segments as separate LineString features
+    - Routes as LineString features
 
     Args:
         gpx_content: GPX file content
@@ -28,89 +45,238 @@ def parse_gpx_to_geojson(gpx_content: bytes) -> Dict[str, Any]:
         ValueError: If GPX is invalid or parsing fails
     """
     try:
-        gpx_string = gpx_content.decode('utf-8')
-        gpx = gpxpy.parse(gpx_string)
+        return {
+            "type": "FeatureCollection",
+            "features": list(iter_gpx_features(gpx_content)),
+        }
+    except Exception as e:
+        raise ValueError(f"Erro ao processar GPX: {str(e)}")
+
+
+def iter_gpx_features(
+    source: Union[bytes, BinaryIO],
+    max_bytes: Optional[int] = None,
+    tolerance_m: Optional[float] = None,
+    method: str = "douglas-peucker",
+) -> Iterator[Feature]:
+    """
+    Yield GeoJSON features from a GPX file, in document order.
+
+    Args:
+        source: GPX content or a seekable binary file
+        max_bytes: Limit on GPX bytes read
+        tolerance_m: Simplify tracks/routes with this tolerance (meters);
+            None keeps every point
+        method: "douglas-peucker" (max distance from the simplified line)
+            or "visvalingam" (drops points whose triangle area is below
+            tolerance_m²)
+
+    Raises:
+        ValueError: If GPX is invalid or has no waypoints, tracks or routes
+        ImportLimitExceeded: If more than max_bytes are read
+    """
+    if method not in SIMPLIFY_METHODS:
+        raise ValueError(f"Método de simplificação inválido: {method}")
+
+    count = 0
+    try:
+        for feature in _iter_gpx(CountingReader(as_binary_file(source), max_bytes), tolerance_m, method):
+            count += 1
+            yield feature
+    except ET.ParseError as e:
+        raise ValueError(f"GPX inválido: {e}")
+    except TypeError:
+        raise ValueError("GPX inválido: ponto sem lat/lon")
+
+    if not count:
+        raise ValueError("GPX não contém waypoints, tracks ou routes válidos")
+
+
+def _child_text(elem: ET.Element, name: str) -> Optional[str]:
+    for child in elem:
+        if local_name(child.tag) == name:
+            return child.text
+    return None
 
-        features = []
 
-        # Extract waypoints
-        for waypoint in gpx.waypoints:
-            feature = {
+def _iter_gpx(stream: BinaryIO, tolerance_m: Optional[float], method: str) -> Iterator[Feature]:
+    stack: List[ET.Element] = []
+    info = {"name": "", "description": ""}  # current trk/rte
+    lon, lat, ele = array("d"), array("d"), array("d")
+
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = local_name(elem.tag)
+        if event == "start":
+            stack.append(elem)
+            if tag in ("trk", "rte"):
+                info = {"name": "", "description": ""}
+            if tag in ("trkseg", "rte"):
+                lon, lat, ele = array("d"), array("d"), array("d")
+            continue
+
+        stack.pop()
+        parent = local_name(stack[-1].tag) if stack else None
+
+        if tag in ("trkpt", "rtept"):
+            lon.append(float(elem.get("lon")))
+            lat.append(float(elem.get("lat")))
+            elevation = _child_text(elem, "ele")
+            ele.append(float(elevation) if elevation else math.nan)
+
+        elif tag in ("name", "desc") and parent in ("trk", "rte"):
+            info["name" if tag == "name" else "description"] = (elem.text or "").strip()
+
+        elif tag == "wpt":
+            elevation = _child_text(elem, "ele")
+            yield {
                 "type": "Feature",
                 "geometry": {
                     "type": "Point",
                     "coordinates": [
-                        waypoint.longitude,
-                        waypoint.latitude,
-                        waypoint.elevation if waypoint.elevation else 0.0
+                        round(float(elem.get("lon")), COORD_PRECISION),
+                        round(float(elem.get("lat")), COORD_PRECISION),
+                        round(float(elevation), ELEVATION_PRECISION) if elevation else 0.0
                     ]
                 },
                 "properties": {
-                    "name": waypoint.name or "",
-                    "description": waypoint.description or "",
+                    "name": (_child_text(elem, "name") or "").strip(),
+                    "description": (_child_text(elem, "desc") or "").strip(),
                     "type": "waypoint"
                 }
             }
-            features.append(feature)
-
-        # Extract tracks
-        for track in gpx.tracks:
-            for segment in track.segments:
-                if len(segment.points) < 2:
-                    continue
-
-                coordinates = [
-                    [point.longitude, point.latitude, point.elevation if point.elevation else 0.0]
-                    for point in segment.points
-                ]
-
-                feature = {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "LineString",
-                        "coordinates": coordinates
-                    },
-                    "properties": {
-                        "name": track.name or "",
-                        "description": track.description or "",
-                        "type": "track"
-                    }
-                }
-                features.append(feature)
 
-        # Extract routes
-        for route in gpx.routes:
-            if len(route.points) < 2:
-                continue
+        elif tag in ("trkseg", "rte") and len(lon) >= 2:
+            yield _line_feature(
+                lon, lat, ele, info, "track" if tag == "trkseg" else "route", tolerance_m, method
+            )
 
-            coordinates = [
-                [point.longitude, point.latitude, point.elevation if point.elevation else 0.0]
-                for point in route.points
-            ]
+        # Point children stay until the point itself is read; everything
+        # else is detached as soon as it closes.
+        if stack and parent not in _POINT_TAGS:
+            stack[-1].remove(elem)
 
-            feature = {
-                "type": "Feature",
-                "geometry": {
-                    "type": "LineString",
-                    "coordinates": coordinates
-                },
-                "properties": {
-                    "name": route.name or "",
-                    "description": route.description or "",
-                    "type": "route"
-                }
-            }
-            features.append(feature)
 
-        if not features:
-            raise ValueError("GPX não contém waypoints, tracks ou routes válidos")
+def _line_feature(
+    lon: array, lat: array, ele: array, info: Dict[str, str], kind: str,
+    tolerance_m: Optional[float], method: str,
+) -> Feature:
+    """LineString feature for one track segment or route."""
+    lon_arr = np.frombuffer(lon, dtype=np.float64)
+    lat_arr = np.frombuffer(lat, dtype=np.float64)
+    ele_arr = np.frombuffer(ele, dtype=np.float64)
+    n_points = len(lon_arr)
 
-        geojson = {
-            "type": "FeatureCollection",
-            "features": features
-        }
+    if tolerance_m:
+        xy = _local_meters(lon_arr, lat_arr)
+        if method == "visvalingam":
+            keep = visvalingam_whyatt(xy, tolerance_m * tolerance_m)
+        else:
+            keep = douglas_peucker(xy, tolerance_m)
+        lon_arr, lat_arr, ele_arr = lon_arr[keep], lat_arr[keep], ele_arr[keep]
 
-        return geojson
+    columns = [np.round(lon_arr, COORD_PRECISION), np.round(lat_arr, COORD_PRECISION)]
+    # Elevation only when the segment has it (missing values as 0.0)
+    if not np.isnan(ele_arr).all():
+        columns.append(np.round(np.nan_to_num(ele_arr, nan=0.0), ELEVATION_PRECISION))
 
-    except Exception as e:
-        raise ValueError(f"Erro ao processar GPX: {str(e)}")
+    properties = {
+        "name": info["name"],
+        "description": info["description"],
+        "type": kind,
+    }
+    if tolerance_m:
+        properties["original_points"] = n_points
+
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "LineString",
+            "coordinates": np.column_stack(columns).tolist()
+        },
+        "properties": properties
+    }
+
+
+def _local_meters(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """Equirectangular projection around the segment's mean latitude (meters)."""
+    k = math.radians(1) * EARTH_RADIUS_M
+    return np.column_stack((lon * k * math.cos(math.radians(float(lat.mean()))), lat * k))
+
+
+def douglas_peucker(xy: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Douglas-Peucker simplification (iterative, vectorized per span).
+
+    Returns:
+        Boolean mask of the points to keep (first and last always kept)
+    """
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    spans = [(0, n - 1)]
+    while spans:
+        start, end = spans.pop()
+        if end - start < 2:
+            continue
+        a = xy[start]
+        d = xy[end] - a
+        rel = xy[start + 1:end] - a
+        norm = math.hypot(d[0], d[1])
+        if norm == 0.0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(d[0] * rel[:, 1] - d[1] * rel[:, 0]) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            spans.append((start, split))
+            spans.append((split, end))
+    return keep
+
+
+def visvalingam_whyatt(xy: np.ndarray, min_area: float) -> np.ndarray:
+    """
+    Visvalingam-Whyatt simplification: repeatedly drop the point whose
+    triangle with its neighbours has the smallest area, while below
+    min_area. Areas never decrease as neighbours are removed.
+
+    Returns:
+        Boolean mask of the points to keep (first and last always kept)
+    """
+    n = len(xy)
+    if n < 3:
+        return np.ones(n, dtype=bool)
+
+    xs, ys = xy[:, 0].tolist(), xy[:, 1].tolist()
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+
+    def area(i: int) -> float:
+        p, q = prev[i], nxt[i]
+        return abs((xs[p] - xs[i]) * (ys[q] - ys[i]) - (xs[q] - xs[i]) * (ys[p] - ys[i])) / 2.0
+
+    # Initial areas, vectorized
+    initial = np.abs(
+        (xy[:-2, 0] - xy[1:-1, 0]) * (xy[2:, 1] - xy[1:-1, 1])
+        - (xy[2:, 0] - xy[1:-1, 0]) * (xy[:-2, 1] - xy[1:-1, 1])
+    ) / 2.0
+    current = [0.0] + initial.tolist() + [0.0]
+    keep = [True] * n
+    heap = [(current[i], i) for i in range(1, n - 1)]
+    heapq.heapify(heap)
+
+    while heap:
+        value, i = heapq.heappop(heap)
+        if not keep[i] or value != current[i]:
+            continue  # Stale entry
+        if value >= min_area:
+            break
+        keep[i] = False
+        p, q = prev[i], nxt[i]
+        nxt[p], prev[q] = q, p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                current[j] = max(area(j), value)
+                heapq.heappush(heap, (current[j], j))
+    return np.array(keep, dtype=bool)
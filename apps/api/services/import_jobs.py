@@ -0,0 +1,457 @@
+"""
+Background import jobs (import_job table).
+
+For uploads too large to parse within one request (reverse proxies cut
+requests at ~60 s), /api/import-export/jobs/* spools the file to
+IMPORT_ASYNC_DIR, inserts a QUEUED import_job row and answers with its id.
+ImportJobRunner, started with the app, claims QUEUED rows and parses them
+in the import process pool (services.import_pool). While a job runs, the
+worker writes its counters (features, bytes read) to a small progress file
+that the runner copies to the row; the result body stays next to the
+upload until IMPORT_ASYNC_TTL_HOURS.
+
+The table is the queue: every API process runs a runner, a claim is a
+conditional UPDATE (QUEUED -> RUNNING), and jobs interrupted by a graceful
+shutdown go back to QUEUED. Each claim gets its own result path (and so its
+own cancel and progress files): a worker of an interrupted attempt that is
+still stopping never shares files with the next one. Only the API processes
+touch the database.
+"""
+
+import asyncio
+import glob
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models import ImportJob
+from services.import_pool import (
+    ImportCancelled,
+    ImportPool,
+    ImportQueueFull,
+    ImportTimeout,
+    import_pool,
+    request_cancel,
+)
+from services.import_stream import ImportLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_S = 2.0  # Jobs queued by other API processes
+PROGRESS_INTERVAL_S = 1.0  # Progress file writes / row updates per running job
+CLEANUP_INTERVAL_S = 300.0
+STALE_AFTER_S = 120.0  # RUNNING without a progress update this long: its API process died
+
+ACTIVE_STATUSES = ("QUEUED", "RUNNING")
+FINISHED_STATUSES = ("DONE", "FAILED", "CANCELLED")
+
+
+def _session() -> AsyncSession:
+    # Imported on use: the engines need the SQLAlchemy database configured
+    # (DATABASE_URL), which the Supabase endpoints do not.
+    from database import AsyncSessionLocal
+
+    return AsyncSessionLocal()
+
+
+def _remove(*paths: str) -> None:
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def progress_path_for(result_path: str) -> str:
+    return result_path + ".progress"
+
+
+def _attempt_result_path(directory: str, job_id: UUID, output: str) -> str:
+    """Result body of one run of a job: {job_id}-{attempt}.{geojson|ndjson}."""
+    extension = "ndjson" if output == "ndjson" else "geojson"
+    return os.path.join(directory, f"{job_id}-{uuid4().hex[:12]}.{extension}")
+
+
+def _attempt_files(job: ImportJob) -> List[str]:
+    """Result, cancel and progress files of every run of a job."""
+    return glob.glob(os.path.join(glob.escape(os.path.dirname(job.result_path)), f"{job.id}-*"))
+
+
+async def check_capacity(incoming_bytes: int = 0) -> None:
+    """
+    Raise ImportQueueFull when the active jobs (all API processes) reach
+    IMPORT_ASYNC_MAX_QUEUED, or their spooled uploads plus incoming_bytes
+    exceed IMPORT_ASYNC_MAX_QUEUED_MB.
+
+    Checked before spooling (so a full queue costs no disk) and again with
+    the upload size once it is known.
+    """
+    async with _session() as db:
+        row = (await db.execute(
+            select(func.count(), func.coalesce(func.sum(ImportJob.bytes_total), 0))
+            .where(ImportJob.status.in_(ACTIVE_STATUSES))
+        )).one()
+    jobs, queued_bytes = row[0], int(row[1])
+    if jobs >= settings.IMPORT_ASYNC_MAX_QUEUED or (
+        queued_bytes + incoming_bytes > settings.IMPORT_ASYNC_MAX_QUEUED_MB * 1024 * 1024
+    ):
+        raise ImportQueueFull("Fila de importações cheia, tente novamente mais tarde")
+
+
+async def create_job(
+    kind: str,
+    src_path: str,
+    filename: Optional[str],
+    output: str,
+    options: Dict[str, Any],
+    user_id: Optional[str] = None,
+) -> ImportJob:
+    """Insert a QUEUED job for a spooled upload (in IMPORT_ASYNC_DIR)."""
+    job_id = uuid4()
+    job = ImportJob(
+        id=job_id,
+        user_id=user_id,
+        kind=kind,
+        status="QUEUED",
+        filename=(filename or "")[:255] or None,
+        output=output,
+        options=options,
+        src_path=src_path,
+        result_path=_attempt_result_path(os.path.dirname(src_path), job_id, output),
+        bytes_total=os.path.getsize(src_path),
+        bytes_read=0,
+        features=0,
+    )
+    async with _session() as db:
+        db.add(job)
+        await db.commit()
+    import_job_runner.wake()
+    return job
+
+
+async def get_job(job_id: UUID) -> Optional[ImportJob]:
+    async with _session() as db:
+        return await db.get(ImportJob, job_id)
+
+
+def job_status(job: ImportJob) -> Dict[str, Any]:
+    """Progress of a job (features processed, bytes read of the upload)."""
+    if job.status == "DONE":
+        progress = 1.0
+    elif job.bytes_total:
+        progress = round(min(job.bytes_read or 0, job.bytes_total) / job.bytes_total, 3)
+    else:
+        progress = 0.0
+    return {
+        "id": str(job.id),
+        "kind": job.kind,
+        "status": job.status,
+        "filename": job.filename,
+        "format": job.output,
+        "features": job.features or 0,
+        "bytes_read": job.bytes_read or 0,
+        "bytes_total": job.bytes_total,
+        "progress": progress,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+async def cancel_job(job: ImportJob) -> ImportJob:
+    """
+    Cancel an active job.
+
+    A QUEUED job is cancelled right away; a RUNNING one is signalled
+    through its cancel file (seen by the worker whichever API process
+    runs it) and becomes CANCELLED when the worker stops.
+    """
+    async with _session() as db:
+        result = await db.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job.id, ImportJob.status == "QUEUED")
+            .values(status="CANCELLED", finished_at=datetime.utcnow())
+        )
+        await db.commit()
+        if result.rowcount:
+            _remove(job.src_path)
+        job = await db.get(ImportJob, job.id, populate_existing=True)
+    if job.status == "RUNNING":
+        request_cancel(job.result_path)
+    return job
+
+
+async def delete_job(job: ImportJob) -> None:
+    """Remove a finished job and its files."""
+    _remove(job.src_path, *_attempt_files(job))
+    async with _session() as db:
+        await db.execute(delete(ImportJob).where(ImportJob.id == job.id))
+        await db.commit()
+
+
+class JobProgress:
+    """
+    progress callback for parse_to_file, run in the pool process.
+
+    Picklable (only a path travels to the worker). Writes "features
+    bytes_read" to the job's progress file at most once per
+    PROGRESS_INTERVAL_S; the runner copies it to the row.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._next_write = 0.0
+
+    def __call__(self, features: int, bytes_read: int) -> None:
+        now = time.monotonic()
+        if now < self._next_write:
+            return
+        self._next_write = now + PROGRESS_INTERVAL_S
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(f"{features} {bytes_read}")
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass  # Progress is informative: never fail the parse over it
+
+
+def _read_progress(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        with open(path) as f:
+            features, bytes_read = f.read().split()
+        return int(features), int(bytes_read)
+    except (OSError, ValueError):
+        return None
+
+
+class ImportJobRunner:
+    """Claims QUEUED jobs while the pool has idle workers and runs them."""
+
+    def __init__(self, pool: ImportPool):
+        self.pool = pool
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._running: Dict[UUID, asyncio.Task] = {}
+
+    def start(self) -> None:
+        try:
+            import database  # noqa: F401 (engines are created on import)
+        except Exception as e:
+            logger.warning(f"Import jobs disabled (database unavailable): {e}")
+            return
+        os.makedirs(settings.IMPORT_ASYNC_DIR, exist_ok=True)
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    def wake(self) -> None:
+        """A job was queued by this process: dispatch now, not at the next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def stop(self) -> None:
+        """Stop dispatching; running jobs are cancelled and queued again."""
+        job_ids = list(self._running)
+        tasks = list(self._running.values())
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._wake = None
+        if job_ids:
+            async with _session() as db:
+                await db.execute(
+                    update(ImportJob)
+                    .where(ImportJob.id.in_(job_ids), ImportJob.status == "RUNNING")
+                    .values(status="QUEUED", started_at=None, features=0, bytes_read=0)
+                )
+                await db.commit()
+
+    async def _loop(self) -> None:
+        next_cleanup = 0.0
+        while True:
+            try:
+                await self._dispatch()
+                if time.monotonic() >= next_cleanup:
+                    next_cleanup = time.monotonic() + CLEANUP_INTERVAL_S
+                    await self._cleanup()
+            except Exception:
+                logger.exception("Import jobs: dispatch failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL_S)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _dispatch(self) -> None:
+        # Jobs only take idle workers: the pool's wait queue stays free for
+        # the synchronous /import/* endpoints.
+        while len(self._running) < self.pool.workers and self.pool.has_idle_worker():
+            job = await self._claim()
+            if job is None:
+                return
+            task = asyncio.create_task(self._run(job))
+            self._running[job.id] = task
+            task.add_done_callback(lambda _, job_id=job.id: self._done(job_id))
+
+    def _done(self, job_id: UUID) -> None:
+        self._running.pop(job_id, None)
+        self.wake()
+
+    async def _claim(self) -> Optional[ImportJob]:
+        """Oldest QUEUED job, moved to RUNNING (None if there is none)."""
+        async with _session() as db:
+            while True:
+                job = await db.scalar(
+                    select(ImportJob)
+                    .where(ImportJob.status == "QUEUED")
+                    .order_by(ImportJob.created_at)
+                    .limit(1)
+                )
+                if job is None:
+                    return None
+                # A new attempt writes to new files: the worker of an
+                # interrupted run may still be stopping on the old ones
+                previous_path = job.result_path
+                now = datetime.utcnow()
+                result = await db.execute(
+                    update(ImportJob)
+                    .where(ImportJob.id == job.id, ImportJob.status == "QUEUED")
+                    .values(
+                        status="RUNNING",
+                        started_at=now,
+                        updated_at=now,
+                        result_path=_attempt_result_path(
+                            os.path.dirname(previous_path), job.id, job.output
+                        ),
+                    )
+                )
+                await db.commit()
+                if result.rowcount:
+                    _remove(previous_path)
+                    await db.refresh(job)
+                    return job
+                # Claimed by another API process: try the next one
+
+    async def _run(self, job: ImportJob) -> None:
+        options = job.options or {}
+        progress_path = progress_path_for(job.result_path)
+        relay = asyncio.create_task(self._relay_progress(job.id, progress_path))
+        values: Dict[str, Any]
+        try:
+            result = await self.pool.run(
+                job.kind,
+                job.src_path,
+                job.result_path,
+                timeout_s=settings.IMPORT_ASYNC_TIMEOUT_SECONDS,
+                output=job.output,
+                max_bytes=settings.IMPORT_MAX_SIZE_MB * 1024 * 1024,
+                max_features=options.get("max_features"),
+                options=options.get("parser"),
+                progress=JobProgress(progress_path),
+            )
+            values = {
+                "status": "DONE",
+                "features": result["features"],
+                "bytes_read": result["bytes_read"],
+            }
+        except ImportQueueFull:
+            # Synchronous imports took the worker first: back to the queue
+            values = {"status": "QUEUED", "started_at": None}
+        except ImportCancelled:
+            values = {"status": "CANCELLED"}
+        except ImportTimeout as e:
+            values = {"status": "FAILED", "error": str(e), "error_status": 504}
+        except ImportLimitExceeded as e:
+            values = {"status": "FAILED", "error": str(e), "error_status": 413}
+        except ValueError as e:
+            values = {"status": "FAILED", "error": str(e), "error_status": 400}
+        except Exception as e:
+            logger.exception(f"Import job {job.id} failed")
+            values = {
+                "status": "FAILED",
+                "error": f"Erro ao processar importação: {str(e)}",
+                "error_status": 500,
+            }
+        finally:
+            relay.cancel()
+            _remove(progress_path)
+
+        if values["status"] != "QUEUED":
+            _remove(job.src_path)
+            values["finished_at"] = datetime.utcnow()
+        await self._update(job.id, **values)
+
+    async def _relay_progress(self, job_id: UUID, progress_path: str) -> None:
+        """
+        Copy the worker's counters to the row every PROGRESS_INTERVAL_S.
+
+        Also bumps updated_at while nothing is read (e.g. a Shapefile ZIP
+        being extracted), which tells the other API processes the job is
+        still alive.
+        """
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL_S)
+            values: Dict[str, Any] = {"updated_at": datetime.utcnow()}
+            counters = _read_progress(progress_path)
+            if counters:
+                values["features"], values["bytes_read"] = counters
+            try:
+                await self._update(job_id, **values)
+            except Exception as e:
+                logger.warning(f"Import job {job_id}: progress not saved: {e}")
+
+    async def _update(self, job_id: UUID, **values: Any) -> None:
+        async with _session() as db:
+            await db.execute(update(ImportJob).where(ImportJob.id == job_id).values(**values))
+            await db.commit()
+
+    async def _cleanup(self) -> None:
+        """Fail jobs whose API process died; drop expired jobs and their files."""
+        now = datetime.utcnow()
+        async with _session() as db:
+            stale = select(ImportJob).where(
+                ImportJob.status == "RUNNING",
+                ImportJob.updated_at < now - timedelta(seconds=STALE_AFTER_S),
+            )
+            if self._running:
+                stale = stale.where(ImportJob.id.notin_(list(self._running)))
+            for job in list(await db.scalars(stale)):
+                result = await db.execute(
+                    update(ImportJob)
+                    .where(ImportJob.id == job.id, ImportJob.status == "RUNNING")
+                    .values(
+                        status="FAILED",
+                        error="Importação interrompida",
+                        error_status=500,
+                        finished_at=now,
+                    )
+                )
+                if result.rowcount:
+                    logger.warning(f"Import job {job.id}: interrupted, marked as failed")
+                    _remove(job.src_path, progress_path_for(job.result_path))
+
+            expired = list(await db.scalars(
+                select(ImportJob).where(
+                    ImportJob.status.in_(FINISHED_STATUSES),
+                    ImportJob.finished_at < now - timedelta(hours=settings.IMPORT_ASYNC_TTL_HOURS),
+                )
+            ))
+            for job in expired:
+                _remove(job.src_path, *_attempt_files(job))
+            if expired:
+                await db.execute(delete(ImportJob).where(ImportJob.id.in_([job.id for job in expired])))
+            await db.commit()
+
+
+import_job_runner = ImportJobRunner(import_pool)
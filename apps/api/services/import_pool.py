@@ -0,0 +1,409 @@
+"""
+Process pool for the CPU-bound import parsers (KML/KMZ, Shapefile, GPX).
+
+Parsing in the API process holds the GIL, so one large upload stalls every
+other request on that worker even from a thread. Jobs run instead in a
+bounded ProcessPoolExecutor (spawn context: no fork of a threaded server):
+
+- the upload is spooled to a file; the worker parses it and writes the
+  encoded response body (FeatureCollection or NDJSON) to another file,
+  which the router relays to the client while it is being written
+  (routers.import_export._relay_output), so neither process holds the
+  feature list and the first features arrive before the parse ends;
+- at most IMPORT_WORKERS jobs run and IMPORT_QUEUE_MAX wait; beyond that
+  run() raises ImportQueueFull (HTTP 503);
+- the worker checks a deadline (IMPORT_JOB_TIMEOUT_SECONDS) and a cancel
+  file while parsing, on every read of the upload as well as between
+  features, so timeouts and client disconnects stop the job (also during
+  ZIP extraction or a long GPX track) without killing the pool;
+- queue wait and parse time are recorded per job (import_pool.stats()).
+"""
+
+import asyncio
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import settings
+from services.import_stream import (
+    feature_collection_chunks,
+    limit_features,
+    ndjson_chunks,
+)
+
+logger = logging.getLogger(__name__)
+
+CANCEL_CHECK_INTERVAL_S = 0.25
+DISCONNECT_POLL_S = 0.5
+
+
+class ImportQueueFull(Exception):
+    """Every worker is busy and the wait queue is full (HTTP 503)."""
+
+
+class ImportTimeout(Exception):
+    """The job exceeded IMPORT_JOB_TIMEOUT_SECONDS (HTTP 504)."""
+
+
+class ImportCancelled(Exception):
+    """The job was cancelled (client disconnected)."""
+
+
+# ============ Worker side ============
+
+class _CheckedReader(io.RawIOBase):
+    """Seekable view of the spooled upload that runs check() on every read.
+
+    Parsers spend long stretches reading before they yield a feature (ZIP
+    extraction, a large GPX trkseg); checking here lets the deadline and
+    the cancel file stop those too.
+    """
+
+    def __init__(self, raw: io.BufferedIOBase, check: Callable[[], None]):
+        self._raw = raw
+        self._check = check
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._raw.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._raw.tell()
+
+    def readinto(self, buffer) -> int:
+        self._check()
+        return self._raw.readinto(buffer)
+
+
+def _iter_features(kind: str, source, max_bytes: Optional[int], options: Dict[str, Any]):
+    if kind == "kml":
+        from services.kml_service import iter_kml_features
+        return iter_kml_features(source, max_bytes=max_bytes)
+    if kind == "shapefile":
+        from services.shapefile_service import iter_shapefile_features
+        return iter_shapefile_features(source, max_bytes=max_bytes)
+    if kind == "gpx":
+        from services.gpx_service import iter_gpx_features
+        return iter_gpx_features(source, max_bytes=max_bytes, **options)
+    raise ValueError(f"Formato de importação desconhecido: {kind}")
+
+
+def parse_to_file(
+    kind: str,
+    src_path: str,
+    out_path: str,
+    output: str = "geojson",
+    max_bytes: Optional[int] = None,
+    max_features: Optional[int] = None,
+    options: Optional[Dict[str, Any]] = None,
+    timeout_s: Optional[float] = None,
+    cancel_path: Optional[str] = None,
+    submitted_at: Optional[float] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Parse src_path and write the encoded GeoJSON/NDJSON body to out_path.
+
+    Runs in a pool process (or inline). On every read of src_path and
+    between features it checks, every CANCEL_CHECK_INTERVAL_S, the
+    deadline and whether cancel_path exists, and reports
+    progress(features, bytes_read) when given.
+
+    Returns:
+        Counters: features, bytes_read, queue_wait_s, parse_s
+
+    Raises:
+        ValueError / ImportLimitExceeded: invalid file or limits
+        ImportTimeout, ImportCancelled
+    """
+    started = time.time()
+    deadline = time.monotonic() + timeout_s if timeout_s else None
+    counters = {"features": 0}
+
+    with open(src_path, "rb") as src:
+        next_check = 0.0
+
+        def check() -> None:
+            nonlocal next_check
+            now = time.monotonic()
+            if now < next_check:
+                return
+            next_check = now + CANCEL_CHECK_INTERVAL_S
+            if deadline is not None and now > deadline:
+                raise ImportTimeout("Tempo limite de processamento excedido")
+            if cancel_path and os.path.exists(cancel_path):
+                raise ImportCancelled("Importação cancelada")
+            if progress:
+                progress(counters["features"], src.tell())
+
+        def checked(features):
+            for feature in features:
+                counters["features"] += 1
+                check()
+                yield feature
+
+        features = checked(limit_features(
+            _iter_features(kind, _CheckedReader(src, check), max_bytes, options or {}),
+            max_features,
+        ))
+        encode = ndjson_chunks if output == "ndjson" else feature_collection_chunks
+        try:
+            with open(out_path, "wb") as out:
+                # The first feature is pulled before writing anything, so a
+                # file without features fails like the parsers do.
+                first = next(features, None)
+                if first is None:
+                    raise ValueError("Arquivo não contém features válidas")
+                for chunk in encode(itertools.chain([first], features)):
+                    out.write(chunk)
+        except BaseException:
+            if os.path.exists(out_path):
+                os.unlink(out_path)
+            raise
+        bytes_read = src.tell()
+
+    if progress:
+        progress(counters["features"], bytes_read)
+    return {
+        "features": counters["features"],
+        "bytes_read": bytes_read,
+        "queue_wait_s": max(0.0, started - submitted_at) if submitted_at else 0.0,
+        "parse_s": time.time() - started,
+    }
+
+
+# ============ API side ============
+
+class ImportPoolMetrics:
+    """Job counters and timings (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.queue_wait_total_s = 0.0
+        self.queue_wait_max_s = 0.0
+        self.parse_total_s = 0.0
+        self.parse_max_s = 0.0
+
+    def record(self, outcome: str, result: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            if result:
+                self.queue_wait_total_s += result["queue_wait_s"]
+                self.queue_wait_max_s = max(self.queue_wait_max_s, result["queue_wait_s"])
+                self.parse_total_s += result["parse_s"]
+                self.parse_max_s = max(self.parse_max_s, result["parse_s"])
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            done = self.completed
+            return {
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "cancelled": self.cancelled,
+                "queue_wait_avg_ms": round(self.queue_wait_total_s / done * 1000, 3) if done else 0.0,
+                "queue_wait_max_ms": round(self.queue_wait_max_s * 1000, 3),
+                "parse_avg_ms": round(self.parse_total_s / done * 1000, 3) if done else 0.0,
+                "parse_max_ms": round(self.parse_max_s * 1000, 3),
+            }
+
+
+class ImportPool:
+    """Bounded ProcessPoolExecutor for parse_to_file jobs (one per API worker)."""
+
+    def __init__(self, workers: int, max_queue: int, timeout_s: float):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self.metrics = ImportPoolMetrics()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _reserve(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.metrics.record("rejected")
+                raise ImportQueueFull("Fila de importação cheia, tente novamente em instantes")
+            self._in_flight += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    async def run(
+        self,
+        kind: str,
+        src_path: str,
+        out_path: str,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        timeout_s: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Run parse_to_file in the pool and wait for it.
+
+        is_disconnected (e.g. request.is_disconnected) is polled while
+        waiting; on disconnect or timeout the job is signalled to stop
+        through its cancel file. The job slot is only released when the
+        worker is actually done. timeout_s overrides the pool's timeout
+        (background import jobs).
+        """
+        timeout_s = timeout_s or self.timeout_s
+        self._reserve()
+        cancel_path = cancel_path_for(out_path)
+        try:
+            job = self._get_executor().submit(
+                _call_parse_to_file,
+                dict(
+                    kind=kind,
+                    src_path=src_path,
+                    out_path=out_path,
+                    timeout_s=timeout_s,
+                    cancel_path=cancel_path,
+                    submitted_at=time.time(),
+                    **kwargs,
+                ),
+            )
+        except BaseException:
+            self._release()
+            raise
+        # Slot and cancel file are released when the process is really done
+        # (or the job was dropped from the queue), not when we stop waiting.
+        job.add_done_callback(lambda _: self._finished(cancel_path))
+        future = asyncio.wrap_future(job)
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        # Backstop for a job stuck in the queue: the worker's own deadline
+        # only starts when it picks the job up.
+        wait_deadline = time.monotonic() + timeout_s * 2 + 5
+        try:
+            while True:
+                done, _ = await asyncio.wait({future}, timeout=DISCONNECT_POLL_S)
+                if done:
+                    break
+                if is_disconnected is not None and await is_disconnected():
+                    self._cancel(job, cancel_path)
+                    self.metrics.record("cancelled")
+                    raise ImportCancelled("Cliente desconectou")
+                if time.monotonic() > wait_deadline:
+                    self._cancel(job, cancel_path)
+                    self.metrics.record("timeouts")
+                    raise ImportTimeout("Tempo limite de processamento excedido")
+        except asyncio.CancelledError:
+            self._cancel(job, cancel_path)
+            raise
+
+        try:
+            result = future.result()
+        except ImportTimeout:
+            self.metrics.record("timeouts")
+            raise
+        except ImportCancelled:
+            self.metrics.record("cancelled")
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM kill): start a fresh pool next time
+            with self._lock:
+                self._executor = None
+            self.metrics.record("failed")
+            raise RuntimeError("Processo de importação interrompido")
+        except BaseException:
+            self.metrics.record("failed")
+            raise
+        self.metrics.record("completed", result)
+        logger.info(
+            f"Import {kind}: {result['features']} features, {result['bytes_read']} bytes, "
+            f"queue {result['queue_wait_s']:.3f}s, parse {result['parse_s']:.3f}s"
+        )
+        return result
+
+    def _finished(self, cancel_path: str) -> None:
+        self._release()
+        try:
+            os.unlink(cancel_path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _cancel(job: Future, cancel_path: str) -> None:
+        """Drop a queued job, or ask a running one to stop."""
+        if not job.cancel():
+            _touch(cancel_path)
+
+    def has_idle_worker(self) -> bool:
+        with self._lock:
+            return self._in_flight < self.workers
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = self._in_flight
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": in_flight,
+            "queued": max(0, in_flight - self.workers),
+            **self.metrics.snapshot(),
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def cancel_path_for(out_path: str) -> str:
+    """Cancel file checked by the worker writing out_path."""
+    return out_path + ".cancel"
+
+
+def request_cancel(out_path: str) -> None:
+    """Ask the worker writing out_path to stop (from any API process)."""
+    _touch(cancel_path_for(out_path))
+
+
+def _touch(path: str) -> None:
+    try:
+        with open(path, "w"):
+            pass
+    except OSError:
+        pass
+
+
+def _call_parse_to_file(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return parse_to_file(**kwargs)
+
+
+import_pool = ImportPool(
+    workers=settings.IMPORT_WORKERS,
+    max_queue=settings.IMPORT_QUEUE_MAX,
+    timeout_s=settings.IMPORT_JOB_TIMEOUT_SECONDS,
+)
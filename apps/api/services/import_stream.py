@@ -0,0 +1,111 @@
+"""
+Streaming helpers shared by the import parsers (KML/KMZ, Shapefile, GPX).
+
+Parsers yield GeoJSON features one at a time and these helpers encode them
+as a chunked FeatureCollection or NDJSON body, so a large upload never has
+to be held as a full feature list (or a full decoded string) in memory. The
+chunks are written by the import pool worker to a file that the router
+streams to the client as it grows.
+"""
+
+import datetime
+import io
+import json
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional, Union
+
+Feature = Dict[str, Any]
+
+
+class ImportLimitExceeded(ValueError):
+    """The upload exceeds max_bytes or max_features (HTTP 413)."""
+
+
+class CountingReader(io.RawIOBase):
+    """Read-only wrapper that counts bytes and enforces a byte limit.
+
+    Wraps the upload (or a decompressed ZIP member) so the limit applies to
+    what the parser actually consumes, which also catches compression bombs.
+    """
+
+    def __init__(self, raw: BinaryIO, max_bytes: Optional[int] = None):
+        self._raw = raw
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._raw.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self.bytes_read += n
+        if self.max_bytes is not None and self.bytes_read > self.max_bytes:
+            raise ImportLimitExceeded(
+                f"Arquivo excede o limite de {self.max_bytes} bytes"
+            )
+        return n
+
+
+def local_name(tag: str) -> str:
+    """XML tag name without the namespace (KML 2.2/2.1, GPX 1.0/1.1)."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def as_binary_file(source: Union[bytes, BinaryIO]) -> BinaryIO:
+    """Seekable binary file for bytes or an already open file object."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    source.seek(0)
+    return source
+
+
+def limit_features(features: Iterable[Feature], max_features: Optional[int]) -> Iterator[Feature]:
+    """Pass features through, raising ImportLimitExceeded past max_features."""
+    for count, feature in enumerate(features, start=1):
+        if max_features is not None and count > max_features:
+            raise ImportLimitExceeded(
+                f"Arquivo excede o limite de {max_features} features"
+            )
+        yield feature
+
+
+def _json_default(value: Any) -> Any:
+    """Attribute values json cannot encode (e.g. .dbf date fields)."""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _dumps(feature: Feature) -> bytes:
+    return json.dumps(
+        feature, separators=(",", ":"), ensure_ascii=False, default=_json_default
+    ).encode("utf-8")
+
+
+def feature_collection_chunks(features: Iterable[Feature]) -> Iterator[bytes]:
+    """A GeoJSON FeatureCollection, one feature per chunk."""
+    yield b'{"type":"FeatureCollection","features":['
+    separator = b""
+    for feature in features:
+        yield separator + _dumps(feature)
+        separator = b","
+    yield b"]}"
+
+
+def ndjson_chunks(features: Iterable[Feature]) -> Iterator[bytes]:
+    """Newline-delimited GeoJSON (one Feature per line).
+
+    A parse error or limit hit mid-stream is reported as a last
+    {"type": "Error"} line (a cut NDJSON body would look complete) and
+    then re-raised; the router relays the line and then aborts the
+    response. Errors before the first feature never reach the body (the
+    request fails with 400/413 instead).
+    """
+    try:
+        for feature in features:
+            yield _dumps(feature) + b"\n"
+    except ValueError as e:
+        status = 413 if isinstance(e, ImportLimitExceeded) else 400
+        yield _dumps({"type": "Error", "status": status, "detail": str(e)}) + b"\n"
+        raise
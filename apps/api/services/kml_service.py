@@ -1,13 +1,21 @@
 """
 KML Parser - Parse KML/KMZ to GeoJSON.
 
-Uses fastkml library to parse KML files.
+Streams the document with xml.etree iterparse: each Placemark becomes a
+GeoJSON Feature as soon as its closing tag is read and is then dropped from
+the tree, so memory is bounded by the largest Placemark, not by the file.
+KMZ members are decompressed on the fly.
 """
 
+import re
 import zipfile
-import io
-from typing import Dict, Any
-from fastkml import kml
+import xml.etree.ElementTree as ET
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union
+
+from services.import_stream import CountingReader, Feature, as_binary_file, local_name
+
+_GEOMETRY_TAGS = ("Point", "LineString", "LinearRing", "Polygon", "MultiGeometry")
+_COMMA = re.compile(r"\s*,\s*")
 
 
 def parse_kml_to_geojson(kml_content: bytes) -> Dict[str, Any]:
@@ -24,144 +32,205 @@ def parse_kml_to_geojson(kml_content: bytes) -> Dict[str, Any]:
         ValueError: If KML is invalid or parsing fails
     """
     try:
-        # Check if it's KMZ (ZIP compressed)
-        kml_string = None
-
-        try:
-            # Try to unzip (KMZ)
-            zip_buffer = io.BytesIO(kml_content)
-            with zipfile.ZipFile(zip_buffer, 'r') as zip_ref:
-                # Find .kml file in ZIP
-                kml_files = [name for name in zip_ref.namelist() if name.lower().endswith('.kml')]
-                if not kml_files:
-                    raise ValueError("KMZ não contém arquivo .kml")
-
-                kml_string = zip_ref.read(kml_files[0]).decode('utf-8')
-        except zipfile.BadZipFile:
-            # Not a ZIP, assume plain KML
-            kml_string = kml_content.decode('utf-8')
-
-        if not kml_string:
-            raise ValueError("Não foi possível ler o conteúdo do KML")
-
-        # Parse KML
-        k = kml.KML()
-        k.from_string(kml_string.encode('utf-8'))
-
-        features = []
-
-        # Extract features from KML
-        for document in k.features():
-            features.extend(extract_features_from_container(document))
-
-        if not features:
-            raise ValueError("KML não contém features válidas")
-
-        geojson = {
+        return {
             "type": "FeatureCollection",
-            "features": features
+            "features": list(iter_kml_features(kml_content)),
         }
-
-        return geojson
-
     except Exception as e:
         raise ValueError(f"Erro ao processar KML: {str(e)}")
 
 
-def extract_features_from_container(container) -> list:
+def iter_kml_features(
+    source: Union[bytes, BinaryIO], max_bytes: Optional[int] = None
+) -> Iterator[Feature]:
     """
-    Recursively extract features from KML container (Document/Folder).
+    Yield GeoJSON features from a KML or KMZ file, one Placemark at a time.
 
     Args:
-        container: KML Document or Folder
+        source: KML/KMZ content or a seekable binary file
+        max_bytes: Limit on KML bytes read (after KMZ decompression)
 
-    Returns:
-        List of GeoJSON features
+    Raises:
+        ValueError: If the file is not valid KML/KMZ or has no features
+        ImportLimitExceeded: If more than max_bytes of KML are read
     """
-    features = []
+    f = as_binary_file(source)
+    zip_ref = None
+    try:
+        if zipfile.is_zipfile(f):
+            f.seek(0)
+            zip_ref = zipfile.ZipFile(f, "r")
+            kml_files = [name for name in zip_ref.namelist() if name.lower().endswith(".kml")]
+            if not kml_files:
+                raise ValueError("KMZ não contém arquivo .kml")
+            stream = zip_ref.open(kml_files[0])
+        else:
+            f.seek(0)
+            stream = f
+
+        count = 0
+        for feature in _iter_placemarks(CountingReader(stream, max_bytes)):
+            count += 1
+            yield feature
+        if not count:
+            raise ValueError("KML não contém features válidas")
 
-    for feature in container.features():
-        # If it's a container (Folder), recurse
-        if hasattr(feature, 'features'):
-            features.extend(extract_features_from_container(feature))
+    except zipfile.BadZipFile:
+        raise ValueError("Arquivo KMZ inválido")
+    except ET.ParseError as e:
+        raise ValueError(f"KML inválido: {e}")
+    finally:
+        if zip_ref is not None:
+            zip_ref.close()
 
-        # If it's a Placemark with geometry
-        elif hasattr(feature, 'geometry') and feature.geometry:
-            geojson_feature = placemark_to_geojson_feature(feature)
-            if geojson_feature:
-                features.append(geojson_feature)
 
-    return features
+def _iter_placemarks(stream: BinaryIO) -> Iterator[Feature]:
+    """
+    Convert each Placemark on its end event, then detach it from its parent.
 
+    Elements outside Placemarks (styles, folder names...) are detached as
+    soon as they close too, so the partial tree never grows.
+    """
+    stack: List[ET.Element] = []
+    depth = 0  # open Placemarks
+
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            if local_name(elem.tag) == "Placemark":
+                depth += 1
+            continue
+
+        stack.pop()
+        if local_name(elem.tag) == "Placemark":
+            depth -= 1
+            if depth == 0:
+                feature = placemark_to_geojson_feature(elem)
+                if feature:
+                    yield feature
+        if depth == 0 and stack:
+            stack[-1].remove(elem)
+
+
+def _child(elem: ET.Element, name: str) -> Optional[ET.Element]:
+    for child in elem:
+        if local_name(child.tag) == name:
+            return child
+    return None
+
+
+def _text(elem: ET.Element, name: str) -> str:
+    child = _child(elem, name)
+    return (child.text or "").strip() if child is not None else ""
+
+
+def _coordinates(elem: ET.Element) -> List[List[float]]:
+    """Coordinates of a geometry element ("lon,lat[,alt]" tuples)."""
+    node = _child(elem, "coordinates")
+    if node is None or not node.text:
+        return []
+    text = node.text
+    if ", " in text or " ," in text:
+        text = _COMMA.sub(",", text)
+    tuples = text.split()
+    if not tuples:
+        return []
+    # Fast path: every tuple has the dimension of the first one
+    dim = tuples[0].count(",") + 1
+    values = list(map(float, text.replace(",", " ").split()))
+    if len(values) == dim * len(tuples):
+        return [list(values[i:i + dim]) for i in range(0, len(values), dim)]
+    return [[float(v) for v in token.split(",")] for token in tuples]
+
+
+def _rings(elem: ET.Element, boundary: str) -> List[List[List[float]]]:
+    return [
+        _coordinates(ring)
+        for node in elem if local_name(node.tag) == boundary
+        for ring in node if local_name(ring.tag) == "LinearRing"
+    ]
+
+
+def _geometry(elem: ET.Element) -> Optional[Dict[str, Any]]:
+    """GeoJSON geometry for a KML geometry element (None if empty/unsupported)."""
+    tag = local_name(elem.tag)
+
+    if tag == "Point":
+        coords = _coordinates(elem)
+        return {"type": "Point", "coordinates": coords[0]} if coords else None
+
+    if tag == "LineString":
+        coords = _coordinates(elem)
+        return {"type": "LineString", "coordinates": coords} if len(coords) >= 2 else None
+
+    if tag == "LinearRing":
+        coords = _coordinates(elem)
+        return {"type": "Polygon", "coordinates": [coords]} if len(coords) >= 4 else None
+
+    if tag == "Polygon":
+        outer = _rings(elem, "outerBoundaryIs")
+        if not outer or len(outer[0]) < 4:
+            return None
+        inner = [ring for ring in _rings(elem, "innerBoundaryIs") if len(ring) >= 4]
+        return {"type": "Polygon", "coordinates": [outer[0]] + inner}
+
+    if tag == "MultiGeometry":
+        parts = []
+        for child in elem:
+            if local_name(child.tag) in _GEOMETRY_TAGS:
+                geometry = _geometry(child)
+                if geometry is None:
+                    continue
+                # Nested MultiGeometry: flatten
+                if geometry["type"].startswith("Multi"):
+                    single = geometry["type"][len("Multi"):]
+                    parts.extend({"type": single, "coordinates": c} for c in geometry["coordinates"])
+                elif geometry["type"] == "GeometryCollection":
+                    parts.extend(geometry["geometries"])
+                else:
+                    parts.append(geometry)
+        if not parts:
+            return None
+        types = {part["type"] for part in parts}
+        if len(types) == 1:
+            return {
+                "type": "Multi" + types.pop(),
+                "coordinates": [part["coordinates"] for part in parts],
+            }
+        return {"type": "GeometryCollection", "geometries": parts}
+
+    return None
 
-def placemark_to_geojson_feature(placemark) -> Dict[str, Any]:
+
+def placemark_to_geojson_feature(placemark: ET.Element) -> Optional[Dict[str, Any]]:
     """
-    Convert KML Placemark to GeoJSON Feature.
+    Convert a KML Placemark element to GeoJSON Feature.
 
     Args:
-        placemark: KML Placemark object
+        placemark: Placemark element (fully parsed)
 
     Returns:
-        GeoJSON Feature dict or None if geometry is invalid
+        GeoJSON Feature dict or None if geometry is missing or invalid
     """
     try:
-        geometry = placemark.geometry
+        geometry = None
+        for child in placemark:
+            if local_name(child.tag) in _GEOMETRY_TAGS:
+                geometry = _geometry(child)
+                break
 
         if not geometry:
             return None
 
-        # Convert shapely geometry to GeoJSON
-        geojson_geometry = {
-            "type": geometry.geom_type,
-            "coordinates": list(geometry.coords) if hasattr(geometry, 'coords') else []
-        }
-
-        # Handle different geometry types
-        if geometry.geom_type == "Point":
-            geojson_geometry["coordinates"] = list(geometry.coords[0])
-
-        elif geometry.geom_type == "LineString":
-            geojson_geometry["coordinates"] = [list(coord) for coord in geometry.coords]
-
-        elif geometry.geom_type == "Polygon":
-            # Exterior ring
-            exterior = [list(coord) for coord in geometry.exterior.coords]
-            # Interior rings (holes)
-            interiors = [[list(coord) for coord in interior.coords] for interior in geometry.interiors]
-            geojson_geometry["coordinates"] = [exterior] + interiors
-
-        elif geometry.geom_type == "MultiPoint":
-            geojson_geometry["coordinates"] = [[geom.x, geom.y, geom.z if hasattr(geom, 'z') else 0] for geom in geometry.geoms]
-
-        elif geometry.geom_type == "MultiLineString":
-            geojson_geometry["coordinates"] = [
-                [list(coord) for coord in geom.coords]
-                for geom in geometry.geoms
-            ]
-
-        elif geometry.geom_type == "MultiPolygon":
-            geojson_geometry["coordinates"] = [
-                [[list(coord) for coord in geom.exterior.coords]]
-                for geom in geometry.geoms
-            ]
-
-        else:
-            return None
-
-        # Extract properties
-        properties = {
-            "name": placemark.name or "",
-            "description": placemark.description or ""
-        }
-
-        feature = {
+        return {
             "type": "Feature",
-            "geometry": geojson_geometry,
-            "properties": properties
+            "geometry": geometry,
+            "properties": {
+                "name": _text(placemark, "name"),
+                "description": _text(placemark, "description"),
+            },
         }
 
-        return feature
-
-    except Exception as e:
-        # Skip invalid geometries
+    except ValueError:
+        # Skip invalid coordinates
         return None
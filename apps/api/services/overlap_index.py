@@ -0,0 +1,356 @@
+"""In-memory overlap engine: per-project Shapely STRtree of parcel geometries.
+
+Optional fast path (settings.OVERLAP_INDEX_ENABLED) for neighbor/overlap
+checks that would otherwise hit PostGIS on every call, e.g. while a
+topógrafo drags vertices. Indexes are loaded lazily per project, kept in a
+bounded LRU with a TTL (other workers may have written), and updated in
+place when a geometry is written through this process.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from shapely import wkb, wkt
+from shapely.geometry import GeometryCollection, MultiPolygon, Polygon, box, shape
+from shapely.geometry.base import BaseGeometry
+from shapely.ops import unary_union
+from shapely.strtree import STRtree
+
+from config import settings
+from services.geodesic import geodesic_area_perimeter
+
+IndexItem = Tuple[str, Optional[str], BaseGeometry]  # (parcel_id, name, geometry)
+
+# Pending in-place edits tolerated before the tree is rebuilt
+REBUILD_THRESHOLD = 32
+
+
+def geometry_from_value(value: Any) -> Optional[BaseGeometry]:
+    """Parse a geometry as returned by PostgREST/GeoAlchemy/clients.
+
+    Accepts GeoJSON dicts, hex (E)WKB strings and (E)WKT strings.
+    """
+    if value is None:
+        return None
+    if isinstance(value, BaseGeometry):
+        return value
+    if isinstance(value, dict):
+        return shape(value)
+    if isinstance(value, (bytes, memoryview)):
+        return wkb.loads(bytes(value))
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return None
+        if text.upper().startswith("SRID="):
+            text = text.split(";", 1)[1]
+        try:
+            return wkb.loads(text, hex=True)
+        except Exception:
+            return wkt.loads(text)
+    raise ValueError(f"Unsupported geometry value: {type(value).__name__}")
+
+
+def _polygonal(geom: BaseGeometry) -> Optional[BaseGeometry]:
+    """Keep only the areal part of an intersection result."""
+    if geom.is_empty:
+        return None
+    if geom.geom_type in ("Polygon", "MultiPolygon"):
+        return geom
+    polygons: List[Polygon] = []
+    for part in getattr(geom, "geoms", []):
+        if part.geom_type == "Polygon":
+            polygons.append(part)
+        elif part.geom_type == "MultiPolygon":
+            polygons.extend(part.geoms)
+    return MultiPolygon(polygons) if polygons else None
+
+
+class ProjectOverlapIndex:
+    """STRtree over the parcels of one project, with incremental edits.
+
+    STRtree is immutable, so edits are tracked on the side: replaced or
+    removed tree entries go to _stale, new/changed geometries to _extra
+    (checked by brute force). After REBUILD_THRESHOLD edits the tree is
+    rebuilt from scratch.
+
+    The union of the project (coverage) is built on first use and then
+    patched locally on each edit: only the parcels around the edited one
+    are re-unioned.
+    """
+
+    def __init__(self, items: Iterable[IndexItem]):
+        self._lock = threading.RLock()
+        self._geoms: Dict[str, BaseGeometry] = {}
+        self._names: Dict[str, Optional[str]] = {}
+        for parcel_id, name, geom in items:
+            if geom is None or geom.is_empty:
+                continue
+            self._geoms[parcel_id] = geom
+            self._names[parcel_id] = name
+        self.loaded_at = time.monotonic()
+        # validation_log.project_revision the parcels were loaded at; None
+        # once edited in place
+        self.revision: Optional[str] = None
+        self._union: Optional[BaseGeometry] = None
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return len(self._geoms)
+
+    def _rebuild(self) -> None:
+        self._tree_ids: List[str] = list(self._geoms.keys())
+        self._tree_id_set: Set[str] = set(self._tree_ids)
+        self._tree = STRtree([self._geoms[i] for i in self._tree_ids]) if self._tree_ids else None
+        self._stale: Set[str] = set()
+        self._extra: Set[str] = set()
+
+    def _maybe_rebuild(self) -> None:
+        if len(self._stale) + len(self._extra) > REBUILD_THRESHOLD:
+            self._rebuild()
+
+    def upsert(self, parcel_id: str, geom: Optional[BaseGeometry], name: Optional[str] = None) -> None:
+        """Insert or replace one parcel geometry (None/empty removes it)."""
+        if geom is None or geom.is_empty:
+            self.remove(parcel_id)
+            return
+        with self._lock:
+            if self._union is not None:
+                self._union = self.union_with(geom, parcel_id)
+            if parcel_id in self._tree_id_set:
+                self._stale.add(parcel_id)
+            self._geoms[parcel_id] = geom
+            if name is not None or parcel_id not in self._names:
+                self._names[parcel_id] = name
+            self._extra.add(parcel_id)
+            self._maybe_rebuild()
+
+    def remove(self, parcel_id: str) -> None:
+        with self._lock:
+            if self._union is not None and parcel_id in self._geoms:
+                self._union = self.union_with(None, parcel_id)
+            if parcel_id in self._tree_id_set:
+                self._stale.add(parcel_id)
+            self._extra.discard(parcel_id)
+            self._geoms.pop(parcel_id, None)
+            self._names.pop(parcel_id, None)
+            self._maybe_rebuild()
+
+    def intersecting(self, geom: BaseGeometry, exclude_id: Optional[str] = None) -> List[str]:
+        """Parcel ids whose geometry intersects geom (boundary contact included)."""
+        with self._lock:
+            ids: List[str] = []
+            if self._tree is not None:
+                for i in self._tree.query(geom, predicate="intersects"):
+                    parcel_id = self._tree_ids[i]
+                    if parcel_id not in self._stale:
+                        ids.append(parcel_id)
+            for parcel_id in self._extra:
+                if self._geoms[parcel_id].intersects(geom):
+                    ids.append(parcel_id)
+            return [i for i in ids if i != exclude_id]
+
+    def union(self) -> BaseGeometry:
+        """Union of every parcel in the project (cached)."""
+        with self._lock:
+            if self._union is None:
+                self._union = unary_union(list(self._geoms.values())) if self._geoms else GeometryCollection()
+            return self._union
+
+    def union_with(
+        self,
+        geom: Optional[BaseGeometry],
+        replace_id: Optional[str] = None,
+        margin: float = 0.0,
+    ) -> BaseGeometry:
+        """Project union with replace_id's geometry swapped for geom.
+
+        geom=None just drops replace_id. The cached union is cut along a box
+        around the old and new geometries (plus margin, in degrees) and only
+        the parcels inside that box are re-unioned.
+        """
+        with self._lock:
+            base = self.union()
+            old = self._geoms.get(replace_id) if replace_id is not None else None
+            changed = [g for g in (old, geom) if g is not None]
+            if not changed:
+                return base
+
+            minx, miny, maxx, maxy = unary_union([g.envelope for g in changed]).bounds
+            region = box(minx - margin, miny - margin, maxx + margin, maxy + margin)
+
+            parts = [
+                self._geoms[i].intersection(region)
+                for i in self.intersecting(region, exclude_id=replace_id)
+            ]
+            if geom is not None:
+                parts.append(geom.intersection(region))
+            return unary_union([base.difference(region)] + parts)
+
+    def overlaps(
+        self,
+        geom: BaseGeometry,
+        exclude_id: Optional[str] = None,
+        min_area_m2: float = 0.0,
+    ) -> List[Dict[str, Any]]:
+        """Interior overlaps with geom, largest first.
+
+        Returns:
+            [{ parcel_id, name, overlap_area_m2 }] with geodesic areas
+        """
+        with self._lock:
+            hits: List[Tuple[str, BaseGeometry]] = []
+            for parcel_id in self.intersecting(geom, exclude_id):
+                other = self._geoms[parcel_id]
+                if not geom.relate_pattern(other, "T********"):
+                    continue  # only touching along the boundary
+                inter = _polygonal(geom.intersection(other))
+                if inter is not None:
+                    hits.append((parcel_id, inter))
+            names = {parcel_id: self._names.get(parcel_id) for parcel_id, _ in hits}
+
+        if not hits:
+            return []
+
+        areas, _ = geodesic_area_perimeter([inter for _, inter in hits])
+        results = [
+            {
+                "parcel_id": parcel_id,
+                "name": names[parcel_id],
+                "overlap_area_m2": float(area),
+            }
+            for (parcel_id, _), area in zip(hits, areas)
+            if area > min_area_m2
+        ]
+        results.sort(key=lambda r: r["overlap_area_m2"], reverse=True)
+        return results
+
+
+class OverlapIndexRegistry:
+    """Process-wide LRU of ProjectOverlapIndex, keyed by (source, project_id)."""
+
+    def __init__(self, max_projects: int, ttl_seconds: float):
+        self.max_projects = max_projects
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._indexes: "OrderedDict[Hashable, ProjectOverlapIndex]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        key: Hashable,
+        loader: Callable[[], Iterable[IndexItem]],
+        revision: Optional[str] = None,
+    ) -> ProjectOverlapIndex:
+        """Return the index for key, loading it with loader() when missing/expired.
+
+        With revision (validation_log.project_revision read in the same
+        transaction) the index is served only if it was loaded at that
+        revision, regardless of the TTL, and reloaded otherwise: results
+        memoized under a revision are then computed from that revision.
+        """
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None and (
+                index.revision == revision if revision is not None
+                else time.monotonic() - index.loaded_at < self.ttl_seconds
+            ):
+                self._indexes.move_to_end(key)
+                self.hits += 1
+                return index
+            self.misses += 1
+
+        # Load outside the lock: it does I/O
+        index = ProjectOverlapIndex(loader())
+        index.revision = revision
+        with self._lock:
+            self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.max_projects:
+                self._indexes.popitem(last=False)
+        return index
+
+    def upsert(
+        self,
+        key: Hashable,
+        parcel_id: str,
+        geom: Any,
+        name: Optional[str] = None,
+        revision: Optional[str] = None,
+        previous_revision: Optional[str] = None,
+    ) -> None:
+        """Apply a geometry write to a loaded index (no-op if not loaded).
+
+        revision/previous_revision: project revision after and before the
+        write (validation_log.lock_project_revision). An index loaded at
+        previous_revision is exactly at revision once patched, so it keeps
+        serving revisioned get() calls; otherwise it loses its revision
+        and the next one reloads it.
+        """
+        with self._lock:
+            index = self._indexes.get(key)
+        if index is None:
+            return
+        current = index.revision
+        index.revision = None
+        try:
+            index.upsert(parcel_id, geometry_from_value(geom), name)
+        except Exception:
+            self.invalidate(key)
+            return
+        if revision is not None and previous_revision is not None and current == previous_revision:
+            index.revision = revision
+
+    def remove(self, key: Hashable, parcel_id: str) -> None:
+        with self._lock:
+            index = self._indexes.get(key)
+        if index is not None:
+            index.revision = None
+            index.remove(parcel_id)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one project index, or all of them."""
+        with self._lock:
+            if key is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "projects": len(self._indexes),
+                "parcels": sum(len(i) for i in self._indexes.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+overlap_index = OverlapIndexRegistry(
+    max_projects=settings.OVERLAP_INDEX_MAX_PROJECTS,
+    ttl_seconds=settings.OVERLAP_INDEX_TTL_SECONDS,
+)
+
+
+# ============ Loaders ============
+
+def parcel_index_key(project_id: Any) -> Tuple[str, str]:
+    return ("parcel", str(project_id))
+
+
+def load_project_parcels(db, project_id: Any) -> List[IndexItem]:
+    """Parcels of a project (SQLAlchemy path), official geometry preferred."""
+    from sqlalchemy import func
+    from geoalchemy2.shape import to_shape
+    from models import Parcel
+
+    rows = db.query(
+        Parcel.id,
+        Parcel.name,
+        func.coalesce(Parcel.geom_official, Parcel.geom_client_sketch),
+    ).filter(Parcel.project_id == project_id).all()
+
+    return [(str(row[0]), row[1], to_shape(row[2])) for row in rows if row[2] is not None]
+
@@ -0,0 +1,93 @@
+"""Keyset (cursor) pagination and column projection for PostgREST listings.
+
+Rows are ordered server-side by (order_column DESC, id DESC). PostgreSQL
+puts NULLs first in a DESC sort, so a page may start with rows whose
+order_column is null (e.g. pagamentos not yet paid) and continue into the
+non-null values.
+
+The cursor is the (order_column, id) pair of the last row of a page,
+base64url-encoded JSON. It is opaque to clients and is passed back as-is.
+"""
+import base64
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+_COLUMN = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def select_columns(fields: Optional[str], order_column: str, embed: str = "") -> str:
+    """select() argument for an optional comma-separated fields= projection.
+
+    id and order_column are always included (the cursor is built from them).
+    Raises ValueError for anything that is not a plain column name.
+    """
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        if not names or not all(_COLUMN.match(name) for name in names):
+            raise ValueError("fields must be a comma-separated list of column names")
+        columns = ",".join(dict.fromkeys([*names, order_column, "id"]))
+    else:
+        columns = "*"
+    return f"{columns}, {embed}" if embed else columns
+
+
+def encode_cursor(value: Any, row_id: int) -> str:
+    raw = json.dumps([value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """(order value, id) from a cursor; ValueError if it was tampered with."""
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor")
+    if not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError("invalid cursor")
+    if value is not None and not isinstance(value, (str, int, float)):
+        raise ValueError("invalid cursor")
+    return value, row_id
+
+
+def _literal(value: Any) -> str:
+    """Value quoted for a PostgREST or=() tree (timestamps contain : and .)."""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def keyset(query, order_column: str, cursor: Optional[str], limit: Optional[int]):
+    """Apply ordering, the cursor filter and limit (+1, to detect a next page).
+
+    Without a limit the whole result is returned, ordered server-side.
+    """
+    # A single order() call with both keys: older postgrest-py versions do
+    # not merge repeated order() calls.
+    query = query.order(f"{order_column}.desc,id", desc=True)
+    if cursor:
+        value, row_id = decode_cursor(cursor)
+        if value is None:
+            # Still inside the leading NULLs: the rest of them, then every non-null
+            query = query.or_(
+                f"and({order_column}.is.null,id.lt.{row_id}),{order_column}.not.is.null"
+            )
+        else:
+            v = _literal(value)
+            query = query.or_(
+                f"{order_column}.lt.{v},and({order_column}.eq.{v},id.lt.{row_id})"
+            )
+    if limit:
+        query = query.limit(limit + 1)
+    return query
+
+
+def page(rows: List[Dict[str, Any]], order_column: str, limit: Optional[int]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Trim the extra row fetched by keyset() and build the next cursor."""
+    if not limit or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.get(order_column), last["id"])
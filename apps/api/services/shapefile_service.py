@@ -1,13 +1,27 @@
 """
 Shapefile Parser - Parse ESRI Shapefile (ZIP) to GeoJSON.
 
-Uses pyshp library to read .shp, .shx, and .dbf files.
+Uses pyshp library to read .shp, .shx, and .dbf files. The members are
+decompressed once into a temporary directory (pyshp seeks, which is costly
+on compressed ZIP streams) and shapes/records are read lazily, one feature
+at a time.
 """
 
+import codecs
+import os
+import shutil
+import struct
+import tempfile
 import zipfile
-import io
 import shapefile
-from typing import Dict, Any, List
+from shapely.geometry import Point, Polygon
+from shapely.strtree import STRtree
+from typing import Dict, Any, BinaryIO, Iterator, List, Optional, Union
+
+from services.import_stream import CountingReader, Feature, as_binary_file
+
+REQUIRED_EXTENSIONS = ('.shp', '.shx', '.dbf')
+COPY_BUFFER_SIZE = 1024 * 1024
 
 
 def parse_shapefile_to_geojson(zip_content: bytes) -> Dict[str, Any]:
@@ -24,81 +38,103 @@ def parse_shapefile_to_geojson(zip_content: bytes) -> Dict[str, Any]:
         ValueError: If ZIP is invalid or missing required files
     """
     try:
-        # Extract files from ZIP
-        zip_buffer = io.BytesIO(zip_content)
-
-        with zipfile.ZipFile(zip_buffer, 'r') as zip_ref:
-            namelist = zip_ref.namelist()
-
-            # Find .shp file
-            shp_files = [name for name in namelist if name.lower().endswith('.shp')]
-            if not shp_files:
-                raise ValueError("ZIP não contém arquivo .shp")
-
-            shp_name = shp_files[0]
-            base_name = shp_name[:-4]  # Remove .shp extension
-
-            # Check for required files
-            required_extensions = ['.shp', '.shx', '.dbf']
-            for ext in required_extensions:
-                file_exists = any(
-                    name.lower() == (base_name + ext).lower()
-                    for name in namelist
-                )
-                if not file_exists:
-                    raise ValueError(
-                        f"ZIP não contém arquivo {ext} necessário. "
-                        f"Arquivos obrigatórios: .shp, .shx, .dbf"
-                    )
-
-            # Read shapefile
-            shp_bytes = zip_ref.read(shp_name)
-            shx_bytes = zip_ref.read(base_name + '.shx')
-            dbf_bytes = zip_ref.read(base_name + '.dbf')
-
-        # Parse using pyshp
-        shp_buffer = io.BytesIO(shp_bytes)
-        shx_buffer = io.BytesIO(shx_bytes)
-        dbf_buffer = io.BytesIO(dbf_bytes)
-
-        sf = shapefile.Reader(shp=shp_buffer, shx=shx_buffer, dbf=dbf_buffer)
-
-        # Convert to GeoJSON
-        features = []
-
-        for shape_record in sf.shapeRecords():
-            shape = shape_record.shape
-            record = shape_record.record
-
-            # Convert geometry
-            geometry = shape_to_geojson_geometry(shape)
-
-            # Extract attributes
-            properties = {}
-            for i, field in enumerate(sf.fields[1:]):  # Skip first field (DeletionFlag)
-                field_name = field[0]
-                properties[field_name] = record[i]
-
-            feature = {
-                "type": "Feature",
-                "geometry": geometry,
-                "properties": properties
-            }
-            features.append(feature)
-
-        geojson = {
+        return {
             "type": "FeatureCollection",
-            "features": features
+            "features": list(iter_shapefile_features(zip_content)),
         }
-
-        return geojson
-
-    except zipfile.BadZipFile:
-        raise ValueError("Arquivo ZIP inválido")
     except Exception as e:
         raise ValueError(f"Erro ao processar Shapefile: {str(e)}")
 
 
+def _layer_members(namelist: List[str]) -> Dict[str, str]:
+    """ZIP member for each extension of the first layer (.shp, .shx, .dbf, .cpg)."""
+    shp_files = [name for name in namelist if name.lower().endswith('.shp')]
+    if not shp_files:
+        raise ValueError("ZIP não contém arquivo .shp")
+
+    base_name = shp_files[0][:-4].lower()  # Remove .shp extension
+    members = {}
+    for name in namelist:
+        stem, ext = os.path.splitext(name)
+        if stem.lower() == base_name and ext.lower() in REQUIRED_EXTENSIONS + ('.cpg',):
+            members.setdefault(ext.lower(), name)
+
+    for ext in REQUIRED_EXTENSIONS:
+        if ext not in members:
+            raise ValueError(
+                f"ZIP não contém arquivo {ext} necessário. "
+                f"Arquivos obrigatórios: .shp, .shx, .dbf"
+            )
+    return members
+
+
+def _dbf_encoding(cpg_path: str) -> str:
+    """Encoding declared in the .cpg file (UTF-8 when absent or unknown)."""
+    try:
+        with open(cpg_path, 'r', encoding='ascii', errors='ignore') as f:
+            name = f.read().strip()
+        return codecs.lookup(name).name if name else 'utf-8'
+    except (OSError, LookupError):
+        return 'utf-8'
+
+
+def iter_shapefile_features(
+    source: Union[bytes, BinaryIO], max_bytes: Optional[int] = None
+) -> Iterator[Feature]:
+    """
+    Yield GeoJSON features from a zipped Shapefile, one record at a time.
+
+    Args:
+        source: ZIP content or a seekable binary file
+        max_bytes: Limit on the decompressed size of the layer files
+
+    Raises:
+        ValueError: If ZIP is invalid or missing required files
+        ImportLimitExceeded: If the layer files exceed max_bytes
+    """
+    with tempfile.TemporaryDirectory(prefix='shapefile-') as tmp_dir:
+        base_path = os.path.join(tmp_dir, 'layer')
+        try:
+            with zipfile.ZipFile(as_binary_file(source), 'r') as zip_ref:
+                members = _layer_members(zip_ref.namelist())
+                total = 0
+                for ext, name in members.items():
+                    budget = None if max_bytes is None else max_bytes - total
+                    with zip_ref.open(name) as src, open(base_path + ext, 'wb') as dst:
+                        reader = CountingReader(src, budget)
+                        shutil.copyfileobj(reader, dst, COPY_BUFFER_SIZE)
+                    total += reader.bytes_read
+        except zipfile.BadZipFile:
+            raise ValueError("Arquivo ZIP inválido")
+
+        try:
+            encoding = _dbf_encoding(base_path + '.cpg') if '.cpg' in members else 'utf-8'
+            with shapefile.Reader(base_path, encoding=encoding) as sf:
+                field_names = [field[0] for field in sf.fields[1:]]  # Skip DeletionFlag
+
+                # Pair shapes and records by oid: deleted .dbf records are skipped
+                # by iterRecords, so a plain zip() would shift the attributes.
+                records = sf.iterRecords()
+                record = next(records, None)
+                for shape in sf.iterShapes():
+                    while record is not None and record.oid < shape.oid:
+                        record = next(records, None)
+                    if record is None or record.oid != shape.oid:
+                        continue
+
+                    geometry = None
+                    if shape.shapeType != shapefile.NULL:
+                        geometry = shape_to_geojson_geometry(shape)
+
+                    yield {
+                        "type": "Feature",
+                        "geometry": geometry,
+                        "properties": dict(zip(field_names, record))
+                    }
+        except (shapefile.ShapefileException, struct.error) as e:
+            raise ValueError(f"Shapefile inválido: {str(e)}")
+
+
 def shape_to_geojson_geometry(shape) -> Dict[str, Any]:
     """
     Convert pyshp Shape to GeoJSON geometry.
@@ -140,25 +176,25 @@ def shape_to_geojson_geometry(shape) -> Dict[str, Any]:
 
     # Polygon (5)
     elif shape_type == 5:
-        if len(shape.parts) == 1:
+        rings = []
+        parts = list(shape.parts) + [len(shape.points)]
+        for i in range(len(parts) - 1):
+            start = parts[i]
+            end = parts[i + 1]
+            rings.append([[p[0], p[1]] for p in shape.points[start:end]])
+
+        polygons = assemble_polygons(rings)
+        if not polygons:
+            raise ValueError("Polígono sem anéis válidos")
+        if len(polygons) == 1:
             return {
                 "type": "Polygon",
-                "coordinates": [[[p[0], p[1]] for p in shape.points]]
-            }
-        else:
-            # MultiPolygon or Polygon with holes
-            rings = []
-            parts = list(shape.parts) + [len(shape.points)]
-            for i in range(len(parts) - 1):
-                start = parts[i]
-                end = parts[i + 1]
-                rings.append([[p[0], p[1]] for p in shape.points[start:end]])
-
-            # Simple case: treat as single polygon with holes
-            return {
-                "type": "Polygon",
-                "coordinates": rings
+                "coordinates": polygons[0]
             }
+        return {
+            "type": "MultiPolygon",
+            "coordinates": polygons
+        }
 
     # MultiPoint (8)
     elif shape_type == 8:
@@ -169,3 +205,70 @@ def shape_to_geojson_geometry(shape) -> Dict[str, Any]:
 
     else:
         raise ValueError(f"Tipo de geometria não suportado: {shape_type}")
+
+
+def ring_signed_area(ring: List[List[float]]) -> float:
+    """Shoelace area of a closed ring: negative when clockwise."""
+    area = 0.0
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        area += x1 * y2 - x2 * y1
+    return area / 2.0
+
+
+def _containing_shells(hole: List[List[float]], shell_geoms: List[Polygon], tree: Optional[STRtree]) -> List[int]:
+    """Indices of the shells that cover the hole."""
+    try:
+        geom = Polygon(hole)
+        if tree is None:
+            return [0] if shell_geoms[0].covers(geom) else []
+        return [int(i) for i in tree.query(geom, predicate="covered_by")]
+    except Exception:
+        # Self-intersecting hole: locate it by its first vertex
+        point = Point(hole[0])
+        return [i for i, shell in enumerate(shell_geoms) if shell.covers(point)]
+
+
+def assemble_polygons(rings: List[List[List[float]]]) -> List[List[List[List[float]]]]:
+    """
+    Group the rings of a shapefile polygon into polygons (shell + holes).
+
+    The shapefile spec writes shells clockwise and holes counter-clockwise.
+    Each hole goes to the smallest shell containing it (looked up through
+    an STRtree when there are several shells); a hole inside no shell
+    becomes a polygon of its own. Degenerate (zero-area) rings are dropped.
+    Writers that ignore the orientation rule and use a single winding for
+    every ring get one polygon per ring.
+
+    Returns:
+        GeoJSON Polygon coordinate lists, one per polygon
+    """
+    if len(rings) == 1:
+        # Single ring: a polygon whatever its winding
+        return [rings] if len(rings[0]) >= 4 else []
+
+    shells, holes = [], []
+    for ring in rings:
+        if len(ring) < 4:
+            continue
+        area = ring_signed_area(ring)
+        if area < 0:
+            shells.append((ring, -area))
+        elif area > 0:
+            holes.append(ring)
+
+    if not shells:
+        return [[ring] for ring in holes]
+
+    polygons = [[ring] for ring, _ in shells]
+    if not holes:
+        return polygons
+
+    shell_geoms = [Polygon(ring) for ring, _ in shells]
+    tree = STRtree(shell_geoms) if len(shells) > 1 else None
+    for hole in holes:
+        containing = _containing_shells(hole, shell_geoms, tree)
+        if containing:
+            polygons[min(containing, key=lambda i: shells[i][1])].append(hole)
+        else:
+            polygons.append([hole])
+    return polygons
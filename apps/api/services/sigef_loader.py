@@ -0,0 +1,295 @@
+"""
+SIGEF Loader - Bulk ingest of INCRA/SIGEF certified parcels into sigef_certified.
+
+Streams a Shapefile (.shp or .zip) or GeoPackage dump with fiona and feeds
+it to PostgreSQL through COPY (geometry as hex WKB) into a temporary staging
+table, then upserts on cert_id in one INSERT ... SELECT. The GiST index on
+sigef_certified.geom is dropped during the load and rebuilt afterwards,
+followed by ANALYZE.
+
+Usage:
+    python -m services.sigef_loader parcelas_certificadas_SP.zip
+    python -m services.sigef_loader sigef_brasil.gpkg --layer parcelas --cert-field parcela_co
+"""
+
+import argparse
+import logging
+import time
+from typing import Any, Dict, Iterator, Optional
+
+import fiona
+from shapely.geometry import shape
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+GIST_INDEX_NAME = "idx_sigef_certified_geom"  # GeoAlchemy2 naming for sigef_certified.geom
+DEFAULT_CERT_FIELD = "parcela_co"
+DEFAULT_OWNER_FIELD = "nome_area"
+DEFAULT_SOURCE_SRID = 4674  # SIRGAS 2000
+
+
+def _copy_escape(value: Optional[str]) -> str:
+    """Escape a value for COPY text format."""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _fiona_path(path: str) -> str:
+    """Zipped shapefiles are opened through GDAL's zip:// virtual filesystem."""
+    if path.lower().endswith(".zip") and not path.startswith("zip://"):
+        return f"zip://{path}"
+    return path
+
+
+def _source_srid(crs: Any) -> int:
+    """EPSG code of the dump, defaulting to SIRGAS 2000."""
+    try:
+        epsg = crs.to_epsg() if crs else None
+    except Exception:
+        epsg = None
+    return epsg or DEFAULT_SOURCE_SRID
+
+
+def iter_sigef_rows(
+    path: str,
+    layer: Optional[str] = None,
+    cert_field: str = DEFAULT_CERT_FIELD,
+    owner_field: str = DEFAULT_OWNER_FIELD,
+    stats: Optional[Dict[str, int]] = None,
+) -> Iterator[str]:
+    """
+    Yield one COPY text line (cert_id, owner, hex WKB) per feature.
+
+    Features without cert_id or geometry are skipped and counted in
+    stats["skipped"]; stats["read"] counts the lines yielded.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("read", 0)
+    stats.setdefault("skipped", 0)
+
+    with fiona.open(_fiona_path(path), layer=layer) as src:
+        for feature in src:
+            props = feature["properties"] or {}
+            cert_id = props.get(cert_field)
+            geometry = feature["geometry"]
+            if not cert_id or geometry is None:
+                stats["skipped"] += 1
+                continue
+
+            geom_obj = shape(geometry)
+            if geom_obj.is_empty or geom_obj.geom_type not in ("Polygon", "MultiPolygon"):
+                stats["skipped"] += 1
+                continue
+
+            stats["read"] += 1
+            yield "\t".join((
+                _copy_escape(cert_id),
+                _copy_escape(props.get(owner_field)),
+                "\\\\x" + geom_obj.wkb_hex,
+            )) + "\n"
+
+
+COPY_BATCH_LINES = 1000
+
+
+class _CopyStream:
+    """File-like adapter so psycopg2's copy_expert pulls lines lazily."""
+
+    def __init__(self, lines: Iterator[str]):
+        self._lines = lines
+        self._buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._lines)
+            except StopIteration:
+                break
+        if size < 0:
+            chunk, self._buffer = self._buffer, ""
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def _copy_from_lines(cur: Any, sql: str, lines: Iterator[str]) -> None:
+    """COPY ... FROM STDIN from a line iterator, with psycopg 3 or psycopg2."""
+    if hasattr(cur, "copy"):
+        # psycopg 3 (default driver, see database.sync_database_url)
+        with cur.copy(sql) as copy:
+            batch = []
+            for line in lines:
+                batch.append(line)
+                if len(batch) >= COPY_BATCH_LINES:
+                    copy.write("".join(batch))
+                    batch.clear()
+            if batch:
+                copy.write("".join(batch))
+    else:
+        # psycopg2 (postgresql+psycopg2:// URLs)
+        cur.copy_expert(sql, _CopyStream(lines))
+
+
+def _disable_statement_timeout(cur: Any) -> None:
+    """No statement_timeout for the rest of the current transaction.
+
+    The engine sets DB_STATEMENT_TIMEOUT_MS (connect options, or SET LOCAL
+    behind PgBouncer), which would cancel the COPY, upsert, index build and
+    ANALYZE of a national dump. SET LOCAL ends with the transaction, so the
+    pooled connection goes back with the API timeout intact.
+    """
+    cur.execute("SET LOCAL statement_timeout = 0")
+
+
+def load_sigef_dump(
+    path: str,
+    engine: Optional[Engine] = None,
+    layer: Optional[str] = None,
+    cert_field: str = DEFAULT_CERT_FIELD,
+    owner_field: str = DEFAULT_OWNER_FIELD,
+    rebuild_index: bool = True,
+) -> Dict[str, Any]:
+    """
+    Bulk load a SIGEF dump into sigef_certified.
+
+    Runs in a single transaction, so a failed load leaves the table untouched.
+    With rebuild_index=True the GiST index is dropped before the upsert and
+    recreated afterwards: much faster for national dumps, but DROP INDEX locks
+    sigef_certified against readers until commit. Use rebuild_index=False for
+    small incremental loads on a live table.
+
+    Args:
+        path: .shp, .zip (Shapefile) or .gpkg
+        engine: SQLAlchemy engine (default: database.engine)
+        layer: Layer name for multi-layer sources (GeoPackage)
+        cert_field: Attribute holding the SIGEF certificate/parcel code
+        owner_field: Attribute stored in sigef_certified.owner
+        rebuild_index: Drop and rebuild the GiST index around the upsert
+
+    Returns:
+        Dict with counts (read, skipped, upserted) and timings in seconds
+    """
+    if engine is None:
+        from database import engine
+
+    with fiona.open(_fiona_path(path), layer=layer) as src:
+        source_srid = _source_srid(src.crs)
+
+    stats: Dict[str, Any] = {"read": 0, "skipped": 0}
+    started = time.monotonic()
+
+    raw_conn = engine.raw_connection()
+    try:
+        cur = raw_conn.cursor()
+        _disable_statement_timeout(cur)
+
+        cur.execute("""
+            CREATE TEMP TABLE sigef_stage (
+                cert_id TEXT,
+                owner TEXT,
+                geom_wkb BYTEA
+            ) ON COMMIT DROP
+        """)
+
+        # 1. COPY the stream into staging
+        _copy_from_lines(
+            cur,
+            "COPY sigef_stage (cert_id, owner, geom_wkb) FROM STDIN",
+            iter_sigef_rows(path, layer, cert_field, owner_field, stats),
+        )
+        stats["copy_s"] = round(time.monotonic() - started, 2)
+        logger.info(f"SIGEF staging: {stats['read']} rows copied ({stats['skipped']} skipped)")
+
+        if rebuild_index:
+            cur.execute(f"DROP INDEX IF EXISTS {GIST_INDEX_NAME}")
+
+        # 2. Upsert on cert_id (last occurrence in the dump wins)
+        step = time.monotonic()
+        cur.execute("""
+            INSERT INTO sigef_certified (id, cert_id, owner, geom, updated_at)
+            SELECT
+                uuid_generate_v4(),
+                cert_id,
+                owner,
+                CASE
+                    WHEN ST_IsValid(geom) THEN ST_Multi(geom)
+                    ELSE ST_Multi(ST_CollectionExtract(ST_MakeValid(geom), 3))
+                END,
+                NOW()
+            FROM (
+                SELECT DISTINCT ON (cert_id)
+                    cert_id,
+                    owner,
+                    ST_Transform(ST_SetSRID(ST_GeomFromWKB(geom_wkb), %(srid)s), 4326) AS geom
+                FROM sigef_stage
+                ORDER BY cert_id, ctid DESC
+            ) staged
+            ON CONFLICT (cert_id) DO UPDATE SET
+                owner = EXCLUDED.owner,
+                geom = EXCLUDED.geom,
+                updated_at = EXCLUDED.updated_at
+        """, {"srid": source_srid})
+        stats["upserted"] = cur.rowcount
+        stats["upsert_s"] = round(time.monotonic() - step, 2)
+
+        # 3. Index and statistics
+        step = time.monotonic()
+        cur.execute(
+            f"CREATE INDEX IF NOT EXISTS {GIST_INDEX_NAME} "
+            "ON sigef_certified USING GIST (geom)"
+        )
+        stats["index_s"] = round(time.monotonic() - step, 2)
+
+        raw_conn.commit()
+
+        # ANALYZE outside the load transaction so the planner sees the new data
+        step = time.monotonic()
+        _disable_statement_timeout(cur)
+        cur.execute("ANALYZE sigef_certified")
+        raw_conn.commit()
+        stats["analyze_s"] = round(time.monotonic() - step, 2)
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+
+    stats["total_s"] = round(time.monotonic() - started, 2)
+    logger.info(f"SIGEF load finished: {stats}")
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk load INCRA/SIGEF certified parcels")
+    parser.add_argument("path", help="Shapefile (.shp/.zip) or GeoPackage (.gpkg)")
+    parser.add_argument("--layer", default=None, help="Layer name (GeoPackage)")
+    parser.add_argument("--cert-field", default=DEFAULT_CERT_FIELD)
+    parser.add_argument("--owner-field", default=DEFAULT_OWNER_FIELD)
+    parser.add_argument(
+        "--keep-index",
+        action="store_true",
+        help="Do not drop/rebuild the GiST index (small incremental loads)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stats = load_sigef_dump(
+        args.path,
+        layer=args.layer,
+        cert_field=args.cert_field,
+        owner_field=args.owner_field,
+        rebuild_index=not args.keep_index,
+    )
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
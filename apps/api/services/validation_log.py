@@ -0,0 +1,199 @@
+"""Validation audit log and memoization (validation_event).
+
+Every check run by validate_geometry_complete writes one validation_event
+row. Rows are keyed by a canonical hash of the cleaned geometry (plus the
+options that change the outcome) and by the revision of the project, so
+re-validating an unchanged geometry against an unchanged project returns
+the stored GeometryResponse without running the PostGIS pipeline again.
+"""
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import shapely
+from shapely.geometry import shape
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import ValidationEvent
+from schemas import GeometryResponse, ValidationResult
+
+logger = logging.getLogger(__name__)
+
+# Coordinates are snapped to this grid (degrees, ~0.1 mm) before hashing
+HASH_GRID_SIZE = 1e-9
+
+# Severity per check result
+_SEVERITY = {
+    ValidationResult.OK: "INFO",
+    ValidationResult.WARN: "WARN",
+    ValidationResult.FAIL: "ERROR",
+}
+
+
+def geometry_hash(
+    geom_dict: Dict[str, Any],
+    parcel_id: Optional[str] = None,
+    options: Tuple[Any, ...] = (),
+) -> str:
+    """SHA-256 of a canonical form of the geometry.
+
+    Ring orientation, starting vertex and part order do not change the hash
+    (shapely.normalize), nor do sub-millimetre coordinate differences. The
+    parcel being re-drawn and the check options are part of the key, since
+    they change which neighbors/gaps are reported.
+    """
+    geom = shapely.normalize(shapely.set_precision(shape(geom_dict), HASH_GRID_SIZE))
+    digest = hashlib.sha256(shapely.to_wkb(geom, hex=False, output_dimension=2))
+    digest.update(repr((str(parcel_id) if parcel_id else None,) + tuple(options)).encode())
+    return digest.hexdigest()
+
+
+PROJECT_REVISION_QUERY = text("""
+    SELECT
+        (SELECT geom_revision FROM project WHERE id = :project_id) AS geom_revision,
+        (SELECT MAX(updated_at) FROM sigef_certified) AS sigef_at
+""")
+
+
+def _revision(row: Any) -> str:
+    fingerprint = f"{row.geom_revision}|{row.sigef_at}"
+    return hashlib.sha256(fingerprint.encode()).hexdigest()[:32]
+
+
+def project_revision(db: Session, project_id: str) -> str:
+    """Fingerprint of everything a validation depends on besides the geometry.
+
+    project.geom_revision is bumped by a trigger on every insert/delete of a
+    parcel and on updates of its geometries or name (not on status/review
+    writes); a SIGEF reload moves MAX(updated_at). Both are O(1) reads.
+    """
+    row = db.execute(PROJECT_REVISION_QUERY, {"project_id": project_id}).first()
+    return _revision(row)
+
+
+async def lock_project_revision(db: AsyncSession, project_id: str) -> str:
+    """project_revision for a transaction that is about to write parcels.
+
+    Locks the project row first, so no other writer can bump geom_revision
+    until this transaction ends: the value read before the write and the
+    one read after it (project_revision_async) differ only by this
+    transaction's own writes.
+    """
+    await db.execute(
+        text("SELECT 1 FROM project WHERE id = :project_id FOR UPDATE"),
+        {"project_id": project_id},
+    )
+    return await project_revision_async(db, project_id)
+
+
+async def project_revision_async(db: AsyncSession, project_id: str) -> str:
+    row = (await db.execute(PROJECT_REVISION_QUERY, {"project_id": project_id})).first()
+    return _revision(row)
+
+
+def find_cached_response(
+    db: Session,
+    project_id: str,
+    geom_hash: str,
+    revision: str,
+) -> Optional[GeometryResponse]:
+    """Stored response of the latest run with the same key, if any."""
+    event = (
+        db.query(ValidationEvent)
+        .filter(
+            ValidationEvent.project_id == project_id,
+            ValidationEvent.geom_hash == geom_hash,
+            ValidationEvent.project_revision == revision,
+            ValidationEvent.response.isnot(None),
+        )
+        .order_by(ValidationEvent.checked_at.desc())
+        .first()
+    )
+    if event is None:
+        return None
+    return GeometryResponse.model_validate(event.response)
+
+
+def find_cached_responses(
+    db: Session,
+    project_id: str,
+    geom_hashes: List[str],
+    revision: str,
+) -> Dict[str, GeometryResponse]:
+    """find_cached_response for many keys in one query: { geom_hash: response }."""
+    if not geom_hashes:
+        return {}
+    events = (
+        db.query(ValidationEvent.geom_hash, ValidationEvent.response)
+        .filter(
+            ValidationEvent.project_id == project_id,
+            ValidationEvent.geom_hash.in_(set(geom_hashes)),
+            ValidationEvent.project_revision == revision,
+            ValidationEvent.response.isnot(None),
+        )
+        .order_by(ValidationEvent.checked_at.desc())
+        .all()
+    )
+    cached: Dict[str, GeometryResponse] = {}
+    for geom_hash, response in events:
+        if geom_hash not in cached:
+            cached[geom_hash] = GeometryResponse.model_validate(response)
+    return cached
+
+
+Checks = List[Tuple[str, ValidationResult, Optional[Dict[str, Any]]]]
+
+
+def record_validation(
+    db: Session,
+    project_id: str,
+    parcel_id: Optional[str],
+    geom_hash: Optional[str],
+    revision: Optional[str],
+    checks: Checks,
+    response: GeometryResponse,
+) -> None:
+    """Write one audit row per check; the first row also stores the response.
+
+    Without geom_hash/revision the rows are audit-only and never served
+    from the memo. The rows are flushed, not committed: they are persisted
+    with the caller's commit. Audit failures are logged and never fail the
+    validation.
+    """
+    record_validations(db, project_id, revision, [(parcel_id, geom_hash, checks, response)])
+
+
+def record_validations(
+    db: Session,
+    project_id: str,
+    revision: Optional[str],
+    runs: List[Tuple[Optional[str], Optional[str], Checks, GeometryResponse]],
+) -> None:
+    """record_validation for many runs, (parcel_id, geom_hash, checks,
+    response) each, in a single SAVEPOINT (validate_geometries_batch)."""
+    runs = [run for run in runs if run[2]]
+    if not settings.VALIDATION_LOG_ENABLED or not runs:
+        return
+    try:
+        # SAVEPOINT: a failed insert is undone here without touching the
+        # caller's transaction; committing the rows is left to the caller
+        with db.begin_nested():
+            for parcel_id, geom_hash, checks, response in runs:
+                stored = response.model_dump(mode="json") if geom_hash and revision else None
+                for i, (check_type, result, details) in enumerate(checks):
+                    db.add(ValidationEvent(
+                        project_id=project_id,
+                        parcel_id=parcel_id,
+                        type=check_type,
+                        result=result.value,
+                        severity=_SEVERITY[result],
+                        details=details,
+                        geom_hash=geom_hash,
+                        project_revision=revision,
+                        response=stored if i == 0 else None,
+                    ))
+    except Exception as e:
+        logger.warning(f"Could not record validation events: {e}")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: routers/parcels.detect_overlaps para um lote com 50 vizinhos.
+
+Compara a implementação antiga (1 consulta de vizinhos + 3 consultas escalares
+por vizinho: st_intersects, st_intersection, st_area) com a consulta única
+atual. Os dados são criados numa transação que é desfeita no final.
+
+Uso (a partir da raiz do repositório):
+    DATABASE_URL=postgresql://... python database/bench/detect_overlaps_50.py [--neighbors 50] [--runs 20]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "apps", "api"))
+
+from geoalchemy2.shape import from_shape  # noqa: E402
+from shapely.geometry import MultiPolygon, box  # noqa: E402
+from sqlalchemy import and_, func  # noqa: E402
+
+from database import AsyncSessionLocal  # noqa: E402
+from models import Parcel, Project, Tenant  # noqa: E402
+from routers.parcels import detect_overlaps  # noqa: E402
+
+
+def detect_overlaps_legacy(db, parcel):
+    """Implementação anterior (N+1), com o st_area em geography corrigido."""
+    overlaps = []
+    geom = parcel.geom_official if parcel.geom_official is not None else parcel.geom_client_sketch
+    neighbors = db.query(Parcel).filter(
+        and_(
+            Parcel.project_id == parcel.project_id,
+            Parcel.id != parcel.id,
+            func.st_intersects(func.coalesce(Parcel.geom_official, Parcel.geom_client_sketch), geom),
+        )
+    ).all()
+    for neighbor in neighbors:
+        neighbor_geom = neighbor.geom_official if neighbor.geom_official is not None else neighbor.geom_client_sketch
+        if db.query(func.st_intersects(geom, neighbor_geom)).scalar():
+            overlap_geom = db.query(func.st_intersection(geom, neighbor_geom)).scalar()
+            overlap_area = db.query(func.st_area(func.geography(overlap_geom))).scalar() or 0
+            overlaps.append({
+                "parcel_id": str(neighbor.id),
+                "parcel_name": neighbor.name,
+                "overlap_area_m2": round(overlap_area, 2),
+            })
+    return overlaps
+
+
+def seed(db, n_neighbors):
+    """Lote central de ~1 km com n vizinhos em anel, todos sobrepostos a ele."""
+    tenant = Tenant(name="bench", slug=f"bench-{uuid.uuid4().hex[:8]}")
+    db.add(tenant)
+    db.flush()
+    project = Project(tenant_id=tenant.id, name="bench detect_overlaps")
+    db.add(project)
+    db.flush()
+
+    x0, y0, size = -47.9, -15.8, 0.01
+    target = Parcel(
+        project_id=project.id,
+        name="alvo",
+        geom_official=from_shape(MultiPolygon([box(x0, y0, x0 + size, y0 + size)]), srid=4326),
+    )
+    db.add(target)
+
+    step = size / (n_neighbors / 4)
+    for i in range(n_neighbors):
+        side, k = divmod(i, n_neighbors // 4 or 1)
+        offset = k * step
+        # Vizinhos ao longo dos 4 lados, invadindo 10% do lote central
+        if side == 0:
+            b = box(x0 + offset, y0 - step, x0 + offset + step, y0 + size * 0.1)
+        elif side == 1:
+            b = box(x0 + size * 0.9, y0 + offset, x0 + size + step, y0 + offset + step)
+        elif side == 2:
+            b = box(x0 + offset, y0 + size * 0.9, x0 + offset + step, y0 + size + step)
+        else:
+            b = box(x0 - step, y0 + offset, x0 + size * 0.1, y0 + offset + step)
+        db.add(Parcel(
+            project_id=project.id,
+            name=f"vizinho {i}",
+            geom_client_sketch=from_shape(MultiPolygon([b]), srid=4326),
+        ))
+    db.flush()
+    return target
+
+
+async def timed(fn, runs):
+    samples = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, samples
+
+
+async def run(args):
+    # Tudo na mesma sessão: o legado (síncrono) roda via run_sync
+    async with AsyncSessionLocal() as db:
+        try:
+            target = await db.run_sync(lambda session: seed(session, args.neighbors))
+
+            legacy, legacy_ms = await timed(
+                lambda: db.run_sync(lambda session: detect_overlaps_legacy(session, target)),
+                args.runs,
+            )
+            current, current_ms = await timed(lambda: detect_overlaps(db, target), args.runs)
+
+            print(f"Vizinhos: {args.neighbors}  Execuções: {args.runs}")
+            for label, found, samples in (
+                ("antes  (N+1)", legacy, legacy_ms),
+                ("depois (1 consulta)", current, current_ms),
+            ):
+                print(
+                    f"{label:<22} sobreposições={len(found):<4} "
+                    f"mediana={statistics.median(samples):8.1f} ms  "
+                    f"p95={sorted(samples)[int(len(samples) * 0.95) - 1]:8.1f} ms"
+                )
+        finally:
+            await db.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--neighbors", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
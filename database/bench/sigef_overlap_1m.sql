@@ -0,0 +1,79 @@
+-- Benchmark: check_sigef_overlap (services/geo.py) contra 1M certificados SIGEF
+-- Compara a consulta antiga (WKT parseado 2x, cast geography por linha, LIMIT 1)
+-- com a nova (WKB parseado 1x, prefiltro bbox no GiST, ranking por área).
+--
+-- Uso: psql "$DATABASE_URL" -f database/bench/sigef_overlap_1m.sql
+-- Roda num schema próprio (bench) e não toca em public.sigef_certified.
+
+\timing on
+SET client_min_messages = warning;
+
+CREATE SCHEMA IF NOT EXISTS bench;
+DROP TABLE IF EXISTS bench.sigef_certified;
+CREATE TABLE bench.sigef_certified (
+  id SERIAL PRIMARY KEY,
+  geom GEOMETRY(MULTIPOLYGON, 4326) NOT NULL,
+  owner VARCHAR(255),
+  cert_id VARCHAR(255) UNIQUE NOT NULL
+);
+
+-- 1M quadrados de ~200-800 m espalhados numa faixa de ~3°x3° (densidade de
+-- um estado agrícola), com sementes fixas para resultados reproduzíveis
+SELECT setseed(0.42);
+INSERT INTO bench.sigef_certified (geom, owner, cert_id)
+SELECT
+  ST_Multi(ST_MakeEnvelope(x, y, x + s, y + s, 4326)),
+  'Proprietario ' || g,
+  'SIGEF-' || g
+FROM (
+  SELECT
+    g,
+    -50.0 + random() * 3.0 AS x,
+    -23.0 + random() * 3.0 AS y,
+    0.002 + random() * 0.006 AS s
+  FROM generate_series(1, 1000000) AS g
+) t;
+
+CREATE INDEX idx_bench_sigef_geom ON bench.sigef_certified USING GIST (geom);
+ANALYZE bench.sigef_certified;
+
+-- Parcela candidata (~1 km²) no meio da área
+\set wkt 'POLYGON((-48.51 -21.51, -48.51 -21.50, -48.50 -21.50, -48.50 -21.51, -48.51 -21.51))'
+
+-- Aquecer cache
+SELECT count(*) FROM bench.sigef_certified WHERE geom && ST_GeomFromText(:'wkt', 4326);
+
+\echo '=== Antes: ST_GeomFromText 2x, geography por linha, LIMIT 1 ==='
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT
+  ST_Area(ST_Intersection(
+    ST_GeomFromText(:'wkt', 4326)::geography,
+    s.geom::geography
+  )) AS overlap_area,
+  s.owner
+FROM bench.sigef_certified s
+WHERE ST_Intersects(ST_GeomFromText(:'wkt', 4326), s.geom)
+LIMIT 1;
+
+\echo '=== Depois: WKB 1x, prefiltro bbox, todas as sobreposições ranqueadas ==='
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+WITH input AS (
+  SELECT ST_GeomFromWKB(ST_AsBinary(ST_GeomFromText(:'wkt', 4326)), 4326) AS geom
+),
+hits AS (
+  SELECT
+    s.cert_id,
+    s.owner,
+    ST_Area(ST_Intersection(i.geom, s.geom)::geography) AS overlap_area
+  FROM input i
+  JOIN bench.sigef_certified s
+    ON s.geom && i.geom
+    AND ST_Intersects(i.geom, s.geom)
+)
+SELECT cert_id, owner, overlap_area
+FROM hits
+WHERE overlap_area > 0
+ORDER BY overlap_area DESC
+LIMIT 20;
+
+-- Limpeza: DROP SCHEMA bench CASCADE;
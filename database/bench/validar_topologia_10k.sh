@@ -0,0 +1,51 @@
+#!/usr/bin/env bash
+# Benchmark pgbench de validar_topologia_sql / validar_topologia_lotes sobre
+# os 10k lotes de bench.lotes (prepare antes com validar_topologia_10k.sql).
+#
+# Uso (a partir da raiz do repositório):
+#   psql "$DATABASE_URL" -f database/bench/validar_topologia_10k.sql
+#   database/bench/validar_topologia_10k.sh "$DATABASE_URL" [segundos] [clientes]
+#
+# Cenários (lote sorteado entre os 10k a cada transação):
+#   legado  versão anterior, um lote por chamada
+#   novo    validar_topologia_sql, um lote por chamada
+#   wkt     validar_topologia_sql com geometria nova (WKT) deslocada sobre os vizinhos
+#   lote50  validar_topologia_lotes com 50 ids numa chamada (tps x 50 = lotes/s)
+set -euo pipefail
+
+URL="${1:?uso: $0 DATABASE_URL [segundos] [clientes]}"
+DURATION="${2:-30}"
+CLIENTS="${3:-4}"
+
+SCRIPTS="$(mktemp -d)"
+trap 'rm -rf "$SCRIPTS"' EXIT
+
+cat > "$SCRIPTS/legado.sql" <<'EOF'
+\set id random(1, 10000)
+SELECT bench.validar_topologia_legado(:id);
+EOF
+
+cat > "$SCRIPTS/novo.sql" <<'EOF'
+\set id random(1, 10000)
+SELECT validar_topologia_sql(:id);
+EOF
+
+cat > "$SCRIPTS/wkt.sql" <<'EOF'
+\set id random(1, 10000)
+SELECT validar_topologia_sql(id, ST_AsText(ST_Translate(geom, 0.0004, 0.0004)))
+FROM bench.lotes WHERE id = :id;
+EOF
+
+cat > "$SCRIPTS/lote50.sql" <<'EOF'
+\set id random(1, 9951)
+SELECT count(*) FROM validar_topologia_lotes(ARRAY(SELECT generate_series(:id, :id + 49)));
+EOF
+
+# Funções de public lendo bench.lotes
+export PGOPTIONS="-c search_path=bench,public"
+
+for scenario in legado novo wkt lote50; do
+  echo "=== $scenario ==="
+  pgbench "$URL" -n -f "$SCRIPTS/$scenario.sql" -T "$DURATION" -c "$CLIENTS" -j "$CLIENTS" \
+    | grep -E "^(latency average|tps)"
+done
@@ -0,0 +1,123 @@
+-- Benchmark: validar_topologia_sql (02_extensions.sql) com 10k lotes
+-- Prepara o schema bench: 100 projetos x 100 lotes (grade 10x10 de ~4,5 ha
+-- com bordas sobrepostas, ~8 vizinhos que se tocam por lote) e a versão
+-- antiga da função (interseção calculada 2x e área do lote recalculada por
+-- vizinho) para comparação. Não toca em public.lotes.
+--
+-- Uso (a partir da raiz do repositório):
+--   psql "$DATABASE_URL" -f database/bench/validar_topologia_10k.sql
+--   database/bench/validar_topologia_10k.sh "$DATABASE_URL"
+--
+-- As funções de public resolvem "lotes" pelo search_path: com
+-- search_path=bench,public (PGOPTIONS no .sh) elas leem bench.lotes.
+
+SET client_min_messages = warning;
+
+CREATE SCHEMA IF NOT EXISTS bench;
+DROP TABLE IF EXISTS bench.lotes;
+CREATE TABLE bench.lotes (
+  id SERIAL PRIMARY KEY,
+  projeto_id INTEGER NOT NULL,
+  nome_cliente VARCHAR(150),
+  geom GEOMETRY(POLYGON, 4674),
+  area_ha NUMERIC(10, 4)
+);
+
+-- Célula de 0,002° (~210 m) e lado de 0,00206° + jitter: faixas de
+-- sobreposição de ~1-6% com os vizinhos (SOBREPOSICAO_LEVE e _CRITICA).
+-- Projetos lado a lado (sem sobreposição entre projetos). Semente fixa.
+SELECT setseed(0.42);
+INSERT INTO bench.lotes (projeto_id, nome_cliente, geom)
+SELECT
+  p,
+  'Cliente ' || p || '-' || c,
+  ST_MakeEnvelope(x, y, x + s, y + s, 4674)
+FROM (
+  SELECT
+    p, c,
+    -48.0 + (p % 10) * 0.03 + (c % 10) * 0.002 AS x,
+    -16.0 + (p / 10) * 0.03 + (c / 10) * 0.002 AS y,
+    0.00206 + random() * 0.00008 AS s
+  FROM generate_series(0, 99) AS p, generate_series(0, 99) AS c
+) t;
+
+UPDATE bench.lotes SET area_ha = ST_Area(geom::geography) / 10000.0;
+
+CREATE INDEX idx_bench_lotes_geom ON bench.lotes USING GIST (geom);
+CREATE INDEX idx_bench_lotes_projeto ON bench.lotes(projeto_id);
+ANALYZE bench.lotes;
+
+-- Versão anterior de validar_topologia_sql (só as sobreposições diferem)
+CREATE OR REPLACE FUNCTION bench.validar_topologia_legado(
+  p_lote_id INTEGER,
+  p_geom_wkt TEXT DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+  v_geom GEOMETRY;
+  v_projeto_id INTEGER;
+  v_area_ha NUMERIC;
+  v_erros JSONB := '[]'::JSONB;
+  v_avisos JSONB := '[]'::JSONB;
+  r RECORD;
+BEGIN
+  IF p_geom_wkt IS NOT NULL AND LENGTH(TRIM(p_geom_wkt)) > 0 THEN
+    v_geom := ST_GeomFromText(p_geom_wkt, 4674);
+    SELECT projeto_id INTO v_projeto_id FROM lotes WHERE id = p_lote_id;
+  ELSE
+    SELECT geom, projeto_id INTO v_geom, v_projeto_id FROM lotes WHERE id = p_lote_id;
+    IF v_geom IS NULL THEN
+      RETURN jsonb_build_object('valido', false, 'erros', jsonb_build_array(jsonb_build_object('tipo', 'GEOMETRIA_VAZIA', 'mensagem', 'Lote sem geometria')), 'avisos', v_avisos);
+    END IF;
+  END IF;
+
+  v_area_ha := ST_Area(v_geom::geography) / 10000.0;
+
+  IF NOT ST_IsValid(v_geom) THEN
+    v_erros := v_erros || jsonb_build_object('tipo', 'GEOMETRIA_INVALIDA', 'mensagem', 'Geometria inválida: ' || ST_IsValidReason(v_geom));
+  END IF;
+
+  IF v_area_ha < 0.01 THEN
+    v_erros := v_erros || jsonb_build_object('tipo', 'AREA_MINIMA', 'mensagem', 'Área abaixo do mínimo (0.01 ha)');
+  ELSIF v_area_ha > 1000 THEN
+    v_erros := v_erros || jsonb_build_object('tipo', 'AREA_MAXIMA', 'mensagem', 'Área acima do máximo (1000 ha)');
+  END IF;
+
+  FOR r IN
+    SELECT l2.id, l2.nome_cliente,
+      (ST_Area(ST_Intersection(v_geom, l2.geom)::geography) / 10000.0) AS area_sobrep,
+      ((ST_Area(ST_Intersection(v_geom, l2.geom)::geography) / NULLIF(ST_Area(v_geom::geography), 0)) * 100) AS perc
+    FROM lotes l2
+    WHERE l2.projeto_id = v_projeto_id
+      AND l2.id != p_lote_id
+      AND l2.geom IS NOT NULL
+      AND ST_Intersects(v_geom, l2.geom)
+  LOOP
+    IF r.perc > 5.0 THEN
+      v_erros := v_erros || jsonb_build_object('tipo', 'SOBREPOSICAO_CRITICA', 'mensagem', 'Sobreposição de ' || ROUND(r.area_sobrep::numeric, 4) || ' ha (' || ROUND(r.perc::numeric, 2) || '%) com ' || COALESCE(r.nome_cliente, 'lote ' || r.id), 'lote_id', r.id);
+    ELSIF r.perc > 0.1 THEN
+      v_avisos := v_avisos || jsonb_build_object('tipo', 'SOBREPOSICAO_LEVE', 'mensagem', 'Sobreposição de ' || ROUND(r.area_sobrep::numeric, 4) || ' ha com ' || COALESCE(r.nome_cliente, 'lote ' || r.id), 'lote_id', r.id);
+    END IF;
+  END LOOP;
+
+  RETURN jsonb_build_object(
+    'valido', (jsonb_array_length(v_erros) = 0),
+    'erros', v_erros,
+    'avisos', v_avisos
+  );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Conferência: mesmas mensagens nas duas versões (ordem à parte)
+SET search_path = bench, public;
+SELECT count(*) AS divergentes
+FROM generate_series(1, 10000, 37) AS id
+WHERE (
+  SELECT jsonb_agg(e ORDER BY e::TEXT)
+  FROM jsonb_array_elements((validar_topologia_sql(id)->'erros') || (validar_topologia_sql(id)->'avisos')) e
+) IS DISTINCT FROM (
+  SELECT jsonb_agg(e ORDER BY e::TEXT)
+  FROM jsonb_array_elements((bench.validar_topologia_legado(id)->'erros') || (bench.validar_topologia_legado(id)->'avisos')) e
+);
+
+-- Limpeza: DROP SCHEMA bench CASCADE;
@@ -49,64 +49,111 @@ RETURNS TABLE (
 $$ LANGUAGE sql STABLE;
 
 -- 4b. Sobreposições por projeto (para Dashboard)
-CREATE OR REPLACE FUNCTION detectar_sobreposicoes_projeto(p_projeto_id INTEGER)
+-- Motor único: pares de lotes do projeto cujos INTERIORES se cruzam (lotes
+-- que só tocam a divisa não entram), com a interseção calculada uma única
+-- vez por par e descartada abaixo de p_area_min_m2.
+--   && ............ filtro por bbox (índice GiST idx_lotes_geom)
+--   ST_Intersects . teste exato barato (geometria preparada)
+--   ST_Relate ..... 'T********': interior ∩ interior não vazio
+CREATE OR REPLACE FUNCTION sobreposicoes_projeto_pares(
+  p_projeto_id INTEGER,
+  p_area_min_m2 DOUBLE PRECISION DEFAULT 0
+)
 RETURNS TABLE (
   lote1_id INTEGER,
   lote2_id INTEGER,
   nome_cliente1 VARCHAR,
   nome_cliente2 VARCHAR,
-  area_sobreposta_ha NUMERIC
+  area_m2 DOUBLE PRECISION,
+  geom GEOMETRY
 ) AS $$
-  SELECT 
+  SELECT
     l1.id::INTEGER,
     l2.id::INTEGER,
     l1.nome_cliente,
     l2.nome_cliente,
-    (ST_Area(ST_Intersection(l1.geom, l2.geom)::geography) / 10000.0)::NUMERIC
-  FROM lotes l1, lotes l2
+    x.area_m2,
+    x.geom
+  FROM lotes l1
+  JOIN lotes l2
+    ON l2.projeto_id = l1.projeto_id
+   AND l1.id < l2.id
+   AND l1.geom && l2.geom
+   AND ST_Intersects(l1.geom, l2.geom)
+   AND ST_Relate(l1.geom, l2.geom, 'T********')
+  CROSS JOIN LATERAL (
+    -- OFFSET 0 impede o planner de "achatar" a subconsulta e repetir o
+    -- ST_Intersection em cada referência a x.geom
+    SELECT i.geom, ST_Area(i.geom::geography) AS area_m2
+    FROM (
+      SELECT ST_CollectionExtract(ST_Intersection(l1.geom, l2.geom), 3) AS geom
+      OFFSET 0
+    ) i
+  ) x
   WHERE l1.projeto_id = p_projeto_id
-    AND l2.projeto_id = p_projeto_id
-    AND l1.id < l2.id
     AND l1.geom IS NOT NULL
     AND l2.geom IS NOT NULL
-    AND ST_Intersects(l1.geom, l2.geom);
+    AND NOT ST_IsEmpty(x.geom)
+    AND x.area_m2 > p_area_min_m2;
 $$ LANGUAGE sql STABLE;
 
--- 5. Função: Validar topologia (retorna JSON)
-CREATE OR REPLACE FUNCTION validar_topologia_sql(
+-- Assinatura antiga (só p_projeto_id) ficaria ambígua com o DEFAULT
+DROP FUNCTION IF EXISTS detectar_sobreposicoes_projeto(INTEGER);
+CREATE OR REPLACE FUNCTION detectar_sobreposicoes_projeto(
+  p_projeto_id INTEGER,
+  p_area_min_m2 DOUBLE PRECISION DEFAULT 0
+)
+RETURNS TABLE (
+  lote1_id INTEGER,
+  lote2_id INTEGER,
+  nome_cliente1 VARCHAR,
+  nome_cliente2 VARCHAR,
+  area_sobreposta_ha NUMERIC
+) AS $$
+  SELECT p.lote1_id, p.lote2_id, p.nome_cliente1, p.nome_cliente2,
+    (p.area_m2 / 10000.0)::NUMERIC
+  FROM sobreposicoes_projeto_pares(p_projeto_id, p_area_min_m2) p
+  ORDER BY p.area_m2 DESC;
+$$ LANGUAGE sql STABLE;
+
+-- 4c. A FeatureCollection do projeto é lida da tabela lote_overlaps
+-- (lote_overlaps_geojson, 06_lote_overlaps.sql); a versão que recalculava
+-- as interseções foi removida para não haver duas definições do formato
+DROP FUNCTION IF EXISTS sobreposicoes_projeto_geojson(INTEGER, DOUBLE PRECISION);
+
+-- 5. Funções: Validar topologia (retorna JSON)
+-- 5a. Núcleo: valida uma geometria contra os demais lotes do projeto.
+-- Área do lote calculada uma vez (reaproveitada no percentual de cada vizinho);
+-- cada interseção calculada uma única vez via LATERAL (OFFSET 0 impede o
+-- planejador de duplicar a expressão nas duas colunas que a usam).
+CREATE OR REPLACE FUNCTION validar_topologia_geom(
   p_lote_id INTEGER,
-  p_geom_wkt TEXT DEFAULT NULL
+  p_projeto_id INTEGER,
+  p_geom GEOMETRY
 )
 RETURNS JSONB AS $$
 DECLARE
-  v_geom GEOMETRY;
-  v_projeto_id INTEGER;
+  v_area_m2 DOUBLE PRECISION;
   v_area_ha NUMERIC;
   v_valida BOOLEAN;
-  v_motivo TEXT;
   v_erros JSONB := '[]'::JSONB;
   v_avisos JSONB := '[]'::JSONB;
-  r RECORD;
+  v_sobrep_erros JSONB;
+  v_sobrep_avisos JSONB;
 BEGIN
-  -- Obter geometria: nova ou existente
-  IF p_geom_wkt IS NOT NULL AND LENGTH(TRIM(p_geom_wkt)) > 0 THEN
-    v_geom := ST_GeomFromText(p_geom_wkt, 4674);
-    SELECT projeto_id INTO v_projeto_id FROM lotes WHERE id = p_lote_id;
-  ELSE
-    SELECT geom, projeto_id INTO v_geom, v_projeto_id FROM lotes WHERE id = p_lote_id;
-    IF v_geom IS NULL THEN
-      RETURN jsonb_build_object('valido', false, 'erros', jsonb_build_array(jsonb_build_object('tipo', 'GEOMETRIA_VAZIA', 'mensagem', 'Lote sem geometria')), 'avisos', v_avisos);
-    END IF;
+  IF p_geom IS NULL OR ST_IsEmpty(p_geom) THEN
+    RETURN jsonb_build_object('valido', false, 'erros', jsonb_build_array(jsonb_build_object('tipo', 'GEOMETRIA_VAZIA', 'mensagem', 'Lote sem geometria')), 'avisos', v_avisos);
   END IF;
 
-  -- Área
-  v_area_ha := ST_Area(v_geom::geography) / 10000.0;
+  -- Área (uma vez)
+  v_area_m2 := ST_Area(p_geom::geography);
+  v_area_ha := v_area_m2 / 10000.0;
 
-  -- 1. Geometria válida
-  v_valida := ST_IsValid(v_geom);
+  -- 1. Geometria válida. Inválida: não calcula interseções (GEOS pode
+  -- falhar com TopologyException e o lote já está reprovado).
+  v_valida := ST_IsValid(p_geom);
   IF NOT v_valida THEN
-    v_motivo := ST_IsValidReason(v_geom);
-    v_erros := v_erros || jsonb_build_object('tipo', 'GEOMETRIA_INVALIDA', 'mensagem', 'Geometria inválida: ' || v_motivo);
+    v_erros := v_erros || jsonb_build_object('tipo', 'GEOMETRIA_INVALIDA', 'mensagem', 'Geometria inválida: ' || ST_IsValidReason(p_geom));
   END IF;
 
   -- 2. Área mínima/máxima
@@ -116,23 +163,39 @@ BEGIN
     v_erros := v_erros || jsonb_build_object('tipo', 'AREA_MAXIMA', 'mensagem', 'Área acima do máximo (1000 ha)');
   END IF;
 
-  -- 3. Sobreposições
-  FOR r IN
+  IF NOT v_valida THEN
+    RETURN jsonb_build_object('valido', false, 'erros', v_erros, 'avisos', v_avisos);
+  END IF;
+
+  -- 3. Sobreposições (maiores primeiro)
+  SELECT
+    COALESCE(jsonb_agg(
+      jsonb_build_object('tipo', 'SOBREPOSICAO_CRITICA', 'mensagem', 'Sobreposição de ' || ROUND(s.area_sobrep::numeric, 4) || ' ha (' || ROUND(s.perc::numeric, 2) || '%) com ' || COALESCE(s.nome_cliente, 'lote ' || s.id), 'lote_id', s.id)
+      ORDER BY s.perc DESC
+    ) FILTER (WHERE s.perc > 5.0), '[]'::JSONB),
+    COALESCE(jsonb_agg(
+      jsonb_build_object('tipo', 'SOBREPOSICAO_LEVE', 'mensagem', 'Sobreposição de ' || ROUND(s.area_sobrep::numeric, 4) || ' ha com ' || COALESCE(s.nome_cliente, 'lote ' || s.id), 'lote_id', s.id)
+      ORDER BY s.perc DESC
+    ) FILTER (WHERE s.perc > 0.1 AND s.perc <= 5.0), '[]'::JSONB)
+  INTO v_sobrep_erros, v_sobrep_avisos
+  FROM (
     SELECT l2.id, l2.nome_cliente,
-      (ST_Area(ST_Intersection(v_geom, l2.geom)::geography) / 10000.0) AS area_sobrep,
-      ((ST_Area(ST_Intersection(v_geom, l2.geom)::geography) / NULLIF(ST_Area(v_geom::geography), 0)) * 100) AS perc
+      x.area_m2 / 10000.0 AS area_sobrep,
+      x.area_m2 / NULLIF(v_area_m2, 0) * 100 AS perc
     FROM lotes l2
-    WHERE l2.projeto_id = v_projeto_id
-      AND l2.id != p_lote_id
+    CROSS JOIN LATERAL (
+      SELECT ST_Area(ST_Intersection(p_geom, l2.geom)::geography) AS area_m2
+      OFFSET 0
+    ) x
+    WHERE l2.projeto_id = p_projeto_id
+      AND l2.id IS DISTINCT FROM p_lote_id
       AND l2.geom IS NOT NULL
-      AND ST_Intersects(v_geom, l2.geom)
-  LOOP
-    IF r.perc > 5.0 THEN
-      v_erros := v_erros || jsonb_build_object('tipo', 'SOBREPOSICAO_CRITICA', 'mensagem', 'Sobreposição de ' || ROUND(r.area_sobrep::numeric, 4) || ' ha (' || ROUND(r.perc::numeric, 2) || '%) com ' || COALESCE(r.nome_cliente, 'lote ' || r.id), 'lote_id', r.id);
-    ELSIF r.perc > 0.1 THEN
-      v_avisos := v_avisos || jsonb_build_object('tipo', 'SOBREPOSICAO_LEVE', 'mensagem', 'Sobreposição de ' || ROUND(r.area_sobrep::numeric, 4) || ' ha com ' || COALESCE(r.nome_cliente, 'lote ' || r.id), 'lote_id', r.id);
-    END IF;
-  END LOOP;
+      AND l2.geom && p_geom
+      AND ST_Intersects(p_geom, l2.geom)
+  ) s;
+
+  v_erros := v_erros || v_sobrep_erros;
+  v_avisos := v_avisos || v_sobrep_avisos;
 
   RETURN jsonb_build_object(
     'valido', (jsonb_array_length(v_erros) = 0),
@@ -140,4 +203,55 @@ BEGIN
     'avisos', v_avisos
   );
 END;
-$$ LANGUAGE plpgsql;
+$$ LANGUAGE plpgsql STABLE;
+
+-- 5b. Lote: valida vários lotes numa chamada (uma leitura de lotes para todos).
+-- p_geoms_wkt (opcional, pareado por posição com p_lote_ids): WKT a validar no
+-- lugar da geometria gravada; NULL ou vazio usa a gravada. Para desenhos ainda
+-- não salvos, passe lote_id NULL e o projeto em p_projeto_id.
+-- WKT inválido vira erro GEOMETRIA_INVALIDA no item, sem abortar o lote.
+CREATE OR REPLACE FUNCTION validar_topologia_lotes(
+  p_lote_ids INTEGER[],
+  p_geoms_wkt TEXT[] DEFAULT NULL,
+  p_projeto_id INTEGER DEFAULT NULL
+)
+RETURNS TABLE (indice INTEGER, lote_id INTEGER, resultado JSONB) AS $$
+DECLARE
+  r RECORD;
+  v_geom GEOMETRY;
+BEGIN
+  FOR r IN
+    SELECT i.ord::INTEGER AS ord, i.id, NULLIF(TRIM(i.wkt), '') AS wkt,
+      COALESCE(l.projeto_id, p_projeto_id) AS projeto_id, l.geom
+    FROM unnest(COALESCE(p_lote_ids, '{}'::INTEGER[]), COALESCE(p_geoms_wkt, '{}'::TEXT[]))
+      WITH ORDINALITY AS i(id, wkt, ord)
+    LEFT JOIN lotes l ON l.id = i.id
+    ORDER BY i.ord
+  LOOP
+    indice := r.ord;
+    lote_id := r.id;
+    IF r.wkt IS NULL THEN
+      v_geom := r.geom;
+    ELSE
+      BEGIN
+        v_geom := ST_GeomFromText(r.wkt, 4674);
+      EXCEPTION WHEN OTHERS THEN
+        resultado := jsonb_build_object('valido', false, 'erros', jsonb_build_array(jsonb_build_object('tipo', 'GEOMETRIA_INVALIDA', 'mensagem', 'WKT inválido: ' || SQLERRM)), 'avisos', '[]'::JSONB);
+        RETURN NEXT;
+        CONTINUE;
+      END;
+    END IF;
+    resultado := validar_topologia_geom(r.id, r.projeto_id, v_geom);
+    RETURN NEXT;
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- 5c. Um lote (geometria gravada ou p_geom_wkt); usada pela API
+CREATE OR REPLACE FUNCTION validar_topologia_sql(
+  p_lote_id INTEGER,
+  p_geom_wkt TEXT DEFAULT NULL
+)
+RETURNS JSONB AS $$
+  SELECT v.resultado FROM validar_topologia_lotes(ARRAY[p_lote_id], ARRAY[p_geom_wkt]) v;
+$$ LANGUAGE sql STABLE;
@@ -8,6 +8,11 @@ ALTER TABLE projetos ADD COLUMN IF NOT EXISTS tenant_id UUID;
 UPDATE projetos SET tenant_id = topografo_id WHERE tenant_id IS NULL AND topografo_id IS NOT NULL;
 -- Índice para filtros por tenant
 CREATE INDEX IF NOT EXISTS idx_projetos_tenant ON projetos(tenant_id);
+-- Chaves estrangeiras usadas nos joins de escopo (embed !inner da API e
+-- subconsultas das políticas RLS abaixo)
+CREATE INDEX IF NOT EXISTS idx_lotes_projeto ON lotes(projeto_id);
+CREATE INDEX IF NOT EXISTS idx_lotes_email_cliente ON lotes(email_cliente);
+CREATE INDEX IF NOT EXISTS idx_pagamentos_lote ON pagamentos(lote_id);
 
 -- 2. Perfis: vincular user_id a auth.users (Supabase)
 ALTER TABLE perfis DROP CONSTRAINT IF EXISTS perfis_user_id_fkey;
@@ -0,0 +1,209 @@
+-- Extensao 6: Sobreposicoes materializadas entre lotes (lote_overlaps)
+-- Mantida por trigger em lotes.geom: a cada escrita so os pares que envolvem
+-- o lote alterado sao recalculados. As leituras da API (/api/lotes/{id}/
+-- sobreposicoes e /api/projetos/{id}/sobreposicoes) viram consultas por indice.
+
+-- 1. Tabela: um registro por direcao (lote -> vizinho), para que a leitura
+-- por lote seja uma unica varredura de indice e o percentual seja sempre
+-- relativo a area de lote_id. Pares so com toque na divisa nao entram.
+CREATE TABLE IF NOT EXISTS lote_overlaps (
+  lote_id INTEGER NOT NULL REFERENCES lotes(id) ON DELETE CASCADE,
+  vizinho_id INTEGER NOT NULL REFERENCES lotes(id) ON DELETE CASCADE,
+  projeto_id INTEGER NOT NULL REFERENCES projetos(id) ON DELETE CASCADE,
+  area_m2 DOUBLE PRECISION NOT NULL,
+  percentual DOUBLE PRECISION, -- area_m2 / area de lote_id * 100
+  geom GEOMETRY(MULTIPOLYGON, 4674) NOT NULL,
+  -- Uma das duas direcoes de cada par (listagem por projeto via PostgREST,
+  -- que nao compara colunas entre si)
+  principal BOOLEAN GENERATED ALWAYS AS (lote_id < vizinho_id) STORED,
+  atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (lote_id, vizinho_id),
+  CHECK (lote_id <> vizinho_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_lote_overlaps_vizinho ON lote_overlaps(vizinho_id);
+CREATE INDEX IF NOT EXISTS idx_lote_overlaps_projeto ON lote_overlaps(projeto_id, area_m2 DESC)
+  WHERE principal;
+
+-- 2. Sobreposicoes de um lote com os demais do projeto (as duas direcoes).
+-- Mesmos filtros de sobreposicoes_projeto_pares (02_extensions.sql):
+-- bbox, ST_Intersects, interiores via ST_Relate; interseccao calculada uma vez.
+CREATE OR REPLACE FUNCTION lote_overlaps_calcular(
+  p_lote_id INTEGER,
+  p_projeto_id INTEGER,
+  p_geom GEOMETRY,
+  p_area_m2 DOUBLE PRECISION
+)
+RETURNS TABLE (
+  lote_id INTEGER,
+  vizinho_id INTEGER,
+  projeto_id INTEGER,
+  area_m2 DOUBLE PRECISION,
+  percentual DOUBLE PRECISION,
+  geom GEOMETRY
+) AS $$
+  SELECT d.lote_id, d.vizinho_id, p_projeto_id, x.area_m2,
+    x.area_m2 / NULLIF(d.area_lote_m2, 0) * 100,
+    ST_Multi(x.geom)
+  FROM lotes l2
+  CROSS JOIN LATERAL (
+    -- OFFSET 0: ST_Intersection avaliado uma unica vez por par
+    SELECT i.geom, ST_Area(i.geom::geography) AS area_m2
+    FROM (
+      SELECT ST_CollectionExtract(ST_Intersection(p_geom, l2.geom), 3) AS geom
+      OFFSET 0
+    ) i
+  ) x
+  CROSS JOIN LATERAL (
+    VALUES
+      (p_lote_id, l2.id, p_area_m2),
+      (l2.id, p_lote_id, COALESCE(l2.area_ha * 10000.0, ST_Area(l2.geom::geography)))
+  ) d(lote_id, vizinho_id, area_lote_m2)
+  WHERE l2.projeto_id = p_projeto_id
+    AND l2.id <> p_lote_id
+    AND l2.geom IS NOT NULL
+    AND l2.geom && p_geom
+    AND ST_Intersects(p_geom, l2.geom)
+    AND ST_Relate(p_geom, l2.geom, 'T********')
+    AND NOT ST_IsEmpty(x.geom)
+    AND x.area_m2 > 0;
+$$ LANGUAGE sql STABLE;
+
+-- 3. Trigger: recalcula apenas os pares do lote alterado
+CREATE OR REPLACE FUNCTION lote_overlaps_atualizar()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_projeto INTEGER;
+BEGIN
+  -- UPDATE sem mudanca real de geometria/projeto (ex.: so status): nada a fazer.
+  -- '=' em geometry e igualdade exata a partir do PostGIS 2.4.
+  IF TG_OP = 'UPDATE'
+     AND NEW.geom IS NOT DISTINCT FROM OLD.geom
+     AND NEW.projeto_id IS NOT DISTINCT FROM OLD.projeto_id THEN
+    RETURN NULL;
+  END IF;
+
+  -- Serializa escritas de geometria no mesmo projeto: quem espera o lock
+  -- recalcula ja vendo a geometria do vizinho que acabou de ser gravada
+  -- (cada comando abaixo tira um snapshot novo em READ COMMITTED).
+  -- Projetos em ordem crescente para nao haver deadlock na troca de projeto.
+  FOR v_projeto IN
+    SELECT DISTINCT p FROM unnest(ARRAY[NEW.projeto_id,
+      CASE WHEN TG_OP = 'UPDATE' THEN OLD.projeto_id END]) p
+    WHERE p IS NOT NULL ORDER BY p
+  LOOP
+    PERFORM pg_advisory_xact_lock(hashtext('lote_overlaps'), v_projeto);
+  END LOOP;
+
+  DELETE FROM lote_overlaps o WHERE o.lote_id = NEW.id OR o.vizinho_id = NEW.id;
+
+  IF NEW.geom IS NOT NULL AND NEW.projeto_id IS NOT NULL THEN
+    INSERT INTO lote_overlaps (lote_id, vizinho_id, projeto_id, area_m2, percentual, geom)
+    SELECT c.lote_id, c.vizinho_id, c.projeto_id, c.area_m2, c.percentual, c.geom
+    FROM lote_overlaps_calcular(
+      NEW.id, NEW.projeto_id, NEW.geom,
+      COALESCE(NEW.area_ha * 10000.0, ST_Area(NEW.geom::geography))
+    ) c
+    ON CONFLICT (lote_id, vizinho_id) DO UPDATE SET
+      projeto_id = EXCLUDED.projeto_id,
+      area_m2 = EXCLUDED.area_m2,
+      percentual = EXCLUDED.percentual,
+      geom = EXCLUDED.geom,
+      atualizado_em = CURRENT_TIMESTAMP;
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- AFTER: area_ha ja foi preenchida por trigger_calc_area (BEFORE).
+-- DELETE de lote: as linhas saem pelo ON DELETE CASCADE.
+-- SECURITY DEFINER: usuarios autenticados so tem SELECT em lote_overlaps.
+DROP TRIGGER IF EXISTS trigger_lote_overlaps ON lotes;
+CREATE TRIGGER trigger_lote_overlaps
+AFTER INSERT OR UPDATE OF geom, projeto_id ON lotes
+FOR EACH ROW
+EXECUTE FUNCTION lote_overlaps_atualizar();
+
+-- 4. Reconstrucao completa (carga inicial ou reparo), por projeto ou geral
+CREATE OR REPLACE FUNCTION lote_overlaps_reconstruir(p_projeto_id INTEGER DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+  v_total INTEGER;
+BEGIN
+  DELETE FROM lote_overlaps o WHERE p_projeto_id IS NULL OR o.projeto_id = p_projeto_id;
+
+  -- Pares do motor de projeto (cada interseccao uma vez), expandidos nas duas direcoes
+  INSERT INTO lote_overlaps (lote_id, vizinho_id, projeto_id, area_m2, percentual, geom)
+  SELECT d.lote_id, d.vizinho_id, pr.id, par.area_m2,
+    par.area_m2 / NULLIF(d.area_lote_m2, 0) * 100,
+    ST_Multi(par.geom)
+  FROM projetos pr
+  CROSS JOIN LATERAL sobreposicoes_projeto_pares(pr.id, 0) par
+  JOIN lotes l1 ON l1.id = par.lote1_id
+  JOIN lotes l2 ON l2.id = par.lote2_id
+  CROSS JOIN LATERAL (
+    VALUES
+      (par.lote1_id, par.lote2_id, COALESCE(l1.area_ha * 10000.0, ST_Area(l1.geom::geography))),
+      (par.lote2_id, par.lote1_id, COALESCE(l2.area_ha * 10000.0, ST_Area(l2.geom::geography)))
+  ) d(lote_id, vizinho_id, area_lote_m2)
+  WHERE p_projeto_id IS NULL OR pr.id = p_projeto_id;
+
+  GET DIAGNOSTICS v_total = ROW_COUNT;
+  RETURN v_total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Carga inicial (tabela recem-criada)
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM lote_overlaps) THEN
+    PERFORM lote_overlaps_reconstruir();
+  END IF;
+END $$;
+
+-- 5. FeatureCollection do projeto lida da tabela, sem recalcular
+-- interseccoes (unica definicao do formato; usada por
+-- GET /api/projetos/{id}/sobreposicoes/geojson)
+CREATE OR REPLACE FUNCTION lote_overlaps_geojson(
+  p_projeto_id INTEGER,
+  p_area_min_m2 DOUBLE PRECISION DEFAULT 0
+)
+RETURNS JSONB AS $$
+  SELECT jsonb_build_object(
+    'type', 'FeatureCollection',
+    'features', COALESCE(jsonb_agg(
+      jsonb_build_object(
+        'type', 'Feature',
+        'geometry', ST_AsGeoJSON(o.geom, 7)::JSONB,
+        'properties', jsonb_build_object(
+          'lote1_id', o.lote_id,
+          'lote2_id', o.vizinho_id,
+          'nome_cliente1', l1.nome_cliente,
+          'nome_cliente2', l2.nome_cliente,
+          'area_m2', ROUND(o.area_m2::NUMERIC, 2),
+          'area_ha', ROUND((o.area_m2 / 10000.0)::NUMERIC, 4)
+        )
+      ) ORDER BY o.area_m2 DESC
+    ), '[]'::JSONB)
+  )
+  FROM lote_overlaps o
+  JOIN lotes l1 ON l1.id = o.lote_id
+  JOIN lotes l2 ON l2.id = o.vizinho_id
+  WHERE o.projeto_id = p_projeto_id
+    AND o.principal
+    AND o.area_m2 > p_area_min_m2;
+$$ LANGUAGE sql STABLE;
+
+-- 6. RLS (segue o padrao de lotes: topografo ve as do seu tenant)
+ALTER TABLE lote_overlaps ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS lote_overlaps_topografo_select ON lote_overlaps;
+CREATE POLICY lote_overlaps_topografo_select ON lote_overlaps
+  FOR SELECT USING (
+    auth.user_role() = 'topografo' AND EXISTS (
+      SELECT 1 FROM projetos p WHERE p.id = lote_overlaps.projeto_id AND p.tenant_id = auth.uid()
+    )
+  );
+
+GRANT SELECT ON lote_overlaps TO authenticated;